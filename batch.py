@@ -0,0 +1,173 @@
+# Esecuzione in batch di script di comandi, senza finestra ne' rete: ogni script gira in
+# un processo separato, con la propria sessione del motore (gg18 o pita2 in modalita'
+# headless), scrive gli STL richiesti e produce un report di latenza e memoria di picco
+# per comando.
+#
+# Formato degli script:
+#  - testo: un comando di parse_command per riga ("draw a box at 50,50,50", "save stl"),
+#    le righe vuote e quelle che iniziano con # vengono ignorate;
+#  - JSON (.json): lista di comandi, come stringhe o oggetti {"command": ..., "output": ...}
+#    dove output e' il file STL da scrivere con "save stl".
+# Senza output, l'n-esimo "save stl" dello script scrive <out>/<script>.stl, poi
+# <script>_2.stl, ...
+#
+# Script con lo stesso nome in directory diverse ricevono un suffisso (<script>-2, ...) per
+# sessione, log e STL.
+#
+# Uso: python batch.py script.txt [altri script...] [--engine gg18|pita2] [--workers N]
+#                      [--out DIR] [--report report.json] [--db-dump aige_shapes.sql]
+import argparse
+import contextlib
+import importlib
+import json
+import multiprocessing
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+# Motore usato per eseguire i comandi
+BATCH_ENGINE = "gg18"
+# Script eseguiti in parallelo
+BATCH_WORKERS = os.cpu_count() or 1
+
+
+# Comandi dello script come lista di (comando, file STL o None)
+def load_script(path):
+    with open(path, encoding='utf-8') as f:
+        if path.endswith('.json'):
+            entries = json.load(f)
+            return [(e, None) if isinstance(e, str) else (e['command'], e.get('output')) for e in entries]
+        lines = (line.strip() for line in f)
+        return [(line, None) for line in lines if line and not line.startswith('#')]
+
+
+# Memoria residente di picco del processo in MB (None dove non e' misurabile)
+def peak_rss_mb():
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # KB su Linux, byte su macOS
+    return peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024
+
+
+# Vero se i file di due script si sovrappongono: stesso nome, o uno e' il nome di un export
+# successivo dell'altro (<name>_2.stl, ...)
+def _names_clash(name, other):
+    for a, b in ((name, other), (other, name)):
+        if a == b or (a.startswith(b + '_') and a[len(b) + 1:].isdigit()):
+            return True
+    return False
+
+
+# Nomi univoci degli script (senza estensione), usati per sessione, log e STL: a parita'
+# di nome si aggiunge -2, -3, ... nell'ordine della riga di comando
+def script_names(paths):
+    names = []
+    for path in paths:
+        base = os.path.splitext(os.path.basename(path))[0]
+        name, n = base, 1
+        while any(_names_clash(name, other) for other in names):
+            n += 1
+            name = f"{base}-{n}"
+        names.append(name)
+    return names
+
+
+# Esegue uno script in una sessione del motore; l'output del motore va in <out>/<name>.log.
+# Restituisce il report dello script
+def run_script(path, name, engine_name, out_dir, inner_workers=None):
+    os.environ['TEXT2CAD_HEADLESS'] = '1'
+    log_path = os.path.join(out_dir, f"{name}.log")
+    start = time.perf_counter()
+    commands = []
+    with open(log_path, 'w', encoding='utf-8') as log, contextlib.redirect_stdout(log):
+        # Lo script configura il motore comune e vi registra i propri comandi
+        importlib.import_module(engine_name)
+        import engine
+        if inner_workers:
+            # Con piu' script in parallelo i processi interni moltiplicherebbero i core
+            engine.LOAD_WORKERS = engine.EXPORT_WORKERS = inner_workers
+        import_time = time.perf_counter() - start
+        session = engine.sessions.open(f"batch-{name}")
+        exports = 0
+        try:
+            for command, output in load_script(path):
+                if "save stl" in command.lower():
+                    exports += 1
+                    session.export_filename = output or os.path.join(
+                        out_dir, f"{name}.stl" if exports == 1 else f"{name}_{exports}.stl")
+                t0 = time.perf_counter()
+                response = engine.run_command(command, session)
+                commands.append(dict(command=command, seconds=time.perf_counter() - t0,
+                                     peak_rss_mb=peak_rss_mb(), response=response))
+                print(f"[batch] {command} -> {response}")
+        finally:
+            engine.sessions.release(session)
+            engine.job_runner.shutdown()
+    return dict(script=path, name=name, engine=engine_name, import_seconds=import_time,
+                total_seconds=time.perf_counter() - start, peak_rss_mb=peak_rss_mb(), log=log_path,
+                commands=commands)
+
+
+# Percentile p (0-100) di valori gia' ordinati
+def percentile(values, p):
+    if not values:
+        return 0.0
+    return values[min(len(values) - 1, int(round(p / 100 * (len(values) - 1))))]
+
+
+def print_report(reports, elapsed):
+    print(f"{'script':<28}{'comandi':>9}{'totale':>10}{'max':>10}{'picco RSS':>12}")
+    for rep in reports:
+        slowest = max((c['seconds'] for c in rep['commands']), default=0.0)
+        rss = f"{rep['peak_rss_mb']:.0f}MB" if rep['peak_rss_mb'] is not None else "-"
+        print(f"{rep['name']:<28}{len(rep['commands']):>9}{rep['total_seconds']:>9.2f}s"
+              f"{slowest * 1000:>8.0f}ms{rss:>12}")
+    latencies = sorted(c['seconds'] for rep in reports for c in rep['commands'])
+    print(f"{len(latencies)} comandi in {elapsed:.2f}s ({len(latencies) / max(elapsed, 1e-9):.1f} comandi/s), "
+          f"latenza p50 {percentile(latencies, 50) * 1000:.0f}ms, p95 {percentile(latencies, 95) * 1000:.0f}ms, "
+          f"max {percentile(latencies, 100) * 1000:.0f}ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Esecuzione in batch di script di comandi")
+    parser.add_argument('scripts', nargs='+', help="file di comandi (testo o .json)")
+    parser.add_argument('--engine', default=BATCH_ENGINE, choices=['gg18', 'pita2'])
+    parser.add_argument('--workers', type=int, default=BATCH_WORKERS, help="script eseguiti in parallelo")
+    parser.add_argument('--out', default='batch_out', help="directory per STL e log")
+    parser.add_argument('--report', default=None, help="file JSON con il report completo")
+    parser.add_argument('--db-dump', default=None,
+                        help="dump SQL di aige_shapes da caricare in memoria al posto di MySQL")
+    args = parser.parse_args()
+
+    if args.db_dump:
+        # Letto dal motore all'import, nei processi degli script (che ereditano l'ambiente)
+        os.environ['TEXT2CAD_DB_DUMP'] = os.path.abspath(args.db_dump)
+    os.makedirs(args.out, exist_ok=True)
+    workers = max(1, min(args.workers, len(args.scripts)))
+    # Con piu' processi di script, ognuno usa un solo processo per rasterizzazione ed export
+    inner_workers = 1 if workers > 1 else None
+    start = time.perf_counter()
+    # Un processo nuovo per script anche con un solo worker: cache, sessioni e picco di
+    # memoria misurato non passano da uno script all'altro
+    context = multiprocessing.get_context('spawn')
+    with ProcessPoolExecutor(max_workers=workers, mp_context=context, max_tasks_per_child=1) as executor:
+        futures = [executor.submit(run_script, path, name, args.engine, args.out, inner_workers)
+                   for path, name in zip(args.scripts, script_names(args.scripts))]
+        reports = [future.result() for future in futures]
+    elapsed = time.perf_counter() - start
+    print_report(reports, elapsed)
+    if args.report:
+        with open(args.report, 'w', encoding='utf-8') as f:
+            json.dump(dict(engine=args.engine, workers=workers, seconds=elapsed, scripts=reports), f, indent=2)
+        print(f"Report salvato in {args.report}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,117 @@
+# Benchmark dell'export STL: marching cubes di trimesh (percorso originale di
+# export_to_stl) contro il mesher a facce esposte di mesher.py con lo scrittore
+# STL binario di stl.py. Misura tempo, triangoli, dimensione del file e chiusura della mesh.
+#
+# Uso: python benchmarks/bench_mesher.py [--repeat N] [--boxes N]
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from mesher import greedy_mesh
+from raster import rasterize_cube, rasterize_cylinder
+from sdf import Sphere
+from stl import write_stl
+from volume import create_volume
+
+try:
+    import trimesh
+except ImportError:
+    trimesh = None
+
+SPACE_SIZE = 1024
+
+
+# Scatola della forma 'box' (aige_shapes) con il vertice in p
+def draw_box(vol, p):
+    rasterize_cube((p[0] + 51.6, p[1] + 21.6, p[2] + 25.8), 103.2, 43.2, 51.6).apply(vol)
+    rasterize_cube((p[0] + 51.6, p[1] + 21.6, p[2] + 26.6), 100, 40, 50).apply(vol, value=0)
+    rasterize_cube((p[0] + 51.6, p[1] + 21.6, p[2] + 51.6 - 0.8), 103.2, 43.2, 1.6).apply(vol, value=0)
+    rasterize_cube((p[0] + 103.2 + 5 + 50.8, p[1] + 21.6, p[2] + 0.8), 101.6, 41.6, 1.6).apply(vol)
+    rasterize_cylinder((p[0] + 5.6, p[1] + 21.6, p[2]), 5, 45).apply(vol)
+    rasterize_cylinder((p[0] + 5.6, p[1] + 21.6, p[2]), 1.5, 46.6).apply(vol, value=0)
+
+
+def scene_box(vol, boxes):
+    draw_box(vol, (50, 50, 50))
+
+
+def scene_grid(vol, boxes):
+    per_row = max(1, int(np.ceil(np.sqrt(boxes))))
+    for i in range(boxes):
+        draw_box(vol, (20 + (i % per_row) * 220, 20 + (i // per_row) * 60, 50))
+
+
+def scene_curved(vol, boxes):
+    rasterize_cylinder((200, 200, 100), 80, 200).apply(vol)
+    Sphere((450, 200, 200), 100).apply(vol)
+
+
+SCENES = [('box', scene_box), ('griglia di scatole', scene_grid), ('cilindro + sfera', scene_curved)]
+
+
+# Chiusura: ogni lato orientato ha il suo opposto, con la stessa molteplicita'
+def is_closed(faces):
+    edges = np.concatenate([faces[:, [0, 1]], faces[:, [1, 2]], faces[:, [2, 0]]])
+    n = int(faces.max()) + 1
+    forward = np.unique(edges[:, 0] * n + edges[:, 1], return_counts=True)
+    backward = np.unique(edges[:, 1] * n + edges[:, 0], return_counts=True)
+    return len(forward[0]) == len(backward[0]) and np.all(forward[0] == backward[0]) and np.all(forward[1] == backward[1])
+
+
+def export_marching_cubes(matrix, lo, filename):
+    mesh = trimesh.voxel.ops.matrix_to_marching_cubes(matrix)
+    mesh.apply_translation(lo)
+    mesh.export(filename)
+    return len(mesh.faces), bool(mesh.is_watertight)
+
+
+def export_greedy(matrix, lo, filename):
+    vertices, faces = greedy_mesh(matrix, origin=lo)
+    write_stl(filename, vertices, faces)
+    return len(faces), is_closed(faces)
+
+
+def best_time(export, matrix, lo, filename, repeat):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = export(matrix, lo, filename)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result, os.path.getsize(filename)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark dell'export STL")
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--boxes', type=int, default=16, help="scatole nella scena a griglia")
+    args = parser.parse_args()
+
+    exporters = [('greedy', export_greedy)]
+    if trimesh is not None:
+        exporters.insert(0, ('marching cubes', export_marching_cubes))
+    else:
+        print("trimesh non disponibile: misuro solo il mesher a facce esposte")
+
+    print(f"{'scena':<22}{'metodo':<16}{'tempo':>10}{'triangoli':>12}{'file':>12}{'chiusa':>8}")
+    with tempfile.TemporaryDirectory() as tmp:
+        for name, build in SCENES:
+            vol = create_volume(SPACE_SIZE)
+            build(vol, args.boxes)
+            lo, hi = vol.bounds()
+            matrix = vol.extract(lo, hi).astype(bool)
+            for method, export in exporters:
+                filename = os.path.join(tmp, f"{method}.stl")
+                elapsed, (triangles, closed), size = best_time(export, matrix, lo, filename, args.repeat)
+                print(f"{name:<22}{method:<16}{elapsed * 1000:>8.1f}ms{triangles:>12}{size / 1024:>10.0f}KB"
+                      f"{'si' if closed else 'no':>8}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,118 @@
+# Microbenchmark: kernel a slice di raster.py contro la rasterizzazione originale
+# (meshgrid completo + filtro booleano + scrittura per coordinate).
+#
+# Uso: python benchmarks/bench_raster.py [--repeat N] [--size N] [--dense]
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from raster import rasterize_cube, rasterize_cylinder
+from volume import create_volume
+
+try:
+    import torch
+except ImportError:
+    torch = None
+
+SPACE_SIZE = 512
+
+# Operazioni della forma 'box' a 50,50,50 (aige_shapes) piu' due primitive grandi.
+# Le primitive negative vengono sottratte dal cubo esterno della scatola.
+OUTER_BOX = dict(center=(101.6, 71.6, 75.8), length=103.2, width=43.2, height=51.6)
+CASES = [
+    ('cube 103x43x52', 'cube', OUTER_BOX, False),
+    ('cube 100x40x50 neg', 'cube', dict(center=(101.6, 71.6, 76.6), length=100, width=40, height=50), True),
+    ('cylinder r5 h45', 'cylinder', dict(center=(55.6, 71.6, 50), radius=5, height=45), False),
+    ('cylinder r1.5 h46.6 neg', 'cylinder', dict(center=(55.6, 71.6, 50), radius=1.5, height=46.6), True),
+    ('cube 200^3', 'cube', dict(center=(200, 200, 200), length=200, width=200, height=200), False),
+    ('cylinder r80 h200', 'cylinder', dict(center=(200, 200, 100), radius=80, height=200), False),
+]
+
+
+# Rasterizzazione originale del cubo (torch se disponibile, altrimenti la stessa logica in NumPy)
+def legacy_cube(center, length, width, height):
+    ranges = [(int(c - d // 2), int(c + d // 2 + 1)) for c, d in zip(center, (length, width, height))]
+    if torch is not None:
+        with torch.no_grad():
+            x, y, z = torch.meshgrid(*[torch.arange(a, b, dtype=torch.int64) for a, b in ranges], indexing='ij')
+            coords = torch.stack([x, y, z], dim=-1).reshape(-1, 3).cpu().numpy()
+    else:
+        x, y, z = np.meshgrid(*[np.arange(a, b, dtype=np.int64) for a, b in ranges], indexing='ij')
+        coords = np.stack([x, y, z], axis=-1).reshape(-1, 3)
+    valid = np.all((coords >= 0) & (coords < SPACE_SIZE), axis=1)
+    return coords[valid]
+
+
+# Rasterizzazione originale del cilindro: sqrt sull'intera griglia 3D
+def legacy_cylinder(center, radius, height):
+    r_int = int(radius) + 1
+    ranges = [(int(center[0] - r_int), int(center[0] + r_int + 1)),
+              (int(center[1] - r_int), int(center[1] + r_int + 1)),
+              (int(center[2]), int(center[2] + height + 1))]
+    if torch is not None:
+        with torch.no_grad():
+            x, y, z = torch.meshgrid(*[torch.arange(a, b, dtype=torch.int64) for a, b in ranges], indexing='ij')
+            mask = torch.sqrt((x - center[0]) ** 2 + (y - center[1]) ** 2) <= radius
+            coords = torch.stack([x, y, z], dim=-1)[mask].cpu().numpy()
+    else:
+        x, y, z = np.meshgrid(*[np.arange(a, b, dtype=np.int64) for a, b in ranges], indexing='ij')
+        mask = np.sqrt((x - center[0]) ** 2 + (y - center[1]) ** 2) <= radius
+        coords = np.stack([x, y, z], axis=-1)[mask]
+    valid = np.all((coords >= 0) & (coords < SPACE_SIZE), axis=1)
+    return coords[valid]
+
+
+# Scrittura originale: coordinate calcolate e poi scritte voxel per voxel nel volume
+def run_legacy(vol, kind, params, value):
+    coords = (legacy_cube if kind == 'cube' else legacy_cylinder)(**params)
+    vol.set_coords(coords, value=value)
+
+
+# Kernel nuovi: limiti analitici e assegnazione a slice
+def run_kernel(vol, kind, params, value):
+    stamp = (rasterize_cube if kind == 'cube' else rasterize_cylinder)(**params)
+    stamp.apply(vol, value=value)
+
+
+# Tempo migliore su piu' ripetizioni, misurato solo sulla rasterizzazione
+def best_time(runner, kind, params, negative, repeat, sparse):
+    best = None
+    vol = None
+    for _ in range(repeat):
+        vol = create_volume(SPACE_SIZE, sparse=sparse)
+        if negative:
+            rasterize_cube(**OUTER_BOX).apply(vol)
+        start = time.perf_counter()
+        runner(vol, kind, params, 0 if negative else 1)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, vol
+
+
+def main():
+    global SPACE_SIZE
+    parser = argparse.ArgumentParser(description="Microbenchmark dei kernel di rasterizzazione")
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--size', type=int, default=SPACE_SIZE, help="lato dello spazio in voxel")
+    parser.add_argument('--dense', action='store_true', help="usa il volume denso invece dei brick")
+    args = parser.parse_args()
+    SPACE_SIZE = args.size
+
+    print(f"Backend originale: {'torch' if torch is not None else 'numpy'}, "
+          f"volume {'denso' if args.dense else 'sparso'} {SPACE_SIZE}^3")
+    print(f"{'primitiva':<26}{'originale':>12}{'kernel':>12}{'speedup':>10}")
+    for name, kind, params, negative in CASES:
+        t_legacy, legacy_vol = best_time(run_legacy, kind, params, negative, args.repeat, not args.dense)
+        t_kernel, kernel_vol = best_time(run_kernel, kind, params, negative, args.repeat, not args.dense)
+        if legacy_vol.count() != kernel_vol.count():
+            print(f"ATTENZIONE: {name}: {legacy_vol.count()} voxel (originale) contro {kernel_vol.count()} (kernel)")
+        print(f"{name:<26}{t_legacy * 1000:>10.2f}ms{t_kernel * 1000:>10.2f}ms{t_legacy / t_kernel:>9.1f}x")
+
+
+if __name__ == "__main__":
+    main()
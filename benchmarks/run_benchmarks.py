@@ -0,0 +1,222 @@
+# Suite di benchmark dei percorsi critici del motore (pita2 in modalita' headless, con il
+# database in memoria caricato dal dump di aige_shapes): scene fisse, piu' valori di
+# SPACE_SIZE, tempo di ogni fase e memoria di picco salvati in JSON per confrontare le
+# esecuzioni.
+#
+# Scene: una 'box' al centro del volume, una griglia di N box, la figura di Pitagora e un caso di stress che
+# riempie l'intero volume. Fasi misurate: registrazione delle primitive nella scena
+# (register_cube, register_cylinder, register_custom_shape, che include la rasterizzazione
+# in cache del kernel della forma), apply_negative_voxels (valutazione CSG, dove si
+# rasterizzano e applicano le primitive registrate), draw_pythagorean_theorem (disegno e
+# valutazione insieme), preparazione dei dati di update_visualization (superfici dei
+# blocchi) ed export_to_stl. Ogni caso gira in un processo nuovo, cosi' la memoria di
+# picco e le cache sono solo sue; con --repeat si tiene il tempo migliore di ogni fase.
+#
+# Con --mapped le sessioni usano il volume a brick in un file mappato (VOLUME_MAPPED).
+#
+# Uso: python benchmarks/run_benchmarks.py [--sizes 256 512 1024] [--boxes N] [--repeat N] [--mapped]
+#                                          [--scenes box grid ...] [--output FILE] [--baseline FILE]
+import argparse
+import contextlib
+import json
+import multiprocessing
+import os
+import platform
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import numpy as np
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+ENGINE = "pita2"
+SHAPES_DUMP = os.path.join(ROOT, "aige_shapes(1).sql")
+SIZES = [256, 512, 1024]
+SCENES = ['box', 'grid', 'pythagorean', 'stress']
+# Voxel liberi tra due box vicine nella scena a griglia
+GRID_GAP = 4
+
+
+def peak_rss_mb():
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024
+
+
+class Timer:
+    def __init__(self):
+        self.steps = {}
+
+    @contextlib.contextmanager
+    def step(self, name):
+        start = time.perf_counter()
+        yield
+        self.steps[name] = self.steps.get(name, 0.0) + time.perf_counter() - start
+
+
+# Limiti [lo, hi) dei voxel della forma 'box' disegnata in (0, 0, 0), coperchio accanto
+# alla scatola compreso: le primitive positive rasterizzate come nel motore
+def box_bounds(engine):
+    shape = engine.shape_cache.get('box')
+    stamps = [engine.RASTERIZERS[kind](**params)
+              for kind, params, negative in engine.custom_shape_operations(shape, (0, 0, 0)) if not negative]
+    return (np.min([stamp.lo for stamp in stamps], axis=0).tolist(),
+            np.max([stamp.hi for stamp in stamps], axis=0).tolist())
+
+
+# Una box al centro del volume
+def scene_box(engine, size, boxes, timer):
+    lo, hi = box_bounds(engine)
+    if any(h - l > size for l, h in zip(lo, hi)):
+        raise ValueError(f"La box non entra in un volume di {size} voxel")
+    corner = tuple((size - (h - l)) // 2 - l for l, h in zip(lo, hi))
+    with timer.step('register_custom_shape'):
+        engine.draw_custom_shape('box', corner, {})
+
+
+# Box su una griglia 3D che divide il volume in celle uguali, una box al centro di ogni
+# cella: la disposizione segue SPACE_SIZE e se le box non entrano il caso fallisce invece
+# di misurare box tagliate dai bordi del volume
+def scene_grid(engine, size, boxes, timer):
+    lo, hi = box_bounds(engine)
+    extent = [h - l for l, h in zip(lo, hi)]
+    cells = [size // (e + GRID_GAP) for e in extent]
+    if boxes > cells[0] * cells[1] * cells[2]:
+        raise ValueError(f"{boxes} box non entrano in un volume di {size} voxel "
+                         f"(al massimo {cells[0] * cells[1] * cells[2]})")
+    # Solo le colonne, righe e strati che servono, allargati a tutto il volume
+    nx = min(cells[0], boxes)
+    ny = min(cells[1], -(-boxes // nx))
+    nz = -(-boxes // (nx * ny))
+    pitch = [size // n for n in (nx, ny, nz)]
+    with timer.step('register_custom_shape'):
+        for i in range(boxes):
+            index = (i % nx, (i // nx) % ny, i // (nx * ny))
+            # Angoli interi: ogni box e' rasterizzata uguale con qualunque SPACE_SIZE
+            corner = tuple(k * p + (p - e) // 2 - l for k, p, e, l in zip(index, pitch, extent, lo))
+            engine.draw_custom_shape('box', corner, {})
+
+
+def scene_pythagorean(engine, size, boxes, timer):
+    # Disegna e valuta subito (chiama update_visualization)
+    with timer.step('draw_pythagorean_theorem'):
+        __import__(ENGINE).draw_pythagorean_theorem((size // 2, size // 2, 10))
+
+
+# Volume pieno con un foro cilindrico passante e una cavita' cubica: brick pieni, parziali e vuoti
+def scene_stress(engine, size, boxes, timer):
+    c = size / 2
+    with timer.step('register_cube'):
+        engine.draw_cube((c, c, c), size, size, size)
+        engine.draw_cube((c / 2, c / 2, c / 2), c / 2, c / 2, c / 2, negative=True)
+    with timer.step('register_cylinder'):
+        engine.draw_cylinder((c, c, 0), size / 4, size, negative=True)
+
+
+SCENE_BUILDERS = dict(box=scene_box, grid=scene_grid, pythagorean=scene_pythagorean, stress=scene_stress)
+
+
+# Un caso (scena, SPACE_SIZE) nel processo corrente; l'output del motore viene scartato
+def run_case(scene, size, boxes, mapped=False):
+    os.environ['TEXT2CAD_HEADLESS'] = '1'
+    os.environ['TEXT2CAD_DB_DUMP'] = SHAPES_DUMP
+    timer = Timer()
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull), \
+            tempfile.TemporaryDirectory() as tmp:
+        with timer.step('import'):
+            # Lo script configura il motore comune (engine.py), che i casi usano direttamente
+            __import__(ENGINE)
+            import engine
+            from render import collect_shells
+            from session import activate
+        engine.SPACE_SIZE = size
+        engine.VOLUME_MAPPED = mapped
+        session = engine.sessions.open(f"bench-{scene}-{size}")
+        with activate(session):
+            SCENE_BUILDERS[scene](engine, size, boxes, timer)
+            with timer.step('apply_negative_voxels'):
+                engine.apply_negative_voxels()
+            with timer.step('update_visualization'):
+                _, shells = collect_shells(session.volume)
+            filename = os.path.join(tmp, 'bench.stl')
+            with timer.step('export_to_stl'):
+                engine.export_to_stl(filename)
+            stl_bytes = os.path.getsize(filename) if os.path.exists(filename) else 0
+        voxels = session.volume.count()
+        engine.job_runner.shutdown()
+    return dict(scene=scene, space_size=size, steps=timer.steps, voxels=voxels,
+                surface_voxels=sum(len(coords) for coords, _ in shells.values()),
+                stl_triangles=max(stl_bytes - 84, 0) // 50, peak_rss_mb=peak_rss_mb())
+
+
+def environment():
+    return dict(python=platform.python_version(), numpy=np.__version__, platform=platform.platform(),
+                cpu_count=os.cpu_count(), engine=ENGINE, time=time.strftime('%Y-%m-%d %H:%M:%S'))
+
+
+# Per ogni caso il tempo migliore di ogni fase e il picco di memoria massimo tra le ripetizioni
+def best_of(runs):
+    result = dict(runs[0])
+    result['steps'] = {name: min(run['steps'][name] for run in runs) for name in runs[0]['steps']}
+    rss = [run['peak_rss_mb'] for run in runs if run['peak_rss_mb'] is not None]
+    result['peak_rss_mb'] = max(rss) if rss else None
+    result['total'] = sum(t for name, t in result['steps'].items() if name != 'import')
+    return result
+
+
+def print_results(results, baseline=None):
+    reference = {(r['scene'], r['space_size']): r for r in (baseline or {}).get('results', [])}
+    for r in results:
+        rss = f"{r['peak_rss_mb']:.0f}MB" if r['peak_rss_mb'] is not None else "-"
+        print(f"{r['scene']} @ {r['space_size']}: {r['total']:.3f}s, picco {rss}, {r['voxels']} voxel, "
+              f"{r['surface_voxels']} in superficie, {r['stl_triangles']} triangoli")
+        old = reference.get((r['scene'], r['space_size']))
+        for name, seconds in r['steps'].items():
+            line = f"    {name:<28}{seconds * 1000:>10.1f}ms"
+            if old is not None and old['steps'].get(name):
+                line += f"  ({old['steps'][name] / max(seconds, 1e-9):.2f}x rispetto al riferimento)"
+            print(line)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark dei percorsi critici del motore")
+    parser.add_argument('--sizes', type=int, nargs='+', default=SIZES, help="valori di SPACE_SIZE")
+    parser.add_argument('--scenes', nargs='+', default=SCENES, choices=SCENES)
+    parser.add_argument('--boxes', type=int, default=16, help="box nella scena a griglia")
+    parser.add_argument('--repeat', type=int, default=1)
+    parser.add_argument('--mapped', action='store_true', help="volumi in un file mappato in memoria")
+    parser.add_argument('--output', default='benchmark_results.json')
+    parser.add_argument('--baseline', default=None, help="risultati precedenti da confrontare")
+    args = parser.parse_args()
+
+    cases = [(scene, size) for size in args.sizes for scene in args.scenes]
+    results = []
+    # Un processo nuovo per ogni esecuzione, uno alla volta per non falsare i tempi
+    context = multiprocessing.get_context('spawn')
+    with ProcessPoolExecutor(max_workers=1, mp_context=context, max_tasks_per_child=1) as executor:
+        for scene, size in cases:
+            runs = [executor.submit(run_case, scene, size, args.boxes, args.mapped).result() for _ in range(args.repeat)]
+            results.append(best_of(runs))
+            print(f"{scene} @ {size}: {results[-1]['total']:.3f}s")
+    baseline = None
+    if args.baseline:
+        with open(args.baseline, encoding='utf-8') as f:
+            baseline = json.load(f)
+    print_results(results, baseline)
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump(dict(environment=environment(), boxes=args.boxes, repeat=args.repeat, mapped=args.mapped,
+                       results=results), f, indent=2)
+    print(f"Risultati salvati in {args.output}")
+
+
+if __name__ == "__main__":
+    main()
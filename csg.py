@@ -0,0 +1,248 @@
+import time
+from contextlib import contextmanager
+
+import numpy as np
+
+from metrics import METRICS
+from octree import OCTREE_MIN_VOXELS, evaluate_octree, shape_bounds
+from rebuild import evaluate_parallel
+
+
+# Foglia dell'albero CSG: una primitiva (cube, cylinder, ...) con i suoi parametri, il colore
+# e l'eventuale gruppo (l'oggetto del database da cui proviene)
+class Primitive:
+    def __init__(self, kind, params, color=None, group=None):
+        self.kind = kind
+        self.params = params
+        self.color = color
+        self.group = group
+
+    def __repr__(self):
+        return f"Primitive({self.kind!r}, {self.params!r})"
+
+
+# Nodo di unione: left + right
+class Union:
+    def __init__(self, left, right):
+        self.left = left
+        self.right = right
+
+
+# Nodo di sottrazione: left - right
+class Difference:
+    def __init__(self, left, right):
+        self.left = left
+        self.right = right
+
+
+# Scena CSG con valutazione differita.
+# Le primitive vengono solo registrate nell'albero (sempre con la primitiva come figlio
+# destro, quindi l'albero equivale alla sequenza ordinata di operazioni) e il volume
+# viene aggiornato una sola volta quando serve il risultato: render, export o query.
+# I rasterizzatori sono funzioni kind -> oggetto con apply(volume, value, color)
+# (Stamp scritto con slice, albero SDF valutato a blocchi) oppure coordinate dei voxel.
+class CSGScene:
+    def __init__(self, volume, rasterizers, octree_threshold=None, workers=1, octree_min_voxels=OCTREE_MIN_VOXELS):
+        self.volume = volume
+        self.rasterizers = rasterizers
+        self.octree_threshold = octree_threshold
+        self.octree_min_voxels = octree_min_voxels
+        self.workers = workers
+        # Gruppo assegnato alle primitive registrate (es. l'oggetto in caricamento)
+        self.group = None
+        # Funzione (fatte, totali) chiamata durante la valutazione
+        self.progress = None
+        self.root = None
+        self.pending = []
+        self.evaluations = 0
+        self.applied = 0
+        # Tempo della valutazione in corso passato a rasterizzare e scrivere voxel
+        self.write_seconds = 0.0
+        # Tempi per oggetto dell'ultima valutazione: (gruppo, secondi, voxel pieni scritti),
+        # voxel None sul percorso octree, dove gli oggetti vengono scritti insieme
+        self.timings = []
+
+    # Registra una primitiva: unione se positiva, sottrazione se negativa
+    def add(self, kind, params, negative=False, color=None):
+        primitive = Primitive(kind, params, color, self.group)
+        if self.root is None:
+            self.root = primitive if not negative else None
+        else:
+            self.root = Difference(self.root, primitive) if negative else Union(self.root, primitive)
+        # Una sottrazione su una scena vuota non ha effetto
+        if self.root is not None:
+            self.pending.append((primitive, negative))
+        return primitive
+
+    @property
+    def dirty(self):
+        return bool(self.pending)
+
+    # Sequenza ordinata (primitiva, negativa) equivalente all'albero
+    def operations(self):
+        ops = []
+        node = self.root
+        while isinstance(node, (Union, Difference)):
+            ops.append((node.right, isinstance(node, Difference)))
+            node = node.left
+        if node is not None:
+            ops.append((node, False))
+        return ops[::-1]
+
+    # Applica al volume le operazioni in sospeso, in blocchi: le primitive a coordinate
+    # consecutive con lo stesso segno e colore vengono scritte con un'unica scrittura
+    # vettoriale, gli Stamp e gli alberi SDF scrivono direttamente nel volume
+    def evaluate(self):
+        if not self.pending:
+            return 0
+        start = time.time()
+        ops, self.pending = self.pending, []
+        # Fasi disgiunte: 'rasterize' e' il tempo passato a produrre e scrivere voxel,
+        # 'csg' il resto della valutazione (ordine, raggruppamento, batch)
+        self.write_seconds = 0.0
+        self.timings = []
+        timings = {}
+        evaluation_start = time.perf_counter()
+        try:
+            shapes = self._rasterize(ops, timings)
+            groups = self._groups(ops, shapes) if self.workers > 1 else None
+            # Oggetti caricati insieme: ognuno rasterizzato in un processo separato e poi
+            # fuso nel volume nell'ordine originale
+            if groups is not None and len(groups) > 1:
+                with self._writing():
+                    for label, seconds, voxels in evaluate_parallel(groups, self.volume, self.workers,
+                                                                    progress=self.progress):
+                        self._time(timings, label, seconds, voxels)
+            # Su un volume vuoto con molte primitive grandi l'octree raffina solo le celle
+            # di bordo invece di scrivere ogni primitiva per intero
+            elif self._octree_pays(ops, shapes):
+                with self._writing():
+                    _, seconds = evaluate_octree([(shape, negative, primitive.color)
+                                                  for (primitive, negative), shape in zip(ops, shapes)], self.volume)
+                for (primitive, _), op_seconds in zip(ops, seconds):
+                    self._time(timings, primitive.group, op_seconds, None)
+            else:
+                self._apply(ops, shapes, timings)
+        finally:
+            elapsed = time.perf_counter() - evaluation_start
+            METRICS.observe('stage', 'rasterize', self.write_seconds)
+            METRICS.observe('stage', 'csg', elapsed - self.write_seconds)
+        if self.progress is not None:
+            self.progress(len(ops), len(ops))
+        self.applied += len(ops)
+        self.evaluations += 1
+        self.timings = [(label, seconds, voxels) for label, (seconds, voxels) in timings.items()]
+        for label, seconds, voxels in self.timings:
+            if label is not None:
+                print(f"  {label}: {'?' if voxels is None else voxels} voxel in {seconds * 1000:.1f}ms")
+        print(f"Valutazione CSG: {len(ops)} primitive in {time.time() - start:.3f}s")
+        return len(ops)
+
+    # Forme delle operazioni, rasterizzate una sola volta per tutti i percorsi
+    def _rasterize(self, ops, timings):
+        shapes = []
+        for primitive, _ in ops:
+            shape_start = time.perf_counter()
+            with self._writing():
+                shapes.append(self.rasterizers[primitive.kind](**primitive.params))
+            self._time(timings, primitive.group, time.perf_counter() - shape_start, 0)
+        return shapes
+
+    # Somma tempo e voxel al gruppo (gli oggetti restano nell'ordine di prima comparsa)
+    @staticmethod
+    def _time(timings, label, seconds, voxels):
+        total = timings.setdefault(label, [0.0, 0])
+        total[0] += seconds
+        total[1] = None if voxels is None or total[1] is None else total[1] + voxels
+
+    # L'octree conviene solo su un volume vuoto con abbastanza primitive, grandi in media
+    # almeno octree_min_voxels: con primitive piccole (es. le scatole di "load objects")
+    # scrivere ogni forma per intero costa meno che classificare le celle
+    def _octree_pays(self, ops, shapes):
+        if not self.octree_threshold or self.applied != 0 or len(ops) < self.octree_threshold:
+            return False
+        sizes = []
+        for shape in shapes:
+            bounds = shape_bounds(shape)
+            if bounds is not None:
+                lo = np.clip(bounds[0], 0, self.volume.size)
+                hi = np.clip(bounds[1], 0, self.volume.size)
+                sizes.append(float(np.prod(hi - lo)))
+        return bool(sizes) and float(np.mean(sizes)) >= self.octree_min_voxels
+
+    # Divide le operazioni in gruppi consecutivi (etichetta, [(forma, negativa, colore)]),
+    # None se qualche primitiva non appartiene a un gruppo
+    def _groups(self, ops, shapes):
+        groups = []
+        for (primitive, negative), shape in zip(ops, shapes):
+            if primitive.group is None:
+                return None
+            if not groups or groups[-1][0] != primitive.group:
+                groups.append((primitive.group, []))
+            groups[-1][1].append((shape, negative, primitive.color))
+        return groups
+
+    # Somma la durata del blocco a write_seconds
+    @contextmanager
+    def _writing(self):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.write_seconds += time.perf_counter() - start
+
+    # Le coordinate vengono raccolte in batch solo all'interno dello stesso gruppo, cosi'
+    # ogni scrittura e' attribuita a un solo oggetto
+    def _apply(self, ops, shapes, timings):
+        batch = []
+        batch_key = None
+        for done, ((primitive, negative), result) in enumerate(zip(ops, shapes)):
+            if self.progress is not None:
+                self.progress(done, len(ops))
+            key = (negative, primitive.color, primitive.group)
+            if batch and key != batch_key:
+                self._write(batch, batch_key, timings)
+                batch = []
+            batch_key = key
+            if hasattr(result, 'apply'):
+                if batch:
+                    self._write(batch, batch_key, timings)
+                    batch = []
+                write_start = time.perf_counter()
+                with self._writing():
+                    written = result.apply(self.volume, value=0 if negative else 1, color=primitive.color)
+                self._time(timings, primitive.group, time.perf_counter() - write_start, 0 if negative else written)
+            elif len(result):
+                batch.append(np.asarray(result).reshape(-1, 3))
+        if batch:
+            self._write(batch, batch_key, timings)
+
+    def _write(self, batch, key, timings):
+        negative, color, group = key
+        write_start = time.perf_counter()
+        with self._writing():
+            written = self.volume.set_coords(np.concatenate(batch), value=0 if negative else 1, color=color)
+        self._time(timings, group, time.perf_counter() - write_start, 0 if negative else written)
+
+    # Ricalcola il volume da zero a partire dall'intero albero
+    def rebuild(self):
+        self.volume.clear()
+        self.applied = 0
+        self.pending = self.operations()
+        return self.evaluate()
+
+    # Riparte dal contenuto attuale del volume (es. caricato da uno snapshot): l'albero
+    # diventa una foglia 'volume' gia' applicata, e le primitive registrate dopo vengono
+    # unite o sottratte a quel contenuto. Un volume non e' rasterizzabile: rebuild() non
+    # e' piu' possibile fino al prossimo clear()
+    def set_base(self, label):
+        self.root = Primitive('volume', dict(source=label))
+        self.pending = []
+        self.applied = 1
+
+    # Svuota albero e volume
+    def clear(self):
+        self.root = None
+        self.pending = []
+        self.applied = 0
+        self.volume.clear()
@@ -0,0 +1,191 @@
+import json
+import re
+import threading
+from contextlib import contextmanager
+
+from jobs import JOB_WORKERS
+
+# Connessioni tenute aperte nel pool: un job puo' usarne due insieme (il cursore in
+# streaming di "load objects" e la query di una forma non ancora in cache)
+DB_POOL_SIZE = 2 * JOB_WORKERS
+# Secondi di attesa massima di una connessione libera
+DB_POOL_TIMEOUT = 30
+# Righe lette per ogni giro del cursore in streaming
+DB_FETCH_SIZE = 500
+
+_INSERT_OBJECT = """
+INSERT INTO aige_treedee (aw_type, aw_description, aw_parameters, aw_position_x, aw_position_y, aw_position_z, aw_negative)
+VALUES (%s, %s, %s, %s, %s, %s, %s)
+"""
+
+
+# Persistenza su aige_treedee / aige_shapes con un pool di connessioni: la connessione
+# TCP a MySQL viene aperta una volta sola e riusata da tutti i comandi.
+# Il pool (e mysql.connector) viene creato al primo uso, cosi' importare il modulo non
+# richiede il database. MySQLConnectionPool non aspetta ("pool exhausted" appena le
+# connessioni sono tutte in uso): un semaforo da pool_size fa aspettare i job in coda.
+class Database:
+    def __init__(self, config, pool_size=DB_POOL_SIZE, pool_name='text2cad', timeout=DB_POOL_TIMEOUT):
+        self.config = config
+        self.pool_size = pool_size
+        self.pool_name = pool_name
+        self.timeout = timeout
+        self.pool = None
+        self.lock = threading.Lock()
+        self.available = threading.BoundedSemaphore(pool_size)
+
+    # Connessione presa dal pool e restituita (close) all'uscita dal blocco with
+    @contextmanager
+    def connection(self):
+        with self.lock:
+            if self.pool is None:
+                from mysql.connector import pooling
+                # consume_results: un cursore in streaming interrotto non blocca la connessione
+                self.pool = pooling.MySQLConnectionPool(pool_name=self.pool_name, pool_size=self.pool_size,
+                                                        consume_results=True, **self.config)
+        if not self.available.acquire(timeout=self.timeout):
+            raise TimeoutError(f"Nessuna connessione al database libera dopo {self.timeout}s")
+        try:
+            conn = self.pool.get_connection()
+            try:
+                yield conn
+            finally:
+                conn.close()
+        finally:
+            self.available.release()
+
+    @staticmethod
+    def _object_row(obj_type, parameters, position, is_negative, description=None):
+        return (obj_type, description, json.dumps(parameters), position[0], position[1], position[2], is_negative)
+
+    # Salva un oggetto e ne restituisce l'ID
+    def save_object(self, obj_type, parameters, position, is_negative, description=None):
+        with self.connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute(_INSERT_OBJECT, self._object_row(obj_type, parameters, position, is_negative, description))
+            conn.commit()
+            object_id = cursor.lastrowid
+            cursor.close()
+        return object_id
+
+    # Salva molti oggetti in un'unica transazione con executemany.
+    # objects: tuple (obj_type, parameters, position, is_negative[, description]).
+    # Restituisce il numero di righe inserite; in caso di errore non viene salvato nulla.
+    def save_objects(self, objects):
+        rows = [self._object_row(*obj) for obj in objects]
+        if not rows:
+            return 0
+        with self.connection() as conn:
+            cursor = conn.cursor()
+            try:
+                cursor.executemany(_INSERT_OBJECT, rows)
+                conn.commit()
+            except Exception:
+                conn.rollback()
+                raise
+            finally:
+                cursor.close()
+        return len(rows)
+
+    # Oggetti di aige_treedee letti in streaming (cursore non bufferizzato, fetchmany):
+    # la tabella non viene mai caricata per intero in memoria
+    def iter_objects(self, object_id=None, fetch_size=DB_FETCH_SIZE):
+        with self.connection() as conn:
+            cursor = conn.cursor(dictionary=True, buffered=False)
+            try:
+                if object_id:
+                    cursor.execute("SELECT * FROM aige_treedee WHERE AW = %s", (object_id,))
+                else:
+                    cursor.execute("SELECT * FROM aige_treedee")
+                while True:
+                    rows = cursor.fetchmany(fetch_size)
+                    if not rows:
+                        break
+                    yield from rows
+            finally:
+                cursor.close()
+
+    # Righe di aige_treedee con gli AW dati, in ordine di AW: query per chiave primaria a
+    # gruppi di fetch_size id, senza leggere il resto della tabella
+    def objects_by_id(self, ids, fetch_size=DB_FETCH_SIZE):
+        ids = sorted(set(ids))
+        rows = []
+        with self.connection() as conn:
+            cursor = conn.cursor(dictionary=True)
+            try:
+                for i in range(0, len(ids), fetch_size):
+                    chunk = ids[i:i + fetch_size]
+                    cursor.execute(f"SELECT * FROM aige_treedee WHERE AW IN ({', '.join(['%s'] * len(chunk))}) "
+                                   f"ORDER BY AW", tuple(chunk))
+                    rows.extend(cursor.fetchall())
+            finally:
+                cursor.close()
+        return rows
+
+    # Definizione di una forma di aige_shapes, None se non esiste
+    def load_shape_definition(self, shape_name):
+        with self.connection() as conn:
+            cursor = conn.cursor(dictionary=True)
+            cursor.execute("SELECT shape_definition FROM aige_shapes WHERE shape_name = %s", (shape_name,))
+            result = cursor.fetchone()
+            cursor.close()
+        return json.loads(result['shape_definition']) if result else None
+
+
+# Tuple (id, 'nome', 'definizione') degli INSERT di aige_shapes in un dump SQL
+_SHAPE_ROW = re.compile(r"\((\d+),\s*'((?:[^'\\]|\\.)*)',\s*'((?:[^'\\]|\\.)*)'\)")
+_SQL_ESCAPES = {'n': '\n', 'r': '\r', 't': '\t', '0': '\0'}
+
+
+def _sql_unescape(text):
+    return re.sub(r"\\(.)", lambda m: _SQL_ESCAPES.get(m.group(1), m.group(1)), text)
+
+
+# Sostituto in memoria di Database, con la stessa interfaccia: per benchmark ed esecuzioni
+# senza MySQL. Le forme vengono lette da un dump SQL di aige_shapes (es. quello di
+# phpMyAdmin nel repository), gli oggetti salvati restano in memoria.
+class MemoryDatabase:
+    def __init__(self, shapes=None):
+        self.shapes = dict(shapes or {})
+        self.objects = []
+        self.lock = threading.Lock()
+
+    @classmethod
+    def from_dump(cls, filename):
+        with open(filename, encoding='utf-8') as f:
+            dump = f.read()
+        start = dump.find("INSERT INTO `aige_shapes`")
+        end = dump.find(";\n", start)
+        shapes = {}
+        if start >= 0:
+            for _, name, definition in _SHAPE_ROW.findall(dump[start:end if end >= 0 else None]):
+                shapes[_sql_unescape(name)] = json.loads(_sql_unescape(definition))
+        return cls(shapes)
+
+    def save_object(self, obj_type, parameters, position, is_negative, description=None):
+        row = Database._object_row(obj_type, parameters, position, is_negative, description)
+        with self.lock:
+            object_id = len(self.objects) + 1
+            self.objects.append(dict(AW=object_id, aw_type=row[0], aw_description=row[1], aw_parameters=row[2],
+                                     aw_position_x=row[3], aw_position_y=row[4], aw_position_z=row[5],
+                                     aw_negative=row[6]))
+        return object_id
+
+    def save_objects(self, objects):
+        for obj in objects:
+            self.save_object(*obj)
+        return len(objects)
+
+    def iter_objects(self, object_id=None, fetch_size=DB_FETCH_SIZE):
+        with self.lock:
+            rows = [dict(row) for row in self.objects if not object_id or row['AW'] == object_id]
+        yield from rows
+
+    def objects_by_id(self, ids, fetch_size=DB_FETCH_SIZE):
+        wanted = set(ids)
+        with self.lock:
+            return [dict(row) for row in self.objects if row['AW'] in wanted]
+
+    def load_shape_definition(self, shape_name):
+        definition = self.shapes.get(shape_name)
+        return json.loads(json.dumps(definition)) if definition is not None else None
@@ -0,0 +1,739 @@
+# Motore comune degli script text2cad (gg18, pita2): configurazione, sessioni, scena,
+# database, export, parser dei comandi e server WebSocket. Gli script lo configurano
+# (es. VOLUME_COLORS) e aggiungono i propri comandi con register_command/register_object
+# prima di chiamare main().
+import time
+STARTED = time.perf_counter()  # Inizio dell'avvio, per misurarne la durata
+
+import numpy as np
+import asyncio
+import websockets
+import threading
+from functools import partial
+import re
+import hmac
+import json
+import math
+import os
+import sys
+
+from csg import CSGScene
+from db import DB_POOL_SIZE, Database, MemoryDatabase
+from export import export_stl_streaming
+from jobs import JobCancelled, JobRunner, check_cancelled, report
+from journal import Journal
+from mesher import greedy_mesh
+from metrics import METRICS, profile_call, stage, timed_iter
+from raster import RASTERIZERS
+from raster_cache import RasterCache
+from sdf import combine, cube_sdf, cylinder_sdf, sample_field, scene_to_sdf
+from session import Session, SessionLimitError, SessionManager, SessionNameError, activate, current_session
+from shapes import ShapeCache
+from simplify import simplify_mesh
+from snapshot import SNAPSHOT_EXTENSION, SnapshotError, load_snapshot, read_header, save_snapshot, source_hash
+from stl import write_stl
+from volume import create_volume
+
+# Configurazione
+# Senza finestra (--headless o TEXT2CAD_HEADLESS=1): solo il server WebSocket, vispy e PyQt5 non vengono importati
+HEADLESS = '--headless' in sys.argv or os.environ.get('TEXT2CAD_HEADLESS', '').lower() in ('1', 'true', 'yes')
+SPACE_SIZE = 1024  # Spazio virtuale di 1024^3 punti: il volume sparso alloca solo i brick occupati
+VOLUME_COLORS = False  # Canale colore nel volume, per le figure colorate (pita2)
+VOLUME_MAPPED = False  # Brick dei volumi in un file mappato in memoria: scene piu' grandi della RAM, in memoria solo le pagine usate
+VOLUME_DIR = None  # Directory dei file dei volumi mappati (None: directory temporanea di sistema)
+SDF_MODE = False  # Forme come funzioni distanza: composizione senza voxel intermedi ed export sub-voxel
+OCTREE_MIN_OPS = 64  # Da quante primitive in poi un volume vuoto viene valutato con l'octree
+OCTREE_MIN_VOXELS = 8 * 1024 * 1024  # Voxel medi del riquadro delle primitive da cui si usa l'octree: con forme piccole scriverle una per una e' piu' veloce
+RASTER_CACHE_MB = 256  # Memoria per le forme gia' rasterizzate, riusate a ogni nuovo piazzamento
+RASTER_CACHE_DIR = None  # Directory per tenere la cache anche su disco tra un avvio e l'altro (None: solo memoria)
+RASTER_CACHE_DISK_MB = 1024  # Spazio massimo della cache su disco: oltre, si eliminano le forme usate meno di recente
+LOAD_WORKERS = os.cpu_count() or 1  # Processi per "load objects": ogni oggetto viene rasterizzato in parallelo
+EXPORT_STREAM_VOXELS = 256 ** 3  # Oltre questa bounding box l'STL viene meshato a fette e scritto in streaming
+EXPORT_SLAB = 64  # Spessore in voxel delle fette dell'export in streaming
+EXPORT_WORKERS = os.cpu_count() or 1  # Processi che meshano le fette in parallelo
+SIMPLIFY_EXPORT = False  # Semplifica la mesh prima di scriverla: facce complanari fuse, poi contrazione dei lati
+SIMPLIFY_TARGET_FACES = None  # Triangoli massimi dopo la semplificazione (None: nessun limite)
+SIMPLIFY_TOLERANCE = None  # Errore massimo nell'unita' dell'export (None con target None: solo facce complanari)
+JOB_WORKERS = 4  # Comandi eseguiti in background; i comandi della stessa sessione vengono eseguiti uno alla volta
+SESSION_MAX = 16  # Sessioni (scene indipendenti) aperte al massimo sul server
+SESSION_MAX_MB = 512  # Memoria massima del volume di una sessione: oltre, solo export, ricaricamento ed 'exit' (per i volumi mappati conta solo l'indice)
+SESSION_MAX_DISK_MB = 8192  # Spazio su disco massimo del file di un volume mappato (VOLUME_MAPPED): oltre, come per SESSION_MAX_MB
+SESSION_IDLE_SECONDS = 30 * 60  # Le sessioni con nome senza connessioni vengono eliminate dopo questa inattivita'
+RENDER_FPS = 30  # Fotogrammi al secondo massimi: le modifiche tra un fotogramma e l'altro vengono disegnate insieme
+METRICS_FILE = None  # File in cui riscrivere le metriche in formato Prometheus dopo ogni comando (None: nessuno)
+METRICS_PORT = None  # Porta locale su cui esporre /metrics per Prometheus (None: nessuna)
+SHUTDOWN_TOKEN = os.environ.get('TEXT2CAD_SHUTDOWN_TOKEN')  # "shutdown <token>" ferma il server per tutti; senza token il comando e' disabilitato
+SNAPSHOT_DIR = "snapshots"  # Directory degli snapshot binari della scena ("save scene" / "load scene")
+JOURNAL_DEPTH = 32  # Comandi annullabili con "undo" per sessione
+JOURNAL_MAX_MB = 256  # Memoria massima dei diff di undo/redo di una sessione
+
+# Configurazione del database MySQL
+db_config = {
+    'host': '127.0.0.1',
+    'user': 'user2',
+    'password': 'password',
+    'database': '3d_objects',
+    'port': '3307'
+}
+DB_DUMP = os.environ.get('TEXT2CAD_DB_DUMP')  # Dump SQL di aige_shapes: se impostato, database in memoria al posto di MySQL
+# Canvas per il rendering e scheduler dei fotogrammi, creati da init_rendering()
+# (mai in modalita' headless)
+canvas = None
+view = None
+render_scheduler = None
+
+def init_rendering():
+    global canvas, view, render_scheduler
+    import vispy
+    from vispy import scene
+    from render import RenderScheduler
+    # Forza il backend PyQt5
+    vispy.use('pyqt5')
+    canvas = scene.SceneCanvas(keys='interactive', size=(800, 600), show=True)
+    view = canvas.central_widget.add_view()
+    view.camera = 'turntable'
+    view.camera.distance = 200  # Riduciamo la distanza per avvicinarci alla scatola
+    view.camera.center = (50 + 103.2 / 2, 50 + 43.2 / 2, 50 + 51.6 / 2)  # Centriamo sulla scatola
+    view.camera.fov = 60
+
+    # Rendering sul thread di Qt: i comandi pubblicano le modifiche, un timer le disegna
+    def add_grid():
+        scene.visuals.GridLines(parent=view.scene, color=(0.5, 0.5, 0.5, 1))
+
+    render_scheduler = RenderScheduler(canvas, view.scene, fps=RENDER_FPS, on_first_frame=add_grid)
+
+# I comandi vengono eseguiti come job nel pool, fuori dal ciclo asyncio; i comandi in
+# INLINE_COMMANDS rispondono subito
+job_runner = JobRunner(JOB_WORKERS)
+INLINE_COMMANDS = ("cancel", "stats", "exit", "shutdown")
+# Comandi accettati anche da una sessione oltre il limite di memoria ("load objects" e
+# "load scene" sostituiscono il volume, quindi possono riportarla sotto il limite)
+LIMIT_EXEMPT_COMMANDS = ("save stl", "save scene", "load objects", "load scene", "undo", "cancel", "stats", "exit", "shutdown")
+# Etichette dei comandi negli istogrammi di latenza (gli altri finiscono in "other")
+COMMAND_KINDS = ("cancel", "undo", "redo", "draw a box", "save stl", "save scene", "load scene", "load objects", "reload shapes", "stats")
+
+# Flag per controllare l'uscita
+running = True
+
+# Persistenza con un pool di connessioni: nessuna connessione TCP aperta per comando
+# (in memoria, con le forme del dump, per benchmark e prove senza MySQL)
+# (almeno due connessioni per job: un "load objects" ne tiene una per tutto il caricamento)
+database = MemoryDatabase.from_dump(DB_DUMP) if DB_DUMP else Database(db_config, pool_size=max(DB_POOL_SIZE, 2 * JOB_WORKERS))
+
+# Funzione per salvare un oggetto nel database
+def save_object_to_db(obj_type, parameters, position, is_negative, description=None):
+    with stage('db'):
+        return database.save_object(obj_type, parameters, position, is_negative, description)
+
+# Funzione per salvare molti oggetti in un'unica transazione
+def save_objects_to_db(objects):
+    with stage('db'):
+        return database.save_objects(objects)
+
+# Funzione per recuperare gli oggetti dal database, letti in streaming
+def load_objects_from_db(object_id=None):
+    return timed_iter('db', database.iter_objects(object_id))
+
+# Funzione per rileggere dal database gli oggetti con gli ID dati
+def load_objects_by_id(ids):
+    with stage('db'):
+        return database.objects_by_id(ids)
+
+# Funzione per caricare la definizione di una forma dal database
+def load_shape_definition(shape_name):
+    with stage('db'):
+        return database.load_shape_definition(shape_name)
+
+# Definizioni delle forme compilate e tenute in memoria: una sola query per forma
+# finche' la cache non viene invalidata ("reload shapes")
+shape_cache = ShapeCache(load_shape_definition)
+
+# Forme rasterizzate in coordinate locali, stampate nella scena per traslazione
+raster_cache = RasterCache(RASTER_CACHE_MB * 1024 * 1024, RASTER_CACHE_DIR, RASTER_CACHE_DISK_MB * 1024 * 1024)
+
+# Avanzamento della valutazione CSG, inviato al client del job in corso
+def report_evaluation(done, total):
+    report(f"Valutazione CSG: {100 * done // max(total, 1)}%")
+
+# Scena di una sessione. Volume dei voxel: brick sparsi allocati solo dove c'e' geometria
+# (con canale colore se VOLUME_COLORS)
+# (con VOLUME_MAPPED in un file mappato in memoria invece che in RAM).
+# Scena CSG: le primitive vengono registrate e valutate una sola volta quando serve il risultato;
+# cubi e cilindri vengono scritti nel volume dai kernel a slice di raster.py.
+# Journal: diff dei blocchi toccati da ogni comando, per "undo" e "redo"
+def create_session(name):
+    volume = create_volume(SPACE_SIZE, with_colors=VOLUME_COLORS, mapped=VOLUME_MAPPED, directory=VOLUME_DIR)
+    scene_graph = CSGScene(volume, RASTERIZERS, octree_threshold=OCTREE_MIN_OPS, workers=LOAD_WORKERS,
+                           octree_min_voxels=OCTREE_MIN_VOXELS)
+    scene_graph.progress = report_evaluation
+    journal = Journal(volume, scene_graph, JOURNAL_DEPTH, JOURNAL_MAX_MB * 1024 * 1024)
+    return Session(name, volume, scene_graph, journal=journal)
+
+# Ogni connessione ha la sua scena; "session <nome>" passa a una scena con nome condivisibile.
+# Le definizioni delle forme e la cache raster restano comuni a tutte le sessioni
+sessions = SessionManager(create_session, max_sessions=SESSION_MAX, max_bytes=SESSION_MAX_MB * 1024 * 1024,
+                          idle_timeout=SESSION_IDLE_SECONDS, max_disk_bytes=SESSION_MAX_DISK_MB * 1024 * 1024)
+
+# Metriche lette al momento della richiesta ("stats", METRICS_FILE, METRICS_PORT)
+def hit_rate(hits, misses):
+    return hits / max(hits + misses, 1)
+
+METRICS.gauge('sessions', lambda: len(sessions.sessions))
+METRICS.gauge('session_bytes', lambda: sum(s.nbytes for s in list(sessions.sessions.values())))
+METRICS.gauge('session_disk_bytes', lambda: sum(s.disk_bytes for s in list(sessions.sessions.values())))
+METRICS.gauge('voxels', lambda: sum(s.voxels for s in list(sessions.sessions.values())))
+METRICS.gauge('journal_bytes', lambda: sum(s.journal.nbytes for s in list(sessions.sessions.values())))
+METRICS.gauge('shape_cache_hit_rate', lambda: hit_rate(shape_cache.hits, shape_cache.queries))
+METRICS.gauge('raster_cache_hit_rate', lambda: hit_rate(raster_cache.hits + raster_cache.disk_hits, raster_cache.misses))
+METRICS.gauge('raster_cache_disk_hits', lambda: raster_cache.disk_hits)
+
+# Funzione per aggiungere un cubo
+def draw_cube(center, length, width, height, negative=False):
+    session = current_session()
+    session.scene.add('cube', dict(center=center, length=length, width=width, height=height), negative)
+
+# Funzione per aggiungere un cilindro
+def draw_cylinder(center, radius, height, negative=False):
+    session = current_session()
+    session.scene.add('cylinder', dict(center=center, radius=radius, height=height), negative)
+
+# Funzione per applicare la sottrazione dei voxel negativi
+# Valuta in un colpo solo tutte le primitive registrate dall'ultima valutazione
+def apply_negative_voxels():
+    session = current_session()
+    if session.scene.evaluate():
+        session.voxels = session.volume.count()
+        print(f"Rimasti {session.voxels} voxel dopo la sottrazione")
+
+# Funzione per aggiornare la visualizzazione
+# Vengono disegnati solo i voxel di superficie dei blocchi modificati dall'ultimo
+# aggiornamento; il fotogramma viene prodotto dal timer del rendering sul thread di Qt
+def update_visualization():
+    session = current_session()
+    apply_negative_voxels()
+    if render_scheduler is None:
+        # Senza finestra i blocchi modificati non servono
+        session.volume.take_dirty()
+        return
+    blocks, voxels = render_scheduler.publish(session.volume)
+    if blocks:
+        print(f"Aggiornamento rendering: {blocks} blocchi modificati, {voxels} voxel di superficie")
+    else:
+        print("Nessun voxel da visualizzare")
+
+# Superficie a precisione sub-voxel estratta dal campo di distanza della scena
+# (i contorni a voxel non hanno una distanza e restano fuori)
+def sdf_to_mesh():
+    session = current_session()
+    node = scene_to_sdf(session.scene.operations())
+    if node is None:
+        return None
+    import trimesh
+    from skimage import measure
+    field, origin = sample_field(node)
+    vertices, faces, _, _ = measure.marching_cubes(field, level=0, gradient_direction='ascent')
+    return trimesh.Trimesh(vertices=vertices + origin, faces=faces)
+
+# Avanzamento dell'export a fette; il job puo' essere annullato tra una fetta e l'altra
+def report_export(done, total):
+    check_cancelled()
+    report(f"Export STL: {100 * done // total}% ({done}/{total} fette)", force=done == total)
+
+# Esportazione STL
+def export_to_stl(filename, unit="mm"):
+    session = current_session()
+    apply_negative_voxels()
+    bounds = session.volume.bounds()
+    if bounds is None:
+        print("Nessun voxel da esportare!")
+        return "Errore: Nessun voxel da esportare"
+    # Avvisi aggiunti alla risposta al client
+    notes = ""
+    with stage('export'):
+        scale = 1.0 if unit == "mm" else 0.1 if unit == "cm" else 0.001
+        try:
+            mesh = sdf_to_mesh() if SDF_MODE else None
+        except ValueError as e:
+            print(f"Export SDF non possibile: {e}")
+            return f"Errore: {e}"
+        if mesh is not None:
+            mesh.apply_scale(scale)
+            if SIMPLIFY_EXPORT:
+                vertices, faces = simplify_mesh(mesh.vertices, mesh.faces, SIMPLIFY_TARGET_FACES, SIMPLIFY_TOLERANCE)
+                mesh = type(mesh)(vertices=vertices, faces=faces)
+            mesh.export(filename)
+            METRICS.count('triangles', len(mesh.faces))
+        else:
+            # Solo le facce esposte della bounding box occupata, fuse in rettangoli e scritte
+            # direttamente in STL binario (mesh chiusa, allineata agli assi)
+            lo, hi = bounds
+            if np.prod(hi - lo) > EXPORT_STREAM_VOXELS:
+                # Scene grandi: fette meshate in parallelo e scritte man mano, memoria limitata
+                triangles = export_stl_streaming(session.volume, filename, scale=scale, slab=EXPORT_SLAB, workers=EXPORT_WORKERS,
+                                                 progress=report_export)
+                # Le fette sono mesh aperte sui lati in comune: semplificarle una per una
+                # sposterebbe i vertici di bordo e aprirebbe la mesh
+                if SIMPLIFY_EXPORT:
+                    print("Semplificazione non applicata: scena esportata a fette (oltre EXPORT_STREAM_VOXELS)")
+                    notes = f" (non semplificato: scena oltre {EXPORT_STREAM_VOXELS} voxel, esportata a fette)"
+            else:
+                report("Export STL: mesh delle facce esposte", force=True)
+                vertices, faces = greedy_mesh(session.volume.extract(lo, hi), origin=lo)
+                # La semplificazione lavora nell'unita' dell'export, come la tolleranza
+                vertices = vertices * scale
+                if SIMPLIFY_EXPORT:
+                    vertices, faces = simplify_mesh(vertices, faces, SIMPLIFY_TARGET_FACES, SIMPLIFY_TOLERANCE)
+                triangles = write_stl(filename, vertices, faces)
+            print(f"Mesh a facce esposte: {triangles} triangoli")
+            METRICS.count('triangles', triangles)
+    print(f"File STL salvato come {filename}")
+    return f"File STL salvato come {filename}{notes}"
+
+# AW degli oggetti del database da cui e' costruita la scena della sessione ("load
+# objects" e i "draw" salvati nel database), None se contiene anche altro: primitive
+# non salvate, undo verso scene diverse, snapshot caricati con force. L'elenco vale
+# finche' la radice dell'albero CSG e' quella registrata; una scena vuota non ne ha
+def scene_objects(session):
+    if session.scene.root is None:
+        return []
+    if session.source is None or session.source[0] is not session.scene.root:
+        return None
+    return session.source[1]
+
+def set_scene_objects(session, ids):
+    session.source = None if ids is None else (session.scene.root, list(ids))
+
+# Hash delle sorgenti di uno snapshot: le righe di aige_treedee degli oggetti ids, lette
+# per chiave primaria, e le definizioni (dal database, non dalla cache) delle loro forme.
+# Il resto della tabella non conta: un oggetto aggiunto dopo non rende superato lo snapshot
+def scene_source_hash(ids):
+    rows = load_objects_by_id(ids)
+    shapes = {shape: load_shape_definition(shape) for shape in sorted({row['aw_type'] for row in rows})}
+    return source_hash(rows, shapes)
+
+def snapshot_path(name):
+    return os.path.join(SNAPSHOT_DIR, name + SNAPSHOT_EXTENSION)
+
+# Salva la scena valutata come snapshot binario, ricaricabile senza rasterizzare di nuovo.
+# Una scena che non viene solo dal database ha source None: nessun controllo al caricamento
+def save_scene(name):
+    session = current_session()
+    apply_negative_voxels()
+    os.makedirs(SNAPSHOT_DIR, exist_ok=True)
+    start = time.perf_counter()
+    path = snapshot_path(name)
+    ids = scene_objects(session)
+    source = scene_source_hash(ids) if ids is not None else None
+    size = save_snapshot(session.volume, path, source=source, meta=dict(session=session.name, objects=ids))
+    print(f"Snapshot {path}: {size / 1024 / 1024:.1f}MB in {time.perf_counter() - start:.3f}s")
+    return f"Scena salvata come '{name}' ({size / 1024 / 1024:.1f}MB)"
+
+# Carica uno snapshot al posto della scena attuale. Se gli oggetti del database da cui
+# era costruito sono cambiati dal salvataggio lo snapshot e' superato e viene caricato
+# solo con force. Gli snapshot senza l'elenco degli oggetti (formato precedente) sono
+# sempre considerati superati
+def load_scene(name, force=False):
+    session = current_session()
+    path = snapshot_path(name)
+    if not os.path.exists(path):
+        return f"Nessuno snapshot '{name}'"
+    start = time.perf_counter()
+    header = read_header(path)
+    ids = header['meta'].get('objects')
+    stale = header['source'] is not None and (ids is None or header['source'] != scene_source_hash(ids))
+    if stale and not force:
+        return (f"Lo snapshot '{name}' non e' aggiornato: il database e' cambiato dal salvataggio. "
+                f"Usa 'load objects' oppure 'load scene {name} force'")
+    session.scene.clear()
+    load_snapshot(path, session.volume, header)
+    session.scene.set_base(name)
+    set_scene_objects(session, ids if header['source'] is not None and not stale else None)
+    session.voxels = header['voxels']
+    print(f"Snapshot {path} caricato in {time.perf_counter() - start:.3f}s")
+    update_visualization()
+    return f"Scena '{name}' caricata ({header['voxels']} voxel)"
+
+# Operazioni (tipo, parametri, negativa) di una forma personalizzata posizionata in center
+def custom_shape_operations(shape, center):
+    # Parametri della forma
+    params = shape.parameters
+    operations = shape.operations
+
+    # Calcola le dimensioni esterne della scatola
+    outer_length = params['inner_length'] + 2 * params['wall_thickness']
+    outer_width = params['inner_width'] + 2 * params['wall_thickness']
+    outer_height = params['inner_height'] + params['wall_thickness']
+
+    # Esegui ogni operazione
+    shape_operations = []
+    for op in operations:
+        op_type = op.type
+        op_negative = op.negative
+        with stage('expression'):
+            values = op.evaluate(params)
+
+        if op_type == "cube":
+            length = values['length']
+            width = values['width']
+            height = values['height']
+
+            # Calcola il centro in base all'operazione
+            if op.center == "computed":
+                if op == operations[0]:  # Scatola esterna
+                    op_center = (center[0] + outer_length / 2, center[1] + outer_width / 2, center[2] + outer_height / 2)
+                elif op == operations[1]:  # Interno cavo
+                    op_center = (center[0] + outer_length / 2, center[1] + outer_width / 2, center[2] + outer_height / 2 + params['wall_thickness'] / 2)
+                elif op == operations[2]:  # Rimuovi la parte superiore per vedere l'interno
+                    op_center = (center[0] + outer_length / 2, center[1] + outer_width / 2, center[2] + outer_height - params['wall_thickness'] / 2)
+                elif op == operations[3]:  # Coperchio (posizionato accanto alla scatola)
+                    # Posiziona il coperchio a destra della scatola, con il fondo allineato
+                    lid_center_x = center[0] + outer_length + 5 + length / 2  # 5 mm di spazio
+                    lid_center_y = center[1] + outer_width / 2
+                    lid_center_z = center[2] + height / 2  # Fondo del coperchio allineato con il fondo della scatola
+                    op_center = (lid_center_x, lid_center_y, lid_center_z)
+                else:
+                    op_center = center
+            else:
+                op_center = center
+
+            shape_operations.append(('cube', dict(center=op_center, length=length, width=width, height=height), op_negative))
+
+        elif op_type == "cylinder":
+            radius = values['radius']
+            height = values['height']
+
+            # Calcola il centro in base all'operazione
+            if op.center == "computed":
+                support_center_x = center[0] + params['screw_distance_from_edge'] + params['wall_thickness']
+                support_center_y = center[1] + outer_width / 2
+                if op == operations[4]:  # Supporto per la vite
+                    op_center = (support_center_x, support_center_y, center[2])
+                elif op == operations[5]:  # Foro per la vite
+                    op_center = (support_center_x, support_center_y, center[2])
+                else:
+                    op_center = center
+            else:
+                op_center = center
+
+            shape_operations.append(('cylinder', dict(center=op_center, radius=radius, height=height), op_negative))
+    return shape_operations
+
+# Funzione per disegnare una forma personalizzata dal database
+def draw_custom_shape(shape_name, center, parameters, negative=False):
+    session = current_session()
+    shape = shape_cache.get(shape_name)
+    if shape is None:
+        print(f"Definizione per la forma '{shape_name}' non trovata nel database.")
+        return False
+
+    if shape.type != "custom":
+        print(f"Tipo di definizione '{shape.type}' non supportato per forme personalizzate.")
+        return False
+
+    # In modalita' SDF l'intera forma diventa un solo nodo della scena, valutato a blocchi
+    if SDF_MODE:
+        shape_node = None
+        for kind, op_params, op_negative in custom_shape_operations(shape, center):
+            builder = cube_sdf if kind == 'cube' else cylinder_sdf
+            shape_node = combine(shape_node, builder(**op_params), op_negative)
+        if shape_node is not None:
+            session.scene.add('sdf', dict(node=shape_node))
+        return True
+
+    # Rasterizzata una volta sola con l'origine nella parte intera della posizione,
+    # poi stampata per traslazione: i kernel sono invarianti per traslazioni intere
+    origin = tuple(math.floor(c) for c in center)
+    local_center = tuple(c - o for c, o in zip(center, origin))
+    key = raster_cache.key(shape_name, shape.definition, parameters, local_center)
+    cached = raster_cache.get_or_build(key, lambda: [
+        (RASTERIZERS[kind](**op_params), op_negative, None)
+        for kind, op_params, op_negative in custom_shape_operations(shape, local_center)])
+    for stamp, op_negative, color in cached.stamps(origin):
+        session.scene.add('stamp', dict(stamp=stamp), op_negative, color)
+    return True
+
+# Comandi aggiunti dagli script: (parola chiave, funzione(position, description) -> risposta)
+script_commands = []
+# Oggetti di aige_treedee disegnati da uno script invece che da una forma di aige_shapes:
+# aw_type -> funzione(position, params, negative) -> True se l'oggetto e' stato disegnato
+object_drawers = {}
+
+def register_command(keyword, handler):
+    script_commands.append((keyword, handler))
+
+def register_object(aw_type, drawer):
+    object_drawers[aw_type] = drawer
+
+# Prima parola del comando: i comandi di controllo si riconoscono solo da questa, cosi'
+# una descrizione come 'exit' dentro un altro comando non li attiva
+def command_word(command):
+    words = command.lower().split()
+    return words[0] if words else ""
+
+# Parser del chatbot
+def parse_command(command):
+    global running
+    session = current_session()
+
+    # Argomenti con le maiuscole originali (es. il token di "shutdown")
+    arguments = command.split()[1:]
+    command = command.lower()
+
+    # Estrai la posizione, se specificata
+    position_match = re.search(r"at\s+(\d+),(\d+),(\d+)", command)
+    position = (int(position_match.group(1)), int(position_match.group(2)), int(position_match.group(3))) if position_match else None
+    
+    # Estrai la descrizione, se specificata
+    description_match = re.search(r"description\s+'([^']+)'", command)
+    description = description_match.group(1) if description_match else None
+    
+    negative = "negative" in command
+    word = command_word(command)
+    script_command = next((handler for keyword, handler in script_commands if keyword in command), None)
+
+    # Gestione dei comandi
+    try:
+        if word == "cancel":
+            cancel_match = re.search(r"cancel\s+(\d+)", command)
+            if not cancel_match:
+                return "Comando incompleto: specificare il job (es. 'cancel 3')"
+            job_id = int(cancel_match.group(1))
+            # Solo i job della propria sessione
+            if not job_runner.cancel(job_id, owner=session):
+                return f"Nessun job {job_id} in corso"
+            return f"Annullamento del job {job_id} richiesto"
+        elif re.fullmatch(r"\s*(undo|redo)\s*", command):
+            # Vengono riscritti solo i blocchi toccati dal comando; le righe gia' salvate nel
+            # database restano (un nuovo "load objects" le ridisegna)
+            undo = "undo" in command
+            label = session.journal.undo() if undo else session.journal.redo()
+            if label is None:
+                return "Niente da annullare" if undo else "Niente da ripetere"
+            update_visualization()
+            session.voxels = session.volume.count()
+            return f"{'Annullato' if undo else 'Ripetuto'}: {label}"
+        elif "draw a box" in command:
+            if not position:
+                return "Comando incompleto: specificare la posizione (es. 'Draw a box at 50,50,50')"
+            parameters = {}
+            ids = scene_objects(session)
+            success = draw_custom_shape("box", position, parameters, negative)
+            if not success:
+                return f"Errore: Impossibile disegnare la scatola a {position}"
+            update_visualization()
+            object_id = save_object_to_db("box", parameters, position, negative, description)
+            set_scene_objects(session, None if ids is None else ids + [object_id])
+            return f"Scatola disegnata a {position} (ID: {object_id})"
+        elif script_command is not None:
+            return script_command(position, description)
+        elif "save stl" in command:
+            return export_to_stl(session.export_filename)
+        elif "save scene" in command or "load scene" in command:
+            scene_match = re.search(r"scene\s+([a-z0-9_-]+)", command)
+            if not scene_match:
+                return "Comando incompleto: specificare il nome (es. 'save scene officina')"
+            if "save scene" in command:
+                return save_scene(scene_match.group(1))
+            return load_scene(scene_match.group(1), force=re.search(r"\bforce\b", command) is not None)
+        elif "load objects" in command:
+            object_id_match = re.search(r"id\s+(\d+)", command)
+            object_id = int(object_id_match.group(1)) if object_id_match else None
+            # Ridisegna gli oggetti man mano che arrivano dal cursore
+            loaded_objects = 0
+            total_objects = 0
+            ids = []
+            try:
+                for obj in load_objects_from_db(object_id):
+                    # Punto di annullamento tra un oggetto e l'altro
+                    check_cancelled()
+                    # Cancella lo spazio attuale solo se c'e' almeno un oggetto da caricare
+                    if total_objects == 0:
+                        session.scene.clear()
+                    total_objects += 1
+                    ids.append(obj['AW'])
+                    report(f"Letti {total_objects} oggetti, {loaded_objects} disegnati")
+                    # Le primitive di ogni oggetto formano un gruppo, rasterizzato in parallelo agli altri
+                    session.scene.group = f"{obj['aw_type']} (ID {obj['AW']})"
+                    position = (obj['aw_position_x'], obj['aw_position_y'], obj['aw_position_z'])
+                    params = json.loads(obj['aw_parameters'])
+                    negative = obj['aw_negative']
+                    drawer = object_drawers.get(obj['aw_type'])
+                    if drawer is not None:
+                        success = drawer(position, params, negative)
+                    else:
+                        success = draw_custom_shape(obj['aw_type'], position, params, negative)
+                    if success:
+                        loaded_objects += 1
+            except JobCancelled:
+                # La scena resta con gli oggetti caricati fin qui
+                session.scene.group = None
+                update_visualization()
+                return f"Caricamento annullato: caricati {loaded_objects} oggetti (su {total_objects} letti)."
+            finally:
+                session.scene.group = None
+            if not total_objects:
+                return "Nessun oggetto trovato."
+            # Una sola valutazione CSG e un solo rendering per tutti gli oggetti
+            update_visualization()
+            set_scene_objects(session, ids)
+            return f"Caricati {loaded_objects} oggetti (su {total_objects} totali)."
+        elif "reload shapes" in command:
+            shape_cache.invalidate()
+            return "Definizioni delle forme ricaricate dal database."
+        elif word == "stats":
+            return METRICS.summary()
+        elif word == "shutdown":
+            # Ferma il server per tutte le sessioni: serve il token di amministrazione
+            if not SHUTDOWN_TOKEN or len(arguments) != 1 or \
+                    not hmac.compare_digest(arguments[0].encode('utf-8'), SHUTDOWN_TOKEN.encode('utf-8')):
+                return "Comando 'shutdown' non consentito"
+            running = False
+            # Chiude il ciclo di eventi di VisPy (dal suo thread, al prossimo tick del timer)
+            if render_scheduler is not None:
+                render_scheduler.quit()
+            return "Chiusura dell'applicazione..."
+        elif word == "exit":
+            # Chiude solo la connessione (e la sua sessione, se anonima)
+            return f"Sessione '{session.name}' chiusa"
+        else:
+            return "Comando non riconosciuto"
+    except JobCancelled:
+        raise
+    except SnapshotError as e:
+        print(f"Errore nello snapshot: {e}")
+        return f"Errore: {e}"
+    except TimeoutError as e:
+        print(f"Database non disponibile: {e}")
+        return f"Errore: {e}"
+    except Exception as e:
+        print(f"Errore durante il parsing del comando: {e}")
+        return "Comando incompleto o non riconosciuto"
+
+# Etichetta del comando negli istogrammi di latenza
+def command_kind(command):
+    command = command.lower()
+    kinds = COMMAND_KINDS + tuple(keyword for keyword, _ in script_commands)
+    return next((kind for kind in kinds if kind in command), "other")
+
+# Esecuzione di un comando: un comando alla volta per sessione. I job della stessa sessione
+# arrivano gia' in fila dal JobRunner (owner=session); il lock vale per chi chiama
+# direttamente, come batch.py.
+# "profile <comando>" esegue il comando sotto cProfile e salva il profilo (.prof, per
+# pstats o snakeviz) nella directory corrente
+def run_command(command, session):
+    profile_match = re.match(r"\s*profile\s+(.+)", command, re.IGNORECASE)
+    if profile_match:
+        filename = f"profile_{session.name}_{time.strftime('%Y%m%d_%H%M%S')}.prof"
+        response, stats = profile_call(partial(run_command, profile_match.group(1), session), filename)
+        print(stats)
+        return f"{response}\nProfilo salvato in {filename}"
+    with session.lock, activate(session), METRICS.timed('command', command_kind(command)):
+        if sessions.over_limit(session) and not command.lower().strip().startswith(LIMIT_EXEMPT_COMMANDS):
+            return (f"Limite della sessione superato ({session.nbytes / 1024 / 1024:.0f}MB di memoria su "
+                    f"{sessions.max_bytes / 1024 / 1024:.0f}MB, {session.disk_bytes / 1024 / 1024:.0f}MB su disco su "
+                    f"{sessions.max_disk_bytes / 1024 / 1024:.0f}MB): esporta la scena o ricaricala con 'load objects id <n>'")
+        # Tutto cio' che il comando scrive nel volume diventa una modifica annullabile
+        with session.journal.edit(command.strip()):
+            response = parse_command(command)
+    if METRICS_FILE:
+        METRICS.write_prometheus(METRICS_FILE)
+    return response
+
+# Server WebSocket
+# Ogni comando diventa un job: il client riceve subito l'ID, poi i messaggi di
+# avanzamento e la risposta finale, tutti con il prefisso "[job ID]". Il ciclo asyncio
+# resta libero per gli altri comandi e connessioni mentre il job e' in esecuzione.
+# Ogni connessione lavora sulla propria sessione (anonima, o con nome dopo "session <nome>");
+# "exit" chiude la connessione, "shutdown <token>" il server.
+async def handle_websocket(websocket, path):
+    global running
+    loop = asyncio.get_running_loop()
+    tasks = set()
+    try:
+        session = sessions.open()
+    except SessionLimitError as e:
+        await websocket.send(f"Errore: {e}")
+        return
+
+    # Chiamata dal thread del job
+    def send_progress(job, message):
+        asyncio.run_coroutine_threadsafe(websocket.send(f"[job {job.id}] {message}"), loop)
+
+    async def send_result(job):
+        response = await asyncio.wrap_future(job.future)
+        try:
+            await websocket.send(f"[job {job.id}] {response}")
+        except websockets.ConnectionClosed:
+            pass
+
+    try:
+        async for message in websocket:
+            print(f"Ricevuto comando: {message}")
+            session_match = re.match(r"\s*session\s+([a-z0-9_-]+)\s*$", message.lower())
+            if session_match:
+                try:
+                    named = sessions.open(session_match.group(1))
+                except (SessionLimitError, SessionNameError) as e:
+                    await websocket.send(f"Errore: {e}")
+                    continue
+                sessions.release(session)
+                session = named
+                await websocket.send(f"Sessione '{session.name}' ({session.connections} connessioni)")
+                continue
+            if command_word(message) in INLINE_COMMANDS:
+                with activate(session):
+                    response = parse_command(message)
+                await websocket.send(response)
+                if not running or command_word(message) == "exit":
+                    break
+                continue
+            job = job_runner.submit(message, partial(run_command, session=session), send_progress, owner=session)
+            await websocket.send(f"[job {job.id}] Avviato: {message} (annulla con 'cancel {job.id}')")
+            task = asyncio.ensure_future(send_result(job))
+            tasks.add(task)
+            task.add_done_callback(tasks.discard)
+    except websockets.ConnectionClosed:
+        print("Connessione WebSocket chiusa dal client")
+    except Exception as e:
+        print(f"Errore nel WebSocket: {e}")
+        await websocket.send(f"Errore: {str(e)}")
+    finally:
+        sessions.release(session)
+        if not running:
+            print("Terminazione del server WebSocket...")
+        await websocket.close()
+
+# Funzione per avviare il server WebSocket in un thread separato
+def start_websocket_server():
+    loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(loop)
+    loop.run_until_complete(websocket_server())
+    loop.close()
+
+async def websocket_server():
+    server = await websockets.serve(handle_websocket, "localhost", 8765)
+    print("Server WebSocket avviato su ws://localhost:8765")
+    while running:
+        await asyncio.sleep(1)
+        sessions.evict_idle()
+    server.close()
+    await server.wait_closed()
+
+# Avvia il server WebSocket e il rendering (in modalita' headless solo il server)
+def main():
+    if METRICS_PORT:
+        METRICS.serve(METRICS_PORT)
+    if HEADLESS:
+        print(f"Avvio headless in {time.perf_counter() - STARTED:.3f}s")
+        start_websocket_server()
+        job_runner.shutdown()
+        return
+    init_rendering()
+    print(f"Avvio in {time.perf_counter() - STARTED:.3f}s")
+    from vispy import app
+    websocket_thread = threading.Thread(target=start_websocket_server)
+    websocket_thread.start()
+    app.run()
+    job_runner.shutdown()
+    # Aspetta che il thread del WebSocket termini
+    websocket_thread.join()
@@ -0,0 +1,82 @@
+import os
+import time
+from collections import deque
+
+import numpy as np
+
+from mesher import mesh_slab
+from rebuild import shared_pool
+from stl import StlWriter
+
+# Spessore (in voxel lungo x) delle fette meshate da ogni worker
+EXPORT_SLAB = 64
+# Processi usati per l'export a fette
+EXPORT_WORKERS = os.cpu_count() or 1
+
+
+# Fetta [x0 - 1, x1 + 1) della bounding box occupata, con gli strati fuori dallo spazio vuoti.
+# Viaggia verso i worker come bitmap (np.packbits): un bit per voxel.
+def _slab_block(volume, x0, x1, lo, hi):
+    shape = (x1 - x0 + 2, hi[1] - lo[1], hi[2] - lo[2])
+    block = np.zeros(shape, dtype=bool)
+    a, b = max(x0 - 1, 0), min(x1 + 1, volume.size)
+    block[a - (x0 - 1):b - (x0 - 1)] = volume.extract((a, lo[1], lo[2]), (b, hi[1], hi[2])) > 0
+    return np.packbits(block), shape
+
+
+def _mesh_packed(packed, shape, origin, scale):
+    block = np.unpackbits(packed, count=int(np.prod(shape))).view(bool).reshape(shape)
+    return mesh_slab(block, origin, scale)
+
+
+# Export STL in streaming: la bounding box occupata viene divisa in fette lungo x, meshate
+# in parallelo dai worker e scritte nel file nell'ordine, appena pronte. In memoria ci
+# sono al massimo 2 * workers fette alla volta, qualunque sia la dimensione della scena;
+# il numero di triangoli viene scritto nell'intestazione alla chiusura del file.
+# progress(fette scritte, fette totali) viene chiamata dopo ogni fetta; se solleva
+# un'eccezione (es. annullamento) l'export si ferma e il file incompleto viene rimosso.
+# Restituisce il numero di triangoli scritti.
+def export_stl_streaming(volume, filename, scale=1.0, slab=EXPORT_SLAB, workers=EXPORT_WORKERS, progress=None):
+    bounds = volume.bounds()
+    if bounds is None:
+        return 0
+    start = time.time()
+    lo, hi = (tuple(int(v) for v in b) for b in bounds)
+    slabs = [(x0, min(x0 + slab, hi[0])) for x0 in range(lo[0], hi[0], slab)]
+    # Worker del pool condiviso con la ricostruzione parallela
+    executor = shared_pool(workers) if workers > 1 else None
+    pending = deque()
+    written = 0
+
+    def write(triangles):
+        nonlocal written
+        writer.write_triangles(triangles)
+        written += 1
+        if progress is not None:
+            progress(written, len(slabs))
+
+    try:
+        with StlWriter(filename) as writer:
+            try:
+                for x0, x1 in slabs:
+                    packed, shape = _slab_block(volume, x0, x1, lo, hi)
+                    origin = (x0 - 1, lo[1], lo[2])
+                    if executor is None:
+                        write(_mesh_packed(packed, shape, origin, scale))
+                        continue
+                    pending.append(executor.submit(_mesh_packed, packed, shape, origin, scale))
+                    # Finestra limitata: si aspetta la fetta piu' vecchia prima di estrarne altre
+                    while len(pending) >= 2 * workers:
+                        write(pending.popleft().result())
+                while pending:
+                    write(pending.popleft().result())
+            finally:
+                for future in pending:
+                    future.cancel()
+    except BaseException:
+        if os.path.exists(filename):
+            os.remove(filename)
+        raise
+    print(f"Export a fette: {len(slabs)} fette da {slab} voxel, {writer.count} triangoli "
+          f"su {workers} processi in {time.time() - start:.3f}s")
+    return writer.count
@@ -0,0 +1,175 @@
+import itertools
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+
+# Thread che eseguono i comandi lunghi
+JOB_WORKERS = 4
+# Intervallo minimo (s) tra due messaggi di avanzamento dello stesso job
+PROGRESS_INTERVAL = 0.5
+
+_local = threading.local()
+
+
+# Sollevata dentro un job quando ne e' stato richiesto l'annullamento
+class JobCancelled(Exception):
+    pass
+
+
+# Comando eseguito nel pool. L'annullamento e' cooperativo: il codice del comando chiama
+# check_cancelled() nei punti in cui puo' fermarsi lasciando la scena coerente (tra un
+# oggetto e l'altro, tra una fetta e l'altra dell'export).
+class Job:
+    def __init__(self, job_id, command, on_progress=None, owner=None):
+        self.id = job_id
+        self.command = command
+        self.on_progress = on_progress
+        self.owner = owner  # chi ha avviato il job (la sessione), l'unico che puo' annullarlo
+        self.cancel_event = threading.Event()
+        self.future = None
+        self.started = None
+        self.finished = None
+        self._last_report = 0.0
+
+    @property
+    def cancelled(self):
+        return self.cancel_event.is_set()
+
+    @property
+    def status(self):
+        if self.finished is not None:
+            return "annullato" if self.cancelled else "completato"
+        if self.started is not None:
+            return "in esecuzione"
+        return "in coda"
+
+    def cancel(self):
+        self.cancel_event.set()
+
+    def check(self):
+        if self.cancelled:
+            raise JobCancelled(f"Job {self.id} annullato")
+
+    # Inoltra un messaggio di avanzamento, al massimo uno ogni PROGRESS_INTERVAL
+    # secondi (sempre se force)
+    def report(self, message, force=False):
+        now = time.time()
+        if self.on_progress is None or (not force and now - self._last_report < PROGRESS_INTERVAL):
+            return
+        self._last_report = now
+        self.on_progress(self, message)
+
+
+# Job eseguito dal thread corrente (None fuori dal pool)
+def current_job():
+    return getattr(_local, 'job', None)
+
+
+# Avanzamento e punto di annullamento del job corrente; senza job non fanno nulla, cosi'
+# le stesse funzioni possono essere chiamate anche fuori dal pool
+def report(message, force=False):
+    job = current_job()
+    if job is not None:
+        job.report(message, force)
+
+
+def check_cancelled():
+    job = current_job()
+    if job is not None:
+        job.check()
+
+
+# Pool di thread per i comandi: submit() restituisce subito il Job con il suo ID, il
+# risultato (la risposta del comando) arriva da job.future.
+# I job dello stesso owner vengono eseguiti uno alla volta, nell'ordine di arrivo: finche'
+# uno e' in esecuzione i successivi aspettano nella coda dell'owner, senza occupare un
+# thread del pool, e ciascuno viene passato al pool quando il precedente finisce
+class JobRunner:
+    def __init__(self, workers=JOB_WORKERS):
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='text2cad-job')
+        self.jobs = {}
+        self.queues = {}  # owner con un job in esecuzione -> job in attesa (job, execute)
+        self.lock = threading.Lock()
+        self._ids = itertools.count(1)
+
+    def submit(self, command, execute, on_progress=None, owner=None):
+        with self.lock:
+            job = Job(next(self._ids), command, on_progress, owner)
+            job.future = Future()
+            self.jobs[job.id] = job
+            if owner is not None:
+                queue = self.queues.get(owner)
+                if queue is not None:
+                    queue.append((job, execute))
+                    return job
+                self.queues[owner] = deque()
+        self.executor.submit(self._run, job, execute)
+        return job
+
+    def _run(self, job, execute):
+        _local.job = job
+        job.started = time.time()
+        result = error = None
+        try:
+            job.check()
+            result = execute(job.command)
+        except JobCancelled as e:
+            result = str(e)
+        except Exception as e:
+            # Il client riceve comunque una risposta, come per gli errori del parser
+            print(f"Errore nel job {job.id} ({job.command}): {e!r}")
+            result = f"Errore: {e}"
+        except BaseException as e:
+            error = e
+        finally:
+            _local.job = None
+            job.finished = time.time()
+            with self.lock:
+                self.jobs.pop(job.id, None)
+        if error is not None:
+            job.future.set_exception(error)
+        else:
+            job.future.set_result(result)
+        self._start_next(job.owner)
+
+    # Passa al pool il prossimo job in attesa dell'owner, o chiude la sua coda se e' vuota
+    def _start_next(self, owner):
+        with self.lock:
+            queue = self.queues.get(owner)
+            if queue is None:
+                return
+            if not queue:
+                del self.queues[owner]
+                return
+            job, execute = queue.popleft()
+        self.executor.submit(self._run, job, execute)
+
+    # Richiede l'annullamento di un job in coda o in esecuzione; False se non esiste o se
+    # appartiene a un altro owner (senza distinguere i due casi, per non rivelare i job altrui)
+    def cancel(self, job_id, owner=None):
+        with self.lock:
+            job = self.jobs.get(job_id)
+        if job is None or (owner is not None and job.owner is not owner):
+            return False
+        job.cancel()
+        return True
+
+    def active(self):
+        with self.lock:
+            return list(self.jobs.values())
+
+    # Annulla i job in esecuzione; quelli ancora in coda terminano subito come annullati
+    def shutdown(self):
+        with self.lock:
+            queued = [job for queue in self.queues.values() for job, _ in queue]
+            self.queues.clear()
+            for job in queued:
+                self.jobs.pop(job.id, None)
+        for job in self.active():
+            job.cancel()
+        for job in queued:
+            job.cancel()
+            job.finished = time.time()
+            job.future.set_result(f"Job {job.id} annullato")
+        self.executor.shutdown(wait=False)
@@ -0,0 +1,269 @@
+from collections import deque
+from contextlib import contextmanager
+
+import numpy as np
+
+# Modifiche annullabili al massimo per sessione
+JOURNAL_DEPTH = 32
+# Memoria massima dei diff di una sessione (undo e redo insieme)
+JOURNAL_MAX_BYTES = 256 * 1024 * 1024
+
+
+# Insieme di voxel di un blocco in forma compatta: None se vuoto, True se sono tutti,
+# indici piatti (uint16/uint32) se sono pochi, altrimenti bitmap uint8 (np.packbits)
+def _pack(mask):
+    count = int(np.count_nonzero(mask))
+    if count == 0:
+        return None
+    if count == mask.size:
+        return True
+    if count * 2 < mask.size // 8:
+        return np.flatnonzero(mask).astype(np.uint16 if mask.size <= 65536 else np.uint32)
+    return np.packbits(mask, axis=None)
+
+
+# Indici piatti dei voxel di un insieme compatto (una slice per tutto il blocco)
+def _unpack(voxels, size):
+    if voxels is True:
+        return slice(None)
+    if voxels.dtype == np.uint8:
+        return np.flatnonzero(np.unpackbits(voxels, count=size))
+    return voxels
+
+
+# Indici colore dei voxel index di un blocco (colors e' un array o l'indice uniforme);
+# valori tutti uguali ridotti a un solo indice
+def _values(colors, index):
+    if not isinstance(colors, np.ndarray):
+        return int(colors)
+    values = colors.reshape(-1)[index]
+    if np.all(values == values.flat[0]):
+        return int(values.flat[0])
+    return values.copy()
+
+
+def _nbytes(value):
+    return value.nbytes if isinstance(value, np.ndarray) else 0
+
+
+# Effetto di una modifica su un blocco: voxel invertiti e l'indice colore di prima e di
+# dopo dei voxel invertiti o ricolorati (i colori dei voxel vuoti non contano)
+class BlockDiff:
+    def __init__(self, shape, flipped, colors):
+        self.shape = shape
+        self.flipped = flipped   # insieme compatto
+        self.colors = colors     # (insieme compatto, prima, dopo) o None
+
+    # Diff tra due stati (occupazione o None, colori) dello stesso blocco; None se uguali
+    @classmethod
+    def between(cls, before, before_colors, after, after_colors):
+        if before is None and after is None:
+            return None
+        shape = (before if before is not None else after).shape
+        was = np.zeros(shape, dtype=bool) if before is None else before != 0
+        now = np.zeros(shape, dtype=bool) if after is None else after != 0
+        flipped = was ^ now
+        voxels = _pack(flipped)
+        colors = None
+        if isinstance(before_colors, np.ndarray) or isinstance(after_colors, np.ndarray):
+            changed = ((before_colors != after_colors) & (was | now)) | flipped
+        elif before_colors != after_colors:
+            changed = was | now
+        else:
+            # Stesso colore uniforme prima e dopo (o nessun canale colore): nulla da ricordare
+            changed = None
+        if changed is not None:
+            # Spesso i voxel ricolorati sono proprio quelli invertiti: l'insieme e' condiviso
+            recolored = voxels if np.array_equal(changed, flipped) else _pack(changed)
+            if recolored is not None:
+                index = _unpack(recolored, flipped.size)
+                colors = (recolored, _values(before_colors, index), _values(after_colors, index))
+        if voxels is None and colors is None:
+            return None
+        return cls(shape, voxels, colors)
+
+    @property
+    def nbytes(self):
+        if self.colors is None:
+            return _nbytes(self.flipped)
+        voxels, before, after = self.colors
+        shared = voxels is self.flipped
+        return _nbytes(self.flipped) + (0 if shared else _nbytes(voxels)) + _nbytes(before) + _nbytes(after)
+
+    # Riporta il blocco allo stato di prima (undo) o di dopo (redo) la modifica
+    def apply(self, volume, key, undo):
+        occupancy, colors = volume.block(key)
+        occupancy = np.zeros(self.shape, dtype=np.uint8) if occupancy is None else occupancy.copy()
+        flipped = None
+        if self.flipped is not None:
+            flipped = _unpack(self.flipped, occupancy.size)
+            occupancy.reshape(-1)[flipped] ^= 1
+        if isinstance(colors, np.ndarray):
+            colors = colors.copy()
+        if self.colors is not None:
+            voxels, before, after = self.colors
+            value = before if undo else after
+            if voxels is True and not isinstance(value, np.ndarray):
+                colors = value
+            else:
+                index = flipped if voxels is self.flipped else _unpack(voxels, occupancy.size)
+                colors = np.array(np.broadcast_to(colors, self.shape), dtype=np.uint8)
+                colors.reshape(-1)[index] = value
+                # Colore uniforme sui voxel pieni: basta l'indice
+                values = colors[occupancy != 0]
+                if len(values) and np.all(values == values[0]):
+                    colors = int(values[0])
+        volume.set_block(key, occupancy, colors)
+
+
+# Modifica registrata: etichetta (il comando), diff dei blocchi toccati e radice
+# dell'albero CSG prima e dopo
+class Edit:
+    def __init__(self, label, generation, root_before):
+        self.label = label
+        self.generation = generation
+        self.root_before = root_before
+        self.root_after = None
+        self.priors = {}   # chiave -> (occupazione, colori) prima della modifica
+        self.diffs = {}
+        self.overflow = False
+        self.nbytes = 0
+
+
+# Journal delle modifiche di una scena per undo/redo. Il volume avvisa il journal prima di
+# modificare un blocco (capture): alla prima modifica di una modifica aperta lo stato del
+# blocco viene copiato, e alla chiusura (commit) resta solo il diff rispetto allo stato
+# finale. Undo e redo riscrivono solo i blocchi del diff, quindi costano quanto la modifica
+# e non quanto la scena. Un clear() del volume (es. "load objects", "load scene") svuota
+# il journal; il database non viene toccato.
+class Journal:
+    def __init__(self, volume, scene, depth=JOURNAL_DEPTH, max_bytes=JOURNAL_MAX_BYTES):
+        self.volume = volume
+        self.scene = scene
+        self.depth = depth
+        self.max_bytes = max_bytes
+        self.undo_stack = deque()
+        self.redo_stack = []
+        self.current = None
+        self.restoring = False
+        self.generation = volume.generation
+        volume.journal = self
+
+    @property
+    def nbytes(self):
+        return sum(edit.nbytes for edit in self.undo_stack) + sum(edit.nbytes for edit in self.redo_stack)
+
+    def reset(self):
+        self.undo_stack.clear()
+        self.redo_stack.clear()
+        self.generation = self.volume.generation
+
+    def begin(self, label):
+        self.current = Edit(label, self.volume.generation, self.scene.root)
+
+    # Chiamata dal volume prima di modificare il blocco key. I diff valgono solo a partire
+    # dallo stato esatto in cui sono stati registrati: una scrittura fuori da una modifica
+    # aperta (e non dovuta a undo/redo) invalida il journal
+    def capture(self, key):
+        edit = self.current
+        if edit is None:
+            if not self.restoring and (self.undo_stack or self.redo_stack):
+                self.reset()
+            return
+        if edit.overflow or key in edit.priors:
+            return
+        if self.volume.generation != edit.generation:
+            # Volume svuotato durante la modifica: non c'e' uno stato precedente da ricordare
+            edit.overflow = True
+            edit.priors.clear()
+            return
+        occupancy, colors = self.volume.block(key)
+        prior = (None if occupancy is None else occupancy.copy(),
+                 colors.copy() if isinstance(colors, np.ndarray) else colors)
+        edit.priors[key] = prior
+        edit.nbytes += sum(a.nbytes for a in prior if isinstance(a, np.ndarray))
+        if edit.nbytes > self.max_bytes:
+            edit.overflow = True
+            edit.priors.clear()
+
+    # Chiude la modifica aperta: valuta le primitive in sospeso e conserva il diff dei
+    # blocchi cambiati; restituisce l'Edit registrato o None
+    def commit(self):
+        edit = self.current
+        if edit is None:
+            return None
+        try:
+            if self.scene.dirty:
+                self.scene.evaluate()
+        finally:
+            self.current = None
+        if self.volume.generation != self.generation:
+            # Volume svuotato: la storia precedente non vale piu', e nemmeno questa modifica
+            # se lo svuotamento e' avvenuto durante la modifica
+            self.reset()
+            if edit.generation != self.generation:
+                return None
+        if edit.overflow:
+            print(f"Modifica '{edit.label}' troppo grande per il journal: non annullabile")
+            self.reset()
+            return None
+        for key, (occupancy, colors) in edit.priors.items():
+            diff = BlockDiff.between(occupancy, colors, *self.volume.block(key))
+            if diff is not None:
+                edit.diffs[key] = diff
+        edit.priors = {}
+        edit.root_after = self.scene.root
+        if not edit.diffs and edit.root_after is edit.root_before:
+            return None
+        edit.nbytes = sum(diff.nbytes for diff in edit.diffs.values())
+        self.undo_stack.append(edit)
+        self.redo_stack.clear()
+        while self.undo_stack and (len(self.undo_stack) > self.depth or self.nbytes > self.max_bytes):
+            self.undo_stack.popleft()
+        return edit
+
+    # Registra come un'unica modifica tutto cio' che avviene nel blocco with
+    @contextmanager
+    def edit(self, label):
+        self.begin(label)
+        try:
+            yield
+        finally:
+            self.commit()
+
+    # Prepara undo/redo: il comando in corso non e' una modifica da registrare, e le
+    # primitive in sospeso vengono prima valutate
+    def _prepare(self):
+        self.current = None
+        if self.scene.dirty:
+            self.scene.evaluate()
+        if self.volume.generation != self.generation:
+            self.reset()
+
+    def _restore(self, edit, undo):
+        self.restoring = True
+        try:
+            for key, diff in edit.diffs.items():
+                diff.apply(self.volume, key, undo)
+        finally:
+            self.restoring = False
+        self.scene.root = edit.root_before if undo else edit.root_after
+
+    # Annulla l'ultima modifica; restituisce la sua etichetta (None se non c'e' nulla)
+    def undo(self):
+        self._prepare()
+        if not self.undo_stack:
+            return None
+        edit = self.undo_stack.pop()
+        self._restore(edit, undo=True)
+        self.redo_stack.append(edit)
+        return edit.label
+
+    def redo(self):
+        self._prepare()
+        if not self.redo_stack:
+            return None
+        edit = self.redo_stack.pop()
+        self._restore(edit, undo=False)
+        self.undo_stack.append(edit)
+        return edit.label
@@ -0,0 +1,185 @@
+import numpy as np
+
+
+# Rettangoli di facce esposte perpendicolari ad axis, con la normale verso sign.
+# Le facce esposte di ogni piano vengono prima unite in segmenti lungo u e poi i segmenti
+# identici su righe consecutive lungo v (row_axis, se diverso da axis) vengono fusi in
+# rettangoli (greedy a strisce, tutto vettoriale). Restituisce gli angoli (n, 4, 3) sul
+# reticolo intero dei vertici dei voxel, in senso antiorario visti dall'esterno.
+def _quads(occupancy, axis, sign, row_axis=None):
+    if row_axis is None or row_axis == axis:
+        u, v = (axis + 1) % 3, (axis + 2) % 3
+    else:
+        u, v = 3 - axis - row_axis, row_axis
+    occ = np.transpose(occupancy, (axis, v, u))
+    if sign > 0:
+        exposed = occ.copy()
+        exposed[:-1] &= ~occ[1:]
+    else:
+        exposed = occ.copy()
+        exposed[1:] &= ~occ[:-1]
+    edges = np.zeros(exposed.shape[:2] + (exposed.shape[2] + 2,), dtype=np.int8)
+    edges[..., 1:-1] = exposed
+    diff = np.diff(edges, axis=2)
+    # Inizi (+1) e fine (-1) dei segmenti si alternano su ogni riga
+    w, row, pos = np.nonzero(diff)
+    if len(w) == 0:
+        return np.zeros((0, 4, 3), dtype=np.int64)
+    w, row, u0, u1 = w[::2], row[::2], pos[::2], pos[1::2]
+
+    order = np.lexsort((row, u1, u0, w))
+    w, row, u0, u1 = w[order], row[order], u0[order], u1[order]
+    new = np.ones(len(w), dtype=bool)
+    new[1:] = (w[1:] != w[:-1]) | (u0[1:] != u0[:-1]) | (u1[1:] != u1[:-1]) | (row[1:] != row[:-1] + 1)
+    starts = np.flatnonzero(new)
+    ends = np.append(starts[1:], len(w)) - 1
+
+    plane = w[starts] + (1 if sign > 0 else 0)
+    a0, a1 = u0[starts], u1[starts]
+    b0, b1 = row[starts], row[ends] + 1
+    # (u, v) nell'ordine ciclico degli assi: u x v ha il verso di axis
+    if (sign > 0) == (u == (axis + 1) % 3):
+        corners_uv = [(a0, b0), (a1, b0), (a1, b1), (a0, b1)]
+    else:
+        corners_uv = [(a0, b0), (a0, b1), (a1, b1), (a1, b0)]
+    quads = np.empty((len(starts), 4, 3), dtype=np.int64)
+    for k, (cu, cv) in enumerate(corners_uv):
+        quads[:, k, axis] = plane
+        quads[:, k, u] = cu
+        quads[:, k, v] = cv
+    return quads
+
+
+# Triangola i rettangoli senza T-junction: gli angoli di altri rettangoli che cadono sul
+# bordo di un rettangolo vengono inseriti nel suo contorno, cosi' i lati adiacenti sono
+# divisi negli stessi punti e la mesh resta chiusa. I rettangoli senza vertici sul bordo
+# diventano due triangoli, gli altri un ventaglio attorno al centro.
+# extra sono altri punti del reticolo da inserire sui lati (i vertici delle giunzioni tra
+# blocchi meshati separatamente).
+def _triangulate(quads, extra=None):
+    points = quads.reshape(-1, 3) if extra is None or len(extra) == 0 else np.concatenate([quads.reshape(-1, 3), extra])
+    span = int(points.max()) + 2
+    codes = (points[:, 0] * span + points[:, 1]) * span + points[:, 2]
+    keys, inverse = np.unique(codes, return_inverse=True)
+    corner_ids = inverse[:4 * len(quads)].reshape(-1, 4)
+    lattice = np.stack([keys // (span * span), keys // span % span, keys % span], axis=1)
+
+    # Per ogni asse: vertici ordinati per retta (le altre due coordinate) e posizione
+    n = len(quads)
+    extra_lo = np.zeros((n, 4), dtype=np.int64)
+    extra_hi = np.zeros((n, 4), dtype=np.int64)
+    edge_axis = np.zeros((n, 4), dtype=np.int64)
+    line_ids = []
+    for axis in range(3):
+        o1, o2 = (axis + 1) % 3, (axis + 2) % 3
+        line_codes = (lattice[:, o1] * span + lattice[:, o2]) * span + lattice[:, axis]
+        order = np.argsort(line_codes)
+        sorted_codes = line_codes[order]
+        line_ids.append(order)
+        for k in range(4):
+            p0, p1 = quads[:, k], quads[:, (k + 1) % 4]
+            along = p0[:, axis] != p1[:, axis]
+            base = (p0[:, o1] * span + p0[:, o2]) * span
+            t0 = np.minimum(p0[:, axis], p1[:, axis])
+            t1 = np.maximum(p0[:, axis], p1[:, axis])
+            lo = np.searchsorted(sorted_codes, base + t0, side='right')
+            hi = np.searchsorted(sorted_codes, base + t1, side='left')
+            extra_lo[along, k] = lo[along]
+            extra_hi[along, k] = hi[along]
+            edge_axis[along, k] = axis
+
+    simple = np.all(extra_hi <= extra_lo, axis=1)
+    c = corner_ids[simple]
+    faces = [np.concatenate([c[:, [0, 1, 2]], c[:, [0, 2, 3]]])]
+    vertices = [lattice.astype(np.float64)]
+    complex_ids = np.flatnonzero(~simple)
+    if len(complex_ids):
+        rings = []
+        corners = corner_ids[complex_ids].tolist()
+        spans = np.stack([extra_lo[complex_ids], extra_hi[complex_ids], edge_axis[complex_ids]], axis=2).tolist()
+        descending = (np.take_along_axis(quads[complex_ids], edge_axis[complex_ids][:, :, None], axis=2)[:, :, 0] >
+                      np.take_along_axis(np.roll(quads[complex_ids], -1, axis=1), edge_axis[complex_ids][:, :, None],
+                                         axis=2)[:, :, 0]).tolist()
+        for q in range(len(complex_ids)):
+            ring = []
+            for k in range(4):
+                ring.append(corners[q][k])
+                lo, hi, axis = spans[q][k]
+                if hi > lo:
+                    # Vertici lungo il lato nel verso del contorno
+                    inner = line_ids[axis][lo:hi].tolist()
+                    ring.extend(inner[::-1] if descending[q][k] else inner)
+            rings.append(ring)
+        lengths = np.array([len(ring) for ring in rings])
+        flat = np.fromiter((v for ring in rings for v in ring), dtype=np.int64, count=int(lengths.sum()))
+        # Ventaglio: (centro, vertice, vertice successivo sul contorno)
+        following = np.arange(1, len(flat) + 1)
+        ring_ends = np.cumsum(lengths)
+        following[ring_ends - 1] = ring_ends - lengths
+        fan = np.empty((len(flat), 3), dtype=np.int64)
+        fan[:, 0] = np.repeat(len(lattice) + np.arange(len(rings)), lengths)
+        fan[:, 1] = flat
+        fan[:, 2] = flat[following]
+        faces.append(fan)
+        vertices.append(quads[complex_ids].mean(axis=1))
+    return np.concatenate(vertices), np.concatenate(faces)
+
+
+# Mesh chiusa delle sole facce esposte della matrice di occupazione, con le facce
+# complanari fuse in rettangoli. Il voxel i occupa il cubo [i - 0.5, i + 0.5] traslato
+# di origin, come i marker del rendering. Restituisce (vertices, faces).
+def greedy_mesh(occupancy, origin=(0, 0, 0)):
+    occupancy = np.asarray(occupancy, dtype=bool)
+    quads = [_quads(occupancy, axis, sign) for axis in range(3) for sign in (1, -1)]
+    quads = np.concatenate(quads)
+    if len(quads) == 0:
+        return np.zeros((0, 3)), np.zeros((0, 3), dtype=np.int64)
+    vertices, faces = _triangulate(quads)
+    vertices += np.asarray(origin, dtype=np.float64) - 0.5
+    return vertices, faces
+
+
+# Angoli delle facce sul piano x = plane del blocco
+def _corners_on_plane(quads, plane):
+    corners = quads.reshape(-1, 3)
+    return corners[corners[:, 0] == plane]
+
+
+# Mesh di una fetta lungo x per l'export a blocchi. block contiene le fette [x0 - 1, x1 + 1)
+# (lo strato in piu' per parte e' quello dei vicini, vuoto fuori dallo spazio) e origin e'
+# la posizione globale di block[0, 0, 0]. Le facce vengono fuse solo dentro la fetta, con
+# le righe lungo x: cosi' gli angoli sul piano di giunzione dipendono solo dai due strati
+# che lo toccano. Ogni fetta li ricalcola anche per il lato del vicino e li inserisce nei
+# propri lati, quindi le due parti dividono la giunzione negli stessi punti e la mesh
+# complessiva resta chiusa. Restituisce i triangoli (n, 3, 3) in float32, scalati.
+def mesh_slab(block, origin=(0, 0, 0), scale=1.0):
+    block = np.asarray(block, dtype=bool)
+    n = len(block) - 2
+    quads = []
+    for axis in (1, 2):
+        for sign in (1, -1):
+            q = _quads(block[1:-1], axis, sign, row_axis=0)
+            q[..., 0] += 1
+            quads.append(q)
+    for sign in (1, -1):
+        q = _quads(block, 0, sign)
+        owner = q[:, 0, 0] - 1 if sign > 0 else q[:, 0, 0]
+        quads.append(q[(owner >= 1) & (owner <= n)])
+    quads = np.concatenate(quads)
+    if len(quads) == 0:
+        return np.zeros((0, 3, 3), dtype=np.float32)
+
+    seams = []
+    for layer, plane in ((0, 1), (n + 1, n + 1)):
+        for axis in (1, 2):
+            for sign in (1, -1):
+                q = _quads(block[layer:layer + 1], axis, sign, row_axis=0)
+                q[..., 0] += layer
+                seams.append(_corners_on_plane(q, plane))
+        for sign in (1, -1):
+            q = _quads(block[plane - 1:plane + 1], 0, sign)
+            q[..., 0] += plane - 1
+            seams.append(_corners_on_plane(q, plane))
+    vertices, faces = _triangulate(quads, np.concatenate(seams))
+    vertices += np.asarray(origin, dtype=np.float64) - 0.5
+    return (vertices[faces] * scale).astype(np.float32)
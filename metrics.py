@@ -0,0 +1,210 @@
+import cProfile
+import io
+import os
+import pstats
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+# Limiti superiori (s) dei bucket degli istogrammi di latenza, come in Prometheus
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+
+# Istogramma cumulativo a bucket fissi, con somma, conteggio e massimo
+class Histogram:
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def observe(self, value):
+        i = 0
+        while i < len(self.buckets) and value > self.buckets[i]:
+            i += 1
+        self.counts[i] += 1
+        self.count += 1
+        self.sum += value
+        self.max = max(self.max, value)
+
+    # Quantile stimato dal limite superiore del bucket che lo contiene
+    def quantile(self, q):
+        if not self.count:
+            return 0.0
+        target = q * self.count
+        seen = 0
+        for bound, n in zip(self.buckets, self.counts):
+            seen += n
+            if seen >= target:
+                return min(bound, self.max)
+        return self.max
+
+
+# Memoria residente di picco del processo in byte (None dove non e' misurabile)
+def peak_rss_bytes():
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == 'darwin' else peak * 1024
+
+
+# Registro delle metriche del processo: istogrammi di latenza (per nome ed etichetta),
+# contatori e gauge calcolati al momento della lettura
+class Metrics:
+    def __init__(self):
+        self.histograms = {}   # (nome, etichetta) -> Histogram
+        self.counters = {}     # nome -> valore
+        self.gauges = {}       # nome -> funzione senza argomenti
+        self.lock = threading.Lock()
+        self.started = time.time()
+
+    def observe(self, name, label, seconds):
+        with self.lock:
+            histogram = self.histograms.get((name, label))
+            if histogram is None:
+                histogram = self.histograms[(name, label)] = Histogram()
+            histogram.observe(seconds)
+
+    def count(self, name, value=1):
+        with self.lock:
+            self.counters[name] = self.counters.get(name, 0) + value
+
+    def gauge(self, name, read):
+        self.gauges[name] = read
+
+    # Misura il blocco come fase label dell'istogramma name
+    @contextmanager
+    def timed(self, name, label):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, label, time.perf_counter() - start)
+
+    def read_gauges(self):
+        values = {}
+        for name, read in self.gauges.items():
+            try:
+                values[name] = read()
+            except Exception as e:
+                print(f"Metrica {name} non leggibile: {e}")
+        rss = peak_rss_bytes()
+        if rss is not None:
+            values['peak_rss_bytes'] = rss
+        return values
+
+    # Riepilogo leggibile per il comando "stats"
+    def summary(self):
+        with self.lock:
+            histograms = sorted(self.histograms.items())
+            counters = sorted(self.counters.items())
+        lines = [f"Attivo da {time.time() - self.started:.0f}s"]
+        for (name, label), h in histograms:
+            lines.append(f"{name}[{label}]: {h.count} in {h.sum:.3f}s, media {h.sum / h.count * 1000:.1f}ms, "
+                         f"p50 {h.quantile(0.5) * 1000:.1f}ms, p95 {h.quantile(0.95) * 1000:.1f}ms, "
+                         f"max {h.max * 1000:.1f}ms")
+        lines.extend(f"{name}: {value}" for name, value in counters)
+        for name, value in sorted(self.read_gauges().items()):
+            lines.append(f"{name}: {value:.3f}" if isinstance(value, float) else f"{name}: {value}")
+        return "\n".join(lines)
+
+    # Formato testuale di Prometheus
+    def prometheus(self, prefix="text2cad"):
+        with self.lock:
+            histograms = sorted(self.histograms.items())
+            counters = sorted(self.counters.items())
+        lines = []
+        declared = set()
+        for (name, label), h in histograms:
+            metric = f"{prefix}_{name}_seconds"
+            if metric not in declared:
+                lines.append(f"# TYPE {metric} histogram")
+                declared.add(metric)
+            cumulative = 0
+            for bound, n in zip(h.buckets, h.counts):
+                cumulative += n
+                lines.append(f'{metric}_bucket{{{name}="{label}",le="{bound}"}} {cumulative}')
+            lines.append(f'{metric}_bucket{{{name}="{label}",le="+Inf"}} {h.count}')
+            lines.append(f'{metric}_sum{{{name}="{label}"}} {h.sum}')
+            lines.append(f'{metric}_count{{{name}="{label}"}} {h.count}')
+        for name, value in counters:
+            lines.append(f"# TYPE {prefix}_{name}_total counter")
+            lines.append(f"{prefix}_{name}_total {value}")
+        for name, value in sorted(self.read_gauges().items()):
+            lines.append(f"# TYPE {prefix}_{name} gauge")
+            lines.append(f"{prefix}_{name} {value}")
+        return "\n".join(lines) + "\n"
+
+    def write_prometheus(self, filename):
+        with open(filename + ".tmp", 'w', encoding='utf-8') as f:
+            f.write(self.prometheus())
+        # Sostituzione atomica: chi legge il file non vede mai un dump a meta'
+        os.replace(filename + ".tmp", filename)
+
+    # Espone /metrics su localhost:port in un thread separato
+    def serve(self, port):
+        registry = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                body = registry.prometheus().encode('utf-8')
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/plain; version=0.0.4')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        server = ThreadingHTTPServer(("localhost", port), Handler)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        print(f"Metriche Prometheus su http://localhost:{port}/metrics")
+        return server
+
+
+# Registro condiviso dal processo
+METRICS = Metrics()
+
+
+# Fase del percorso critico (db, expression, rasterize, csg, render_prep, export)
+def stage(name):
+    return METRICS.timed('stage', name)
+
+
+# Itera iterable sommando il tempo passato ad aspettare gli elementi (es. le righe di un
+# cursore in streaming) e lo registra come fase name alla fine
+def timed_iter(name, iterable):
+    elapsed = 0.0
+    iterator = iter(iterable)
+    try:
+        while True:
+            start = time.perf_counter()
+            try:
+                item = next(iterator)
+            except StopIteration:
+                return
+            finally:
+                elapsed += time.perf_counter() - start
+            yield item
+    finally:
+        METRICS.observe('stage', name, elapsed)
+
+
+# Esegue function() sotto cProfile e salva il profilo in filename; restituisce il risultato
+# e le righe piu' costose per tempo cumulativo
+def profile_call(function, filename, limit=15):
+    profiler = cProfile.Profile()
+    result = profiler.runcall(function)
+    profiler.dump_stats(filename)
+    out = io.StringIO()
+    pstats.Stats(profiler, stream=out).sort_stats('cumulative').print_stats(limit)
+    return result, out.getvalue()
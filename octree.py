@@ -0,0 +1,316 @@
+import time
+
+import numpy as np
+
+from raster import Stamp
+from sdf import Box, Cylinder, Intersect, SDFNode, Sphere, Subtract, Union, sample
+from volume import BRICK_SIZE
+
+# Classificazione di una cella rispetto a una forma
+CELL_OUTSIDE = 0
+CELL_INSIDE = 1
+CELL_PARTIAL = 2
+
+# Lato delle foglie di bordo, rasterizzate a risoluzione voxel. Coincide con i brick
+# del volume sparso, cosi' ogni foglia viene scritta in un solo brick
+OCTREE_LEAF_SIZE = BRICK_SIZE
+# Volume medio (in voxel) del riquadro delle primitive da cui l'octree conviene: misurato
+# su BrickVolume 512 con 8-128 cubi e cilindri, sotto ~3M voxel scrivere ogni primitiva
+# per intero e' fino a 6x piu' veloce, da ~8M l'octree lo e' da 1.3x a 6x
+OCTREE_MIN_VOXELS = 8 * 1024 * 1024
+
+# Stato "misto" di una cella durante la valutazione delle operazioni
+_MIXED = object()
+
+
+# Classifica la cella [lo, hi) (tuple di interi) rispetto a una forma: uno Stamp dei
+# kernel di raster.py, un albero SDF o un array di coordinate di voxel
+def classify(shape, lo, hi):
+    if isinstance(shape, Stamp):
+        return _classify_stamp(shape, lo, hi)
+    if isinstance(shape, SDFNode):
+        return _classify_sdf(shape, lo, hi)
+    return _classify_coords(shape, lo, hi)
+
+
+# Maschera booleana (forma hi - lo) dei voxel della cella dentro la forma
+def cell_mask(shape, lo, hi):
+    lo = np.asarray(lo, dtype=np.int64)
+    hi = np.asarray(hi, dtype=np.int64)
+    if isinstance(shape, Stamp):
+        out = np.zeros(tuple(hi - lo), dtype=bool)
+        a = np.maximum(lo, shape.lo)
+        b = np.minimum(hi, shape.hi)
+        if np.all(a < b):
+            region = tuple(slice(a[i] - lo[i], b[i] - lo[i]) for i in range(3))
+            out[region] = True if shape.mask is None else np.broadcast_to(_stamp_sub_mask(shape, a, b), tuple(b - a))
+        return out
+    if isinstance(shape, SDFNode):
+        return np.asarray(sample(shape, lo, hi) <= 0)
+    out = np.zeros(tuple(hi - lo), dtype=bool)
+    coords = _coords_in_cell(shape, lo, hi) - lo
+    out[coords[:, 0], coords[:, 1], coords[:, 2]] = True
+    return out
+
+
+# Porzione della maschera dello Stamp nella regione [a, b) (gli assi di lunghezza 1
+# della maschera sono broadcastati e restano di lunghezza 1)
+def _stamp_sub_mask(stamp, a, b):
+    slices = []
+    for i in range(3):
+        if stamp.mask.shape[i] == 1:
+            slices.append(slice(None))
+        else:
+            slices.append(slice(a[i] - stamp.lo[i], b[i] - stamp.lo[i]))
+    return stamp.mask[tuple(slices)]
+
+
+# Test su interi Python: e' il caso piu' frequente e va tenuto leggero
+def _classify_stamp(stamp, lo, hi):
+    a = (max(lo[0], stamp.lo[0]), max(lo[1], stamp.lo[1]), max(lo[2], stamp.lo[2]))
+    b = (min(hi[0], stamp.hi[0]), min(hi[1], stamp.hi[1]), min(hi[2], stamp.hi[2]))
+    if a[0] >= b[0] or a[1] >= b[1] or a[2] >= b[2]:
+        return CELL_OUTSIDE
+    covers = a == tuple(lo) and b == tuple(hi)
+    if stamp.mask is None:
+        return CELL_INSIDE if covers else CELL_PARTIAL
+    sub = _stamp_sub_mask(stamp, a, b)
+    if not sub.any():
+        return CELL_OUTSIDE
+    return CELL_INSIDE if covers and sub.all() else CELL_PARTIAL
+
+
+# Intervallo delle distanze sulla cella: per le primitive convesse il massimo sta
+# sugli spigoli, il minimo e' limitato dalla distanza al centro meno mezza diagonale
+def _classify_sdf(node, lo, hi):
+    lo = np.asarray(lo, dtype=np.int64)
+    hi = np.asarray(hi, dtype=np.int64)
+    if isinstance(node, Union):
+        states = [_classify_sdf(child, lo, hi) for child in node.children]
+        if CELL_INSIDE in states:
+            return CELL_INSIDE
+        return CELL_OUTSIDE if all(s == CELL_OUTSIDE for s in states) else CELL_PARTIAL
+    if isinstance(node, Subtract):
+        a = _classify_sdf(node.a, lo, hi)
+        if a == CELL_OUTSIDE:
+            return CELL_OUTSIDE
+        b = _classify_sdf(node.b, lo, hi)
+        if b == CELL_INSIDE:
+            return CELL_OUTSIDE
+        return CELL_INSIDE if a == CELL_INSIDE and b == CELL_OUTSIDE else CELL_PARTIAL
+    if isinstance(node, Intersect):
+        a = _classify_sdf(node.a, lo, hi)
+        b = _classify_sdf(node.b, lo, hi)
+        if CELL_OUTSIDE in (a, b):
+            return CELL_OUTSIDE
+        return CELL_INSIDE if a == b == CELL_INSIDE else CELL_PARTIAL
+    if node.prune(lo, hi - 1) is None:
+        return CELL_OUTSIDE
+    last = hi - 1
+    if isinstance(node, (Box, Cylinder, Sphere)):
+        corners = np.array([[x, y, z] for x in (lo[0], last[0]) for y in (lo[1], last[1]) for z in (lo[2], last[2])],
+                           dtype=np.float64)
+        if np.all(node.distance(corners[:, 0], corners[:, 1], corners[:, 2]) <= 0):
+            return CELL_INSIDE
+    center = (lo + last) / 2.0
+    half_diagonal = np.linalg.norm((last - lo) / 2.0)
+    if float(node.distance(center[0], center[1], center[2])) > half_diagonal:
+        return CELL_OUTSIDE
+    return CELL_PARTIAL
+
+
+def _coords_in_cell(coords, lo, hi):
+    coords = np.asarray(coords, dtype=np.int64).reshape(-1, 3)
+    inside = np.all((coords >= lo) & (coords < hi), axis=1)
+    return coords[inside]
+
+
+def _classify_coords(coords, lo, hi):
+    lo = np.asarray(lo, dtype=np.int64)
+    hi = np.asarray(hi, dtype=np.int64)
+    return CELL_PARTIAL if len(_coords_in_cell(coords, lo, hi)) else CELL_OUTSIDE
+
+
+# Bounding box intera [lo, hi) di una forma
+def shape_bounds(shape):
+    if isinstance(shape, Stamp):
+        return np.asarray(shape.lo, dtype=np.int64), np.asarray(shape.hi, dtype=np.int64)
+    if isinstance(shape, SDFNode):
+        bounds = shape.bounds()
+        if bounds is None:
+            return None
+        return np.floor(bounds[0]).astype(np.int64), np.ceil(bounds[1]).astype(np.int64) + 1
+    coords = np.asarray(shape, dtype=np.int64).reshape(-1, 3)
+    if len(coords) == 0:
+        return None
+    return coords.min(axis=0), coords.max(axis=0) + 1
+
+
+# Nodo dell'octree. Le foglie uniformi hanno solo lo stato (pieno con un colore,
+# oppure vuoto); le foglie di bordo hanno occupazione e colori a risoluzione voxel.
+class OctreeNode:
+    __slots__ = ('lo', 'hi', 'filled', 'color', 'children', 'occupancy', 'colors')
+
+    def __init__(self, lo, hi):
+        self.lo = lo
+        self.hi = hi
+        self.filled = False
+        self.color = None
+        self.children = None
+        self.occupancy = None
+        self.colors = None
+
+    @property
+    def is_boundary(self):
+        return self.occupancy is not None
+
+
+# Octree della scena: suddivide ricorsivamente lo spazio e classifica ogni cella come
+# piena, vuota o di bordo rispetto alla lista ordinata di operazioni (forma, negativa,
+# colore). Solo le celle di bordo vengono raffinate fino a risoluzione voxel, e a ogni
+# livello le operazioni che non toccano la cella vengono scartate (potatura a intervalli).
+class Octree:
+    def __init__(self, operations, size, leaf_size=OCTREE_LEAF_SIZE):
+        self.size = size
+        self.leaf_size = leaf_size
+        self.cells = 0
+        self.root = None
+        # Secondi spesi a rasterizzare ogni operazione nelle foglie di bordo
+        self.seconds = [0.0] * len(operations)
+        self._index = {id(op): i for i, op in enumerate(operations)}
+        region = self._region(operations)
+        if region is not None:
+            # Radice cubica allineata alla griglia delle foglie, con lato leaf_size * 2^k
+            lo = tuple(int(v) // leaf_size * leaf_size for v in region[0])
+            side = leaf_size
+            while any(l + side < int(h) for l, h in zip(lo, region[1])):
+                side *= 2
+            hi = tuple(l + side for l in lo)
+            self.root = self._build(lo, hi, list(operations), (False, None))
+
+    # Regione occupabile: unione delle forme positive, ritagliata sullo spazio
+    def _region(self, operations):
+        lo = hi = None
+        for shape, negative, _ in operations:
+            bounds = shape_bounds(shape) if not negative else None
+            if bounds is None:
+                continue
+            lo = bounds[0] if lo is None else np.minimum(lo, bounds[0])
+            hi = bounds[1] if hi is None else np.maximum(hi, bounds[1])
+        if lo is None:
+            return None
+        lo = np.maximum(lo, 0)
+        hi = np.minimum(hi, self.size)
+        if np.any(lo >= hi):
+            return None
+        return lo, hi
+
+    def _build(self, lo, hi, operations, base):
+        self.cells += 1
+        node = OctreeNode(lo, hi)
+        # Stato della cella dopo le operazioni: base e' lo stato uniforme dopo l'ultima
+        # operazione che copre l'intera cella; active le operazioni parziali successive
+        state = base
+        active = []
+        for op in operations:
+            shape, negative, color = op
+            cls = classify(shape, lo, hi)
+            if cls == CELL_OUTSIDE:
+                continue
+            if cls == CELL_INSIDE:
+                state = (not negative, color if not negative else None)
+                base = state
+                active = []
+                continue
+            if state is not _MIXED and state == (not negative, color if not negative else None):
+                continue
+            state = _MIXED
+            active.append(op)
+        if state is not _MIXED:
+            node.filled, node.color = state
+            return node
+        if hi[0] - lo[0] <= self.leaf_size:
+            self._rasterize_leaf(node, active, base)
+            return node
+        node.children = [self._build(a, b, active, base) for a, b in self._split(lo, hi)]
+        return node
+
+    # Otto figli della cella cubica
+    @staticmethod
+    def _split(lo, hi):
+        half = (hi[0] - lo[0]) // 2
+        for x in (lo[0], lo[0] + half):
+            for y in (lo[1], lo[1] + half):
+                for z in (lo[2], lo[2] + half):
+                    yield (x, y, z), (x + half, y + half, z + half)
+
+    # Foglia di bordo: applica a risoluzione voxel le sole operazioni attive
+    def _rasterize_leaf(self, node, operations, base):
+        shape = tuple(h - l for l, h in zip(node.lo, node.hi))
+        palette = [base[1]]
+        occupancy = np.full(shape, base[0], dtype=bool)
+        # Indici di colore allocati solo quando compare un secondo colore
+        colors = None
+        for op in operations:
+            op_shape, negative, color = op
+            op_start = time.perf_counter()
+            mask = cell_mask(op_shape, node.lo, node.hi)
+            occupancy[mask] = not negative
+            if not negative and not (colors is None and color == palette[0]):
+                if colors is None:
+                    colors = np.zeros(shape, dtype=np.uint8)
+                if color not in palette:
+                    palette.append(color)
+                colors[mask] = palette.index(color)
+            self.seconds[self._index[id(op)]] += time.perf_counter() - op_start
+        node.occupancy = occupancy
+        node.colors = (colors, palette)
+
+    # Itera sulle foglie dell'octree
+    def leaves(self):
+        stack = [self.root] if self.root is not None else []
+        while stack:
+            node = stack.pop()
+            if node.children is not None:
+                stack.extend(node.children)
+            else:
+                yield node
+
+    # Scrive l'octree nel volume: le foglie piene con un'unica scrittura a slice,
+    # quelle di bordo con la loro maschera (un colore alla volta)
+    def write(self, volume):
+        written = 0
+        for leaf in self.leaves():
+            if leaf.is_boundary:
+                colors, palette = leaf.colors
+                if colors is None:
+                    written += volume.fill(leaf.lo, leaf.hi, value=1, color=palette[0], mask=leaf.occupancy)
+                    continue
+                for index in np.unique(colors[leaf.occupancy]):
+                    mask = leaf.occupancy & (colors == index)
+                    written += volume.fill(leaf.lo, leaf.hi, value=1, color=palette[index], mask=mask)
+            elif leaf.filled:
+                written += volume.fill(leaf.lo, leaf.hi, value=1, color=leaf.color)
+        return written
+
+    # Statistiche: celle visitate, foglie uniformi e di bordo
+    def stats(self):
+        uniform = boundary = 0
+        for leaf in self.leaves():
+            if leaf.is_boundary:
+                boundary += 1
+            else:
+                uniform += 1
+        return {'cells': self.cells, 'uniform_leaves': uniform, 'boundary_leaves': boundary}
+
+
+# Valuta una lista ordinata di operazioni in un volume vuoto tramite octree; restituisce
+# i voxel scritti e i secondi di rasterizzazione di ogni operazione
+def evaluate_octree(operations, volume, leaf_size=OCTREE_LEAF_SIZE):
+    start = time.time()
+    tree = Octree(operations, volume.size, leaf_size=leaf_size)
+    written = tree.write(volume)
+    stats = tree.stats()
+    print(f"Octree: {stats['cells']} celle, {stats['uniform_leaves']} foglie uniformi, "
+          f"{stats['boundary_leaves']} di bordo in {time.time() - start:.3f}s")
+    return written, tree.seconds
@@ -0,0 +1,75 @@
+import numpy as np
+
+from raster import cube_bounds
+
+
+# Contorni e linee come array (N, 3) di coordinate intere, per le figure e le annotazioni
+# disegnate a voxel (tipo 'voxels' della scena). Tutto e' calcolato con NumPy: il costo
+# cresce con la lunghezza del contorno e non con il volume racchiuso.
+
+
+# Segmento discreto da start a end (inclusi) con un DDA: un voxel per passo lungo l'asse
+# con lo spostamento maggiore, le altre coordinate troncate come int()
+def line(start, end):
+    start = np.asarray(start, dtype=np.float64)
+    delta = np.asarray(end, dtype=np.float64) - start
+    steps = int(np.ceil(np.abs(delta).max()))
+    if steps == 0:
+        return start.astype(np.int64).reshape(1, 3)
+    i = np.arange(steps + 1, dtype=np.float64)[:, None]
+    return (start + delta * i / steps).astype(np.int64)
+
+
+# Spezzata chiusa per i vertici dati (punti 3D), un segmento per lato
+def polygon(vertices):
+    vertices = np.asarray(vertices, dtype=np.float64)
+    sides = [line(vertices[i], vertices[(i + 1) % len(vertices)]) for i in range(len(vertices))]
+    return np.unique(np.concatenate(sides), axis=0)
+
+
+# Spigoli del box di draw_cube (stessi limiti di raster.cube_bounds): i voxel con almeno
+# due coordinate sul bordo. Con uno spessore di 1 voxel e' il contorno del rettangolo
+def box_edges(center, length, width, height):
+    lo, hi = cube_bounds(center, length, width, height)
+    edges = []
+    for axis in range(3):
+        a, b = [k for k in range(3) if k != axis]
+        run = np.arange(lo[axis], hi[axis], dtype=np.int64)
+        for u in {lo[a], hi[a] - 1}:
+            for v in {lo[b], hi[b] - 1}:
+                edge = np.empty((len(run), 3), dtype=np.int64)
+                edge[:, axis] = run
+                edge[:, a] = u
+                edge[:, b] = v
+                edges.append(edge)
+    return np.unique(np.concatenate(edges), axis=0)
+
+
+# Vertici del quadrato di lato size centrato in center (piano z = center[2]) e ruotato di
+# angle radianti attorno all'asse z
+def rotated_square(center, size, angle):
+    half = size // 2
+    local = np.array([(-half, -half), (half, -half), (half, half), (-half, half)], dtype=np.float64)
+    cos, sin = np.cos(angle), np.sin(angle)
+    x = local[:, 0] * cos - local[:, 1] * sin + center[0]
+    y = local[:, 0] * sin + local[:, 1] * cos + center[1]
+    return np.stack([x, y, np.full(4, center[2], dtype=np.float64)], axis=1)
+
+
+# Chiavi lineari delle coordinate in un riquadro comune (anche con coordinate negative)
+def _keys(coords, lo, span):
+    shifted = coords - lo
+    return (shifted[:, 0] * span[1] + shifted[:, 1]) * span[2] + shifted[:, 2]
+
+
+# I voxel di coords che non sono in other: appartenenza per insiemi di chiavi (np.isin)
+# invece di confrontare ogni voxel con ogni voxel dell'altro contorno
+def difference(coords, other):
+    coords = np.asarray(coords, dtype=np.int64).reshape(-1, 3)
+    other = np.asarray(other, dtype=np.int64).reshape(-1, 3)
+    if len(coords) == 0 or len(other) == 0:
+        return coords
+    both = np.concatenate([coords, other])
+    lo = both.min(axis=0)
+    span = both.max(axis=0) - lo + 1
+    return coords[~np.isin(_keys(coords, lo, span), _keys(other, lo, span))]
@@ -0,0 +1,68 @@
+import math
+
+import numpy as np
+
+
+# Regione da scrivere nel volume: box [lo, hi) e maschera opzionale broadcastabile su hi - lo
+class Stamp:
+    def __init__(self, lo, hi, mask=None):
+        self.lo = lo
+        self.hi = hi
+        self.mask = mask
+
+    # Scrive la regione nel volume (il ritaglio sullo spazio lo fa il volume)
+    def apply(self, volume, value=1, color=None):
+        return volume.fill(self.lo, self.hi, value=value, color=color, mask=self.mask)
+
+    @property
+    def shape(self):
+        return tuple(h - l for l, h in zip(self.lo, self.hi))
+
+
+# Limiti del cubo calcolati analiticamente, con la stessa convenzione dei voxel
+# di draw_cube: da c - d//2 a c + d//2 inclusi. Si usa floor (e non int) cosi'
+# il risultato e' invariante per traslazioni intere anche sotto lo zero.
+def cube_bounds(center, length, width, height):
+    lo, hi = [], []
+    for c, d in zip(center, (length, width, height)):
+        lo.append(math.floor(c - d // 2))
+        hi.append(math.floor(c + d // 2) + 1)
+    return tuple(lo), tuple(hi)
+
+
+# Kernel del cubo: solo i limiti, nessuna griglia di coordinate
+def rasterize_cube(center, length, width, height):
+    lo, hi = cube_bounds(center, length, width, height)
+    return Stamp(lo, hi)
+
+
+# Disco 2D del cilindro: maschera (nx, ny, 1) calcolata una volta sola sul piano xy
+# e poi broadcastata lungo z
+def cylinder_disc(center, radius):
+    r_int = int(radius) + 1
+    x = np.arange(math.floor(center[0] - r_int), math.floor(center[0] + r_int) + 1)
+    y = np.arange(math.floor(center[1] - r_int), math.floor(center[1] + r_int) + 1)
+    dx2 = (x - center[0]) ** 2
+    dy2 = (y - center[1]) ** 2
+    disc = dx2[:, None] + dy2[None, :] <= radius * radius
+    return (int(x[0]), int(y[0])), disc[:, :, None]
+
+
+# Kernel del cilindro: disco 2D broadcastato sulle slice z da center[2] a center[2] + height
+def rasterize_cylinder(center, radius, height):
+    (x0, y0), disc = cylinder_disc(center, radius)
+    z0 = math.floor(center[2])
+    z1 = math.floor(center[2] + height) + 1
+    lo = (x0, y0, z0)
+    hi = (x0 + disc.shape[0], y0 + disc.shape[1], max(z1, z0))
+    return Stamp(lo, hi, disc)
+
+
+# Rasterizzatori per CSGScene
+RASTERIZERS = {
+    'cube': rasterize_cube,
+    'cylinder': rasterize_cylinder,
+    'voxels': lambda coords: coords,
+    'sdf': lambda node: node,
+    'stamp': lambda stamp: stamp,
+}
@@ -0,0 +1,209 @@
+import hashlib
+import json
+import os
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+from metrics import stage
+from raster import Stamp
+from rebuild import rasterize_group
+
+# Memoria massima occupata dalle forme rasterizzate in cache
+RASTER_CACHE_BYTES = 256 * 1024 * 1024
+# Spazio massimo dei file .npz del livello su disco
+RASTER_CACHE_DISK_BYTES = 1024 * 1024 * 1024
+
+
+# Forma rasterizzata in un sistema di riferimento locale (origine nella parte intera
+# della posizione): regione [lo, hi), voxel da svuotare e un livello pieno per colore.
+# Applicata a una nuova posizione con la stessa parte frazionaria diventa una serie di
+# Stamp traslati, equivalente alle operazioni originali.
+class CachedRaster:
+    def __init__(self, lo, hi, erased, layers):
+        self.lo = tuple(lo)
+        self.hi = tuple(hi)
+        self.erased = erased
+        self.layers = layers
+
+    @classmethod
+    def from_operations(cls, operations):
+        sub = rasterize_group(operations)
+        if sub is None:
+            return cls((0, 0, 0), (0, 0, 0), None, [])
+        erased = sub.touched & ~sub.occupancy
+        if sub.colors is None:
+            layers = [(sub.palette[0], sub.occupancy)]
+        else:
+            layers = [(sub.palette[index], sub.occupancy & (sub.colors == index))
+                      for index in np.unique(sub.colors[sub.occupancy])]
+        return cls(sub.lo, sub.hi, erased if erased.any() else None, layers)
+
+    @property
+    def nbytes(self):
+        return sum(mask.nbytes for _, mask in self.layers) + (self.erased.nbytes if self.erased is not None else 0)
+
+    # Stamp (con segno e colore) della forma traslata di offset voxel interi
+    def stamps(self, offset):
+        lo = tuple(l + o for l, o in zip(self.lo, offset))
+        hi = tuple(h + o for h, o in zip(self.hi, offset))
+        if self.erased is not None:
+            yield Stamp(lo, hi, self.erased), True, None
+        for color, mask in self.layers:
+            yield Stamp(lo, hi, mask), False, color
+
+    # Livello su disco: maschere compresse come bitmap (np.packbits) in un .npz
+    def save(self, path):
+        arrays = {'lo': np.array(self.lo), 'hi': np.array(self.hi)}
+        if self.erased is not None:
+            arrays['erased'] = np.packbits(self.erased)
+        for i, (_, mask) in enumerate(self.layers):
+            arrays[f'layer{i}'] = np.packbits(mask)
+        arrays['colors'] = np.array(json.dumps([color for color, _ in self.layers]))
+        tmp = path + '.tmp'
+        with open(tmp, 'wb') as f:
+            np.savez_compressed(f, **arrays)
+        os.replace(tmp, path)
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as data:
+            lo, hi = tuple(int(v) for v in data['lo']), tuple(int(v) for v in data['hi'])
+            shape = tuple(h - l for l, h in zip(lo, hi))
+            count = int(np.prod(shape))
+
+            def unpack(name):
+                return np.unpackbits(data[name], count=count).view(bool).reshape(shape)
+
+            erased = unpack('erased') if 'erased' in data else None
+            colors = json.loads(str(data['colors']))
+            layers = [(tuple(color) if color is not None else None, unpack(f'layer{i}'))
+                      for i, color in enumerate(colors)]
+        return cls(lo, hi, erased, layers)
+
+
+# Cache LRU delle forme rasterizzate, con un budget di memoria e un livello su disco
+# opzionale (directory) che sopravvive ai riavvii, con un suo budget (max_disk_bytes: oltre,
+# si eliminano i file letti o scritti meno di recente). Condivisa tra i thread delle
+# sessioni: le modifiche alla LRU avvengono sotto lock
+class RasterCache:
+    def __init__(self, max_bytes=RASTER_CACHE_BYTES, directory=None, max_disk_bytes=RASTER_CACHE_DISK_BYTES):
+        self.max_bytes = max_bytes
+        self.directory = directory
+        self.max_disk_bytes = max_disk_bytes
+        self.disk_bytes = 0
+        self.entries = OrderedDict()
+        self.nbytes = 0
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.lock = threading.RLock()
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+            self.disk_bytes = sum(size for _, size, _ in self._disk_files())
+            self._trim_disk()
+
+    # Chiave della cache: hash di tutto cio' che determina la rasterizzazione
+    @staticmethod
+    def key(*parts):
+        data = json.dumps(parts, sort_keys=True, default=str)
+        return hashlib.sha1(data.encode('utf-8')).hexdigest()
+
+    def _path(self, key):
+        return os.path.join(self.directory, f"{key}.npz")
+
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None:
+                self.entries.move_to_end(key)
+                self.hits += 1
+                return entry
+        if self.directory and os.path.exists(self._path(key)):
+            try:
+                entry = CachedRaster.load(self._path(key))
+            except (OSError, ValueError, KeyError) as e:
+                print(f"Cache raster: file {self._path(key)} illeggibile ({e}), viene ricalcolato")
+            else:
+                self.disk_hits += 1
+                # La data di modifica fa da ordine LRU del livello su disco
+                os.utime(self._path(key))
+                self._remember(key, entry)
+                return entry
+        return None
+
+    def put(self, key, entry):
+        self._remember(key, entry)
+        if self.directory:
+            path = self._path(key)
+            previous = os.path.getsize(path) if os.path.exists(path) else 0
+            entry.save(path)
+            with self.lock:
+                self.disk_bytes += os.path.getsize(path) - previous
+                self._trim_disk()
+        return entry
+
+    # File .npz del livello su disco: (data di modifica, byte, percorso)
+    def _disk_files(self):
+        files = []
+        for name in os.listdir(self.directory):
+            if name.endswith('.npz'):
+                path = os.path.join(self.directory, name)
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue
+                files.append((stat.st_mtime, stat.st_size, path))
+        return files
+
+    # Elimina i file usati meno di recente finche' il livello su disco rientra nel budget
+    def _trim_disk(self):
+        if self.disk_bytes <= self.max_disk_bytes:
+            return
+        files = sorted(self._disk_files())
+        self.disk_bytes = sum(size for _, size, _ in files)
+        for _, size, path in files:
+            if self.disk_bytes <= self.max_disk_bytes:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            self.disk_bytes -= size
+
+    # Restituisce la forma in cache o la rasterizza: build() restituisce le operazioni
+    # (forma, negativa, colore) nel sistema di riferimento locale
+    def get_or_build(self, key, build):
+        entry = self.get(key)
+        if entry is None:
+            self.misses += 1
+            with stage('rasterize'):
+                entry = CachedRaster.from_operations(build())
+            self.put(key, entry)
+        return entry
+
+    # Inserisce in memoria ed elimina le forme usate meno di recente oltre il budget;
+    # una forma piu' grande dell'intero budget non viene tenuta in memoria
+    def _remember(self, key, entry):
+        if entry.nbytes > self.max_bytes:
+            return
+        with self.lock:
+            if key in self.entries:
+                self.nbytes -= self.entries.pop(key).nbytes
+            self.entries[key] = entry
+            self.nbytes += entry.nbytes
+            while self.nbytes > self.max_bytes:
+                _, old = self.entries.popitem(last=False)
+                self.nbytes -= old.nbytes
+
+    # Svuota la memoria (e il disco se richiesto)
+    def clear(self, disk=False):
+        with self.lock:
+            self.entries.clear()
+            self.nbytes = 0
+        if disk and self.directory:
+            for name in os.listdir(self.directory):
+                if name.endswith('.npz'):
+                    os.remove(os.path.join(self.directory, name))
+            self.disk_bytes = 0
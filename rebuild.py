@@ -0,0 +1,161 @@
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from octree import cell_mask, shape_bounds
+from raster import Stamp
+
+# Processi usati per la ricostruzione parallela
+REBUILD_WORKERS = os.cpu_count() or 1
+
+
+# Risultato della rasterizzazione di un oggetto nella sua bounding box [lo, hi):
+# touched sono i voxel toccati da almeno un'operazione, occupancy quelli pieni alla fine.
+# Nei voxel toccati il risultato dipende solo dall'ultima operazione che li copre, quindi
+# il sotto-volume si puo' fondere nella scena esattamente come la sequenza originale.
+class SubVolume:
+    def __init__(self, lo, hi, touched, occupancy, colors, palette, elapsed):
+        self.lo = lo
+        self.hi = hi
+        self.touched = touched
+        self.occupancy = occupancy
+        self.colors = colors
+        self.palette = palette
+        self.elapsed = elapsed
+
+    # Scrive il sotto-volume nel volume della scena: svuota i voxel toccati rimasti
+    # vuoti e riempie gli altri, un colore alla volta
+    def merge(self, volume):
+        erased = self.touched & ~self.occupancy
+        if erased.any():
+            volume.fill(self.lo, self.hi, value=0, mask=erased)
+        if self.colors is None:
+            return volume.fill(self.lo, self.hi, value=1, color=self.palette[0], mask=self.occupancy)
+        written = 0
+        for index in np.unique(self.colors[self.occupancy]):
+            mask = self.occupancy & (self.colors == index)
+            written += volume.fill(self.lo, self.hi, value=1, color=self.palette[index], mask=mask)
+        return written
+
+
+# Rasterizza le operazioni (forma, negativa, colore) di un oggetto in un sotto-volume
+# locale, grande quanto la bounding box dell'oggetto ritagliata sullo spazio (senza
+# ritaglio se size e' None).
+# Gira nei processi worker: le forme arrivano gia' rasterizzate (Stamp, alberi SDF o
+# coordinate), che a differenza dei rasterizzatori si possono serializzare.
+def rasterize_group(operations, size=None):
+    start = time.perf_counter()
+    lo = hi = None
+    for shape, _, _ in operations:
+        bounds = shape_bounds(shape)
+        if bounds is None:
+            continue
+        lo = bounds[0] if lo is None else np.minimum(lo, bounds[0])
+        hi = bounds[1] if hi is None else np.maximum(hi, bounds[1])
+    if lo is None:
+        return None
+    if size is not None:
+        lo = np.maximum(lo, 0)
+        hi = np.minimum(hi, size)
+    if np.any(lo >= hi):
+        return None
+    shape_size = tuple(hi - lo)
+    touched = np.zeros(shape_size, dtype=bool)
+    occupancy = np.zeros(shape_size, dtype=bool)
+    # Colori come indici in una palette locale, allocati solo se l'oggetto ne usa piu' di uno
+    palette = [next((color for _, negative, color in operations if not negative), None)]
+    colors = None
+    for shape, negative, color in operations:
+        mask = cell_mask(shape, lo, hi)
+        touched |= mask
+        occupancy[mask] = not negative
+        if negative or (colors is None and color == palette[0]):
+            continue
+        if colors is None:
+            colors = np.zeros(shape_size, dtype=np.uint8)
+        if color not in palette:
+            palette.append(color)
+        colors[mask] = palette.index(color)
+    return SubVolume(tuple(int(v) for v in lo), tuple(int(v) for v in hi), touched, occupancy, colors, palette,
+                     time.perf_counter() - start)
+
+
+# Contesto dei processi worker: mai fork, perche' il processo principale ha i thread di Qt,
+# di asyncio e dei job, che possono tenere lock copiati a meta' nel figlio. Con forkserver
+# (o spawn dove non esiste) i worker ripartono da un interprete pulito; lo script principale
+# viene reimportato ma la finestra e il server partono solo sotto __main__
+def mp_context():
+    methods = multiprocessing.get_all_start_methods()
+    return multiprocessing.get_context('forkserver' if 'forkserver' in methods else 'spawn')
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+# Pool di processi condiviso da tutte le valutazioni (e da tutte le sessioni), creato al
+# primo uso con workers processi: le sessioni parallele si dividono gli stessi worker
+def shared_pool(workers=REBUILD_WORKERS):
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ProcessPoolExecutor(max_workers=workers, mp_context=mp_context())
+        return _pool
+
+
+def shutdown_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown(wait=False, cancel_futures=True)
+            _pool = None
+
+
+# Valuta gruppi di operazioni (uno per oggetto) in parallelo e li fonde nel volume
+# nell'ordine originale, man mano che i risultati arrivano.
+# groups: lista di (etichetta, [(forma, negativa, colore), ...]).
+# Restituisce la lista dei tempi (etichetta, secondi, voxel pieni) per oggetto.
+def evaluate_parallel(groups, volume, workers=REBUILD_WORKERS, progress=None):
+    start = time.time()
+    labels = [label for label, _ in groups]
+    operations = [ops for _, ops in groups]
+    # Gli oggetti fatti solo di Stamp (cubi, cilindri, forme dalla cache raster) sono gia'
+    # rasterizzati: scriverli e' una copia di memoria, che nel processo principale costa
+    # meno che spedire le maschere ai worker e riceverne un SubVolume
+    remote = [not all(isinstance(shape, Stamp) for shape, _, _ in ops) for ops in operations]
+    futures = {}
+    if workers > 1 and any(remote):
+        executor = shared_pool(workers)
+        futures = {i: executor.submit(rasterize_group, ops, volume.size)
+                   for i, ops in enumerate(operations) if remote[i]}
+    timings = []
+    try:
+        for i, (label, ops) in enumerate(zip(labels, operations)):
+            if not remote[i]:
+                group_start = time.perf_counter()
+                written = 0
+                for shape, negative, color in ops:
+                    count = shape.apply(volume, value=0 if negative else 1, color=color)
+                    written += 0 if negative else count
+                timings.append((label, time.perf_counter() - group_start, written))
+            else:
+                sub = futures[i].result() if i in futures else rasterize_group(ops, volume.size)
+                if sub is None:
+                    timings.append((label, 0.0, 0))
+                    continue
+                sub.merge(volume)
+                timings.append((label, sub.elapsed, int(sub.occupancy.sum())))
+            if progress is not None:
+                progress(len(timings), len(groups))
+    finally:
+        # Interrotta (es. job annullato): i gruppi non ancora iniziati non occupano il pool
+        for future in futures.values():
+            future.cancel()
+    total = sum(t for _, t, _ in timings)
+    print(f"Ricostruzione parallela: {len(groups)} oggetti su {workers} processi in {time.time() - start:.3f}s "
+          f"(rasterizzazione {total:.3f}s)")
+    return timings
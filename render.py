@@ -0,0 +1,248 @@
+import threading
+
+import numpy as np
+
+from metrics import stage
+
+# Dimensione dei marker dei voxel
+MARKER_SIZE = 5
+# Posti iniziali nel buffer dei marker (raddoppiati quando servono)
+RENDER_CAPACITY = 1 << 16
+# Posti minimi riservati a un blocco
+_MIN_SLOT = 64
+# Fotogrammi al secondo massimi del rendering
+RENDER_FPS = 30
+
+
+# Voxel di superficie del blocco key: pieni con almeno uno dei 6 vicini vuoto (anche nei
+# blocchi adiacenti; fuori dallo spazio e' vuoto). Restituisce (coordinate, colori RGBA).
+def block_shell(volume, key, palette):
+    occupancy, colors = volume.block(key)
+    if occupancy is None:
+        return np.empty((0, 3), dtype=np.float32), np.empty((0, 4), dtype=np.float32)
+    n = occupancy.shape
+    padded = np.zeros((n[0] + 2, n[1] + 2, n[2] + 2), dtype=bool)
+    padded[1:-1, 1:-1, 1:-1] = occupancy
+    for axis in range(3):
+        for step in (-1, 1):
+            near = list(key)
+            near[axis] += step
+            neighbor, _ = volume.block(tuple(near)) if near[axis] >= 0 else (None, 0)
+            if neighbor is None:
+                continue
+            # Strato del vicino a contatto con il blocco
+            source = [slice(0, n[0]), slice(0, n[1]), slice(0, n[2])]
+            source[axis] = slice(-1, None) if step < 0 else slice(0, 1)
+            target = [slice(1, -1)] * 3
+            target[axis] = slice(0, 1) if step < 0 else slice(-1, None)
+            layer = neighbor[tuple(source)]
+            if layer.shape == padded[tuple(target)].shape:
+                padded[tuple(target)] = layer
+    core = padded[1:-1, 1:-1, 1:-1]
+    inner = (padded[:-2, 1:-1, 1:-1] & padded[2:, 1:-1, 1:-1] & padded[1:-1, :-2, 1:-1] &
+             padded[1:-1, 2:, 1:-1] & padded[1:-1, 1:-1, :-2] & padded[1:-1, 1:-1, 2:])
+    shell = core & ~inner
+    coords = np.argwhere(shell)
+    if isinstance(colors, np.ndarray):
+        rgba = palette[colors[shell]]
+    else:
+        rgba = np.repeat(palette[colors:colors + 1], len(coords), axis=0)
+    coords += np.asarray(key) * volume.brick_size
+    return coords.astype(np.float32), rgba
+
+
+# Superfici dei blocchi modificati dall'ultima chiamata, pronte per il rendering:
+# (reset, {chiave: (coordinate, colori)}). reset indica che il volume e' stato svuotato
+# (o non e' mai stato letto) e i blocchi sono tutti quelli occupati. Va chiamata dal
+# thread che scrive il volume.
+def collect_shells(volume, generation=None):
+    palette = np.array(volume.palette, dtype=np.float32)
+    dirty = volume.take_dirty()
+    reset = volume.generation != generation
+    if reset:
+        dirty = volume.occupied_blocks()
+    with stage('render_prep'):
+        return reset, {key: block_shell(volume, key, palette) for key in dirty}
+
+
+# Rendering incrementale dei soli voxel di superficie. Ogni blocco del volume ha un posto
+# fisso nel buffer dei marker (potenza di due, riusata dai blocchi liberati); a ogni
+# aggiornamento si ricalcolano solo i blocchi segnati dal volume e si caricano sulla GPU
+# solo i loro intervalli. Il buffer intero viene ricaricato solo alla prima chiamata,
+# quando si ingrandisce o dopo clear() del volume.
+class ShellRenderer:
+    def __init__(self, parent, marker_size=MARKER_SIZE, capacity=RENDER_CAPACITY):
+        from vispy import scene
+        self.markers = scene.visuals.Markers(parent=parent)
+        self.marker_size = marker_size
+        self._allocate(capacity)
+        self.generation = None
+        self.uploaded = False
+
+    def _allocate(self, capacity):
+        self.capacity = capacity
+        self.positions = np.zeros((capacity, 3), dtype=np.float32)
+        self.colors = np.zeros((capacity, 4), dtype=np.float32)
+        self.sizes = np.zeros(capacity, dtype=np.float32)
+        self.slots = {}   # chiave blocco -> (inizio, posti, voxel)
+        self.free = {}    # posti -> inizi liberi
+        self.end = 0
+        self.count = 0
+
+    def _take_slot(self, length):
+        room = max(_MIN_SLOT, 1 << max(int(length) - 1, 0).bit_length())
+        if self.free.get(room):
+            return self.free[room].pop(), room
+        if self.end + room > self.capacity:
+            return None, room
+        start = self.end
+        self.end += room
+        return start, room
+
+    def _release(self, key):
+        slot = self.slots.pop(key, None)
+        if slot is None:
+            return None
+        start, room, length = slot
+        self.sizes[start:start + length] = 0
+        self.count -= length
+        self.free.setdefault(room, []).append(start)
+        return start, start + length
+
+    # Aggiorna il buffer leggendo direttamente il volume (stesso thread del rendering);
+    # restituisce il numero di blocchi ricalcolati
+    def update(self, volume):
+        reset, shells = collect_shells(volume, self.generation)
+        self.generation = volume.generation
+        self.apply(reset, shells)
+        return len(shells)
+
+    # Sostituisce le superfici dei blocchi in shells (vedi collect_shells) e carica sulla
+    # GPU i loro intervalli
+    def apply(self, reset, shells):
+        full = not self.uploaded
+        if reset:
+            self._allocate(self.capacity)
+            full = True
+        changed = []
+        for key, (coords, rgba) in shells.items():
+            released = self._release(key)
+            if released is not None:
+                changed.append(released)
+            if len(coords) == 0:
+                continue
+            start, room = self._take_slot(len(coords))
+            while start is None:
+                # Buffer pieno: raddoppia mantenendo i posti gia' assegnati
+                self._grow()
+                full = True
+                start, room = self._take_slot(len(coords))
+            stop = start + len(coords)
+            self.positions[start:stop] = coords
+            self.colors[start:stop] = rgba
+            self.sizes[start:stop] = self.marker_size
+            self.slots[key] = (start, room, len(coords))
+            self.count += len(coords)
+            changed.append((start, stop))
+        if full or not all(self._upload_range(a, b) for a, b in changed):
+            self._upload_all()
+
+    def _grow(self):
+        old = (self.positions, self.colors, self.sizes)
+        capacity = self.capacity * 2
+        self.positions = np.zeros((capacity, 3), dtype=np.float32)
+        self.colors = np.zeros((capacity, 4), dtype=np.float32)
+        self.sizes = np.zeros(capacity, dtype=np.float32)
+        for target, source in zip((self.positions, self.colors, self.sizes), old):
+            target[:self.capacity] = source
+        self.capacity = capacity
+
+    def _upload_all(self):
+        self.markers.set_data(self.positions, face_color=self.colors, size=self.sizes, edge_width=0)
+        self.uploaded = True
+
+    # Carica sulla GPU solo i marker [start, stop) scrivendo nel vertex buffer della
+    # visual; False se la versione di vispy non lo permette (si ricarica tutto)
+    def _upload_range(self, start, stop):
+        if stop <= start:
+            return True
+        data = getattr(self.markers, '_data', None)
+        vbo = getattr(self.markers, '_vbo', None)
+        if data is None or vbo is None or len(data) != self.capacity:
+            return False
+        try:
+            data['a_position'][start:stop, :3] = self.positions[start:stop]
+            data['a_bg_color'][start:stop] = self.colors[start:stop]
+            data['a_size'][start:stop] = self.sizes[start:stop]
+            vbo.set_subdata(data[start:stop], offset=start)
+        except (KeyError, ValueError, AttributeError):
+            return False
+        self.markers.update()
+        return True
+
+
+# Passaggio del rendering dal thread dei comandi al ciclo di eventi di VisPy/Qt.
+# Il thread che modifica il volume chiama publish(): le superfici dei blocchi modificati
+# vengono calcolate li' e accumulate in un buffer in attesa (le pubblicazioni successive
+# si fondono, l'ultima superficie di ogni blocco vince). Un timer sul thread di Qt scambia
+# il buffer in attesa con uno vuoto sotto lock, lo applica al ShellRenderer e ridisegna:
+# al massimo un fotogramma ogni 1 / fps secondi, qualunque sia il numero di modifiche, e
+# nessuna visual o contesto GL viene toccato fuori dal thread di Qt.
+class RenderScheduler:
+    def __init__(self, canvas, parent, fps=RENDER_FPS, on_first_frame=None):
+        self.canvas = canvas
+        self.parent = parent
+        self.on_first_frame = on_first_frame
+        self.renderer = None
+        self.lock = threading.Lock()
+        self.publish_lock = threading.Lock()
+        self.source = None         # volume mostrato (quello dell'ultimo publish)
+        self.generation = None     # generazione del volume letta dall'ultimo publish
+        self.pending = (False, {})
+        self.dirty = False
+        self.quitting = False
+        self.frames = 0
+        from vispy import app
+        self.timer = app.Timer(1.0 / fps, connect=self._on_timer, start=True)
+
+    # Dal thread dei comandi: calcola e accoda le superfici modificate. Restituisce il
+    # numero di blocchi accodati e di voxel di superficie al loro interno.
+    # La finestra mostra il volume dell'ultimo publish: passando a un altro volume
+    # (un'altra sessione) la scena viene ricaricata per intero
+    def publish(self, volume):
+        with self.publish_lock:
+            if volume is not self.source:
+                self.source = volume
+                self.generation = None
+            reset, shells = collect_shells(volume, self.generation)
+            self.generation = volume.generation
+            with self.lock:
+                if reset:
+                    self.pending = (True, shells)
+                else:
+                    self.pending[1].update(shells)
+                self.dirty = True
+        return len(shells), sum(len(coords) for coords, _ in shells.values())
+
+    # Chiusura richiesta da un altro thread: app.quit() viene chiamato dal timer
+    def quit(self):
+        self.quitting = True
+
+    def _on_timer(self, event):
+        if self.quitting:
+            from vispy import app
+            self.timer.stop()
+            app.quit()
+            return
+        with self.lock:
+            if not self.dirty:
+                return
+            (reset, shells), self.pending = self.pending, (False, {})
+            self.dirty = False
+        if self.renderer is None:
+            self.renderer = ShellRenderer(self.parent)
+            if self.on_first_frame is not None:
+                self.on_first_frame()
+        self.renderer.apply(reset, shells)
+        self.frames += 1
+        self.canvas.update()
@@ -0,0 +1,253 @@
+import numpy as np
+
+# Lato dei blocchi su cui vengono valutate le distanze
+SDF_BLOCK_SIZE = 32
+
+
+# Intersezione di due bounding box (lo, hi); None se disgiunte
+def _intersect_bounds(a, b):
+    lo = np.maximum(a[0], b[0])
+    hi = np.minimum(a[1], b[1])
+    if np.any(lo > hi):
+        return None
+    return lo, hi
+
+
+# Nodo base: una funzione distanza con segno (negativa dentro, positiva fuori)
+# e la sua bounding box in coordinate continue
+class SDFNode:
+    def distance(self, x, y, z):
+        raise NotImplementedError
+
+    def bounds(self):
+        raise NotImplementedError
+
+    # Versione semplificata del nodo valida nella regione [lo, hi], None se la
+    # regione e' sicuramente fuori dalla forma
+    def prune(self, lo, hi):
+        b = self.bounds()
+        if b is None or _intersect_bounds(b, (lo, hi)) is None:
+            return None
+        return self
+
+    # Scrive la forma nel volume valutandola a blocchi (interfaccia comune agli Stamp)
+    def apply(self, volume, value=1, color=None):
+        return rasterize_sdf(self, volume, value=value, color=color)
+
+
+# Parallelepipedo centrato in center con dimensioni size, spigoli arrotondati di raggio radius
+class Box(SDFNode):
+    def __init__(self, center, size, radius=0.0):
+        self.center = np.asarray(center, dtype=np.float64)
+        self.half = np.asarray(size, dtype=np.float64) / 2
+        self.radius = min(float(radius), float(self.half.min()))
+
+    def distance(self, x, y, z):
+        r = self.radius
+        qx = np.abs(x - self.center[0]) - (self.half[0] - r)
+        qy = np.abs(y - self.center[1]) - (self.half[1] - r)
+        qz = np.abs(z - self.center[2]) - (self.half[2] - r)
+        outside = np.sqrt(np.maximum(qx, 0) ** 2 + np.maximum(qy, 0) ** 2 + np.maximum(qz, 0) ** 2)
+        inside = np.minimum(np.maximum(qx, np.maximum(qy, qz)), 0)
+        return outside + inside - r
+
+    def bounds(self):
+        return self.center - self.half, self.center + self.half
+
+
+# Sfera
+class Sphere(SDFNode):
+    def __init__(self, center, radius):
+        self.center = np.asarray(center, dtype=np.float64)
+        self.radius = float(radius)
+
+    def distance(self, x, y, z):
+        c = self.center
+        return np.sqrt((x - c[0]) ** 2 + (y - c[1]) ** 2 + (z - c[2]) ** 2) - self.radius
+
+    def bounds(self):
+        return self.center - self.radius, self.center + self.radius
+
+
+# Cilindro con asse z: base in center (come draw_cylinder), alto height
+class Cylinder(SDFNode):
+    def __init__(self, center, radius, height):
+        self.center = np.asarray(center, dtype=np.float64)
+        self.radius = float(radius)
+        self.height = float(height)
+
+    def distance(self, x, y, z):
+        c = self.center
+        dr = np.sqrt((x - c[0]) ** 2 + (y - c[1]) ** 2) - self.radius
+        dz = np.abs(z - (c[2] + self.height / 2)) - self.height / 2
+        outside = np.sqrt(np.maximum(dr, 0) ** 2 + np.maximum(dz, 0) ** 2)
+        return outside + np.minimum(np.maximum(dr, dz), 0)
+
+    def bounds(self):
+        c = self.center
+        lo = np.array([c[0] - self.radius, c[1] - self.radius, c[2]])
+        hi = np.array([c[0] + self.radius, c[1] + self.radius, c[2] + self.height])
+        return lo, hi
+
+
+# Unione: minimo delle distanze
+class Union(SDFNode):
+    def __init__(self, *children):
+        self.children = list(children)
+
+    def distance(self, x, y, z):
+        d = self.children[0].distance(x, y, z)
+        for child in self.children[1:]:
+            d = np.minimum(d, child.distance(x, y, z))
+        return d
+
+    def bounds(self):
+        boxes = [b for b in (child.bounds() for child in self.children) if b is not None]
+        if not boxes:
+            return None
+        return np.min([b[0] for b in boxes], axis=0), np.max([b[1] for b in boxes], axis=0)
+
+    def prune(self, lo, hi):
+        children = [c for c in (child.prune(lo, hi) for child in self.children) if c is not None]
+        if not children:
+            return None
+        return children[0] if len(children) == 1 else Union(*children)
+
+
+# Sottrazione: a - b, cioe' max(a, -b)
+class Subtract(SDFNode):
+    def __init__(self, a, b):
+        self.a = a
+        self.b = b
+
+    def distance(self, x, y, z):
+        return np.maximum(self.a.distance(x, y, z), -self.b.distance(x, y, z))
+
+    def bounds(self):
+        return self.a.bounds()
+
+    def prune(self, lo, hi):
+        a = self.a.prune(lo, hi)
+        if a is None:
+            return None
+        b = self.b.prune(lo, hi)
+        return a if b is None else Subtract(a, b)
+
+
+# Intersezione: massimo delle distanze
+class Intersect(SDFNode):
+    def __init__(self, a, b):
+        self.a = a
+        self.b = b
+
+    def distance(self, x, y, z):
+        return np.maximum(self.a.distance(x, y, z), self.b.distance(x, y, z))
+
+    def bounds(self):
+        a, b = self.a.bounds(), self.b.bounds()
+        if a is None or b is None:
+            return None
+        return _intersect_bounds(a, b)
+
+    def prune(self, lo, hi):
+        a = self.a.prune(lo, hi)
+        b = self.b.prune(lo, hi) if a is not None else None
+        if a is None or b is None:
+            return None
+        return Intersect(a, b)
+
+
+# Aggiunge una primitiva a un albero SDF: unione se positiva, sottrazione se negativa
+def combine(node, primitive, negative=False):
+    if node is None:
+        return None if negative else primitive
+    return Subtract(node, primitive) if negative else Union(node, primitive)
+
+
+# Primitive SDF equivalenti ai kernel di raster.py
+def cube_sdf(center, length, width, height):
+    return Box(center, (length, width, height))
+
+
+def cylinder_sdf(center, radius, height):
+    return Cylinder(center, radius, height)
+
+
+# Bounding box in voxel interi [lo, hi) delle coordinate continue, ritagliata sullo spazio
+def _voxel_bounds(bounds, size):
+    lo = np.maximum(np.floor(bounds[0]).astype(np.int64), 0)
+    hi = np.minimum(np.ceil(bounds[1]).astype(np.int64) + 1, size)
+    if np.any(lo >= hi):
+        return None
+    return lo, hi
+
+
+# Distanze campionate sui punti interi della regione [lo, hi)
+def sample(node, lo, hi):
+    x = np.arange(lo[0], hi[0], dtype=np.float64)[:, None, None]
+    y = np.arange(lo[1], hi[1], dtype=np.float64)[None, :, None]
+    z = np.arange(lo[2], hi[2], dtype=np.float64)[None, None, :]
+    return np.broadcast_to(node.distance(x, y, z), (len(x), y.shape[1], z.shape[2]))
+
+
+# Valuta l'albero a blocchi di SDF_BLOCK_SIZE^3 e scrive i voxel con distanza <= 0.
+# Ogni blocco viene prima potato: le primitive la cui bounding box non tocca il
+# blocco spariscono, e i blocchi fuori da tutte le primitive vengono saltati.
+def rasterize_sdf(node, volume, value=1, color=None, block_size=SDF_BLOCK_SIZE):
+    bounds = node.bounds()
+    if bounds is None:
+        return 0
+    region = _voxel_bounds(bounds, volume.size)
+    if region is None:
+        return 0
+    lo, hi = region
+    written = 0
+    for bx in range(lo[0], hi[0], block_size):
+        for by in range(lo[1], hi[1], block_size):
+            for bz in range(lo[2], hi[2], block_size):
+                a = np.array([bx, by, bz])
+                b = np.minimum(a + block_size, hi)
+                pruned = node.prune(a, b - 1)
+                if pruned is None:
+                    continue
+                mask = sample(pruned, a, b) <= 0
+                if mask.any():
+                    written += volume.fill(a, b, value=value, color=color, mask=mask)
+    return written
+
+
+# Campo di distanza sull'intera forma con un voxel di margine, per l'estrazione
+# della superficie a precisione sub-voxel (marching cubes al livello 0).
+# Restituisce (campo, origine) oppure None se la forma e' vuota.
+def sample_field(node, pitch=1.0, margin=1):
+    bounds = node.bounds()
+    if bounds is None:
+        return None
+    lo = np.floor(bounds[0] / pitch).astype(np.int64) - margin
+    hi = np.ceil(bounds[1] / pitch).astype(np.int64) + margin + 1
+    field = np.empty(tuple(hi - lo), dtype=np.float32)
+    step = SDF_BLOCK_SIZE
+    for bx in range(0, field.shape[0], step):
+        x = (lo[0] + np.arange(bx, min(bx + step, field.shape[0]))) * pitch
+        field[bx:bx + len(x)] = node.distance(
+            x[:, None, None],
+            ((lo[1] + np.arange(field.shape[1])) * pitch)[None, :, None],
+            ((lo[2] + np.arange(field.shape[2])) * pitch)[None, None, :])
+    return field, lo * pitch
+
+
+# Converte le operazioni registrate in una CSGScene in un unico albero SDF.
+# Le primitive a coordinate ('voxels') non hanno una distanza e vengono ignorate; una
+# scena ripartita da uno snapshot (foglia 'volume') non e' convertibile e solleva
+# ValueError, invece di perdere in silenzio tutto il contenuto caricato.
+def scene_to_sdf(operations):
+    node = None
+    builders = {'cube': cube_sdf, 'cylinder': cylinder_sdf, 'sdf': lambda node: node}
+    for primitive, negative in operations:
+        if primitive.kind == 'volume':
+            raise ValueError(f"la scena parte dallo snapshot '{primitive.params['source']}', "
+                             f"che non e' convertibile in SDF")
+        builder = builders.get(primitive.kind)
+        if builder is not None:
+            node = combine(node, builder(**primitive.params), negative)
+    return node
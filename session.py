@@ -0,0 +1,161 @@
+import itertools
+import threading
+import time
+from contextlib import contextmanager
+
+# Sessioni aperte al massimo (oltre si eliminano le inattive piu' vecchie)
+SESSION_MAX = 16
+# Memoria massima del volume di una sessione
+SESSION_MAX_BYTES = 512 * 1024 * 1024
+# Spazio su disco massimo del volume mappato di una sessione
+SESSION_MAX_DISK_BYTES = 8 * 1024 * 1024 * 1024
+# Secondi senza comandi dopo cui una sessione senza connessioni viene eliminata
+SESSION_IDLE_SECONDS = 30 * 60
+# Nome della sessione condivisa (export su output.stl come prima delle sessioni)
+DEFAULT_SESSION = "default"
+# Prefisso dei nomi delle sessioni anonime, riservato: nessun client puo' aprire con
+# "session <nome>" la sessione privata di un'altra connessione
+ANONYMOUS_PREFIX = "conn-"
+
+_local = threading.local()
+
+
+# Troppe sessioni aperte e nessuna eliminabile
+class SessionLimitError(Exception):
+    pass
+
+
+# Nome di sessione non ammesso (riservato alle sessioni anonime)
+class SessionNameError(Exception):
+    pass
+
+
+# Scena di un utente: volume, scena CSG e file di export propri. Il lock serializza i
+# comandi della sessione; sessioni diverse lavorano in parallelo.
+class Session:
+    def __init__(self, name, volume, scene, anonymous=False, journal=None):
+        self.name = name
+        self.volume = volume
+        self.scene = scene
+        self.journal = journal  # undo/redo dei comandi (journal.Journal)
+        self.anonymous = anonymous
+        self.export_filename = "output.stl" if name == DEFAULT_SESSION else f"output_{name}.stl"
+        self.lock = threading.RLock()
+        self.voxels = 0  # voxel pieni all'ultima valutazione, per le metriche
+        self.source = None  # (radice della scena CSG, AW degli oggetti del database che l'hanno costruita)
+        self.connections = 0
+        self.running = 0
+        # Lock sotto cui cambiano connections e running: quello del SessionManager che la
+        # gestisce, cosi' l'eliminazione delle inattive non vede un conteggio a meta'
+        self.manager_lock = threading.Lock()
+        self.created = time.time()
+        self.last_used = self.created
+
+    def touch(self):
+        self.last_used = time.time()
+
+    @property
+    def nbytes(self):
+        return self.volume.nbytes
+
+    # Byte del file del volume mappato (0 per i volumi in memoria)
+    @property
+    def disk_bytes(self):
+        return getattr(self.volume, 'file_bytes', 0)
+
+    # Occupata: con connessioni aperte o comandi in corso
+    @property
+    def busy(self):
+        return self.connections > 0 or self.running > 0
+
+
+# Sessione del comando eseguito dal thread corrente
+def current_session():
+    session = getattr(_local, 'session', None)
+    if session is None:
+        raise RuntimeError("Nessuna sessione attiva")
+    return session
+
+
+# Esegue il blocco con session come sessione corrente del thread
+@contextmanager
+def activate(session):
+    previous = getattr(_local, 'session', None)
+    _local.session = session
+    with session.manager_lock:
+        session.running += 1
+    try:
+        yield session
+    finally:
+        with session.manager_lock:
+            session.running -= 1
+            session.touch()
+        _local.session = previous
+
+
+# Registro delle sessioni. Ogni connessione apre una sessione anonima, eliminata alla
+# chiusura; le sessioni con nome ("session <nome>") restano finche' sono inattive da
+# idle_timeout secondi, e piu' connessioni possono condividerle.
+class SessionManager:
+    def __init__(self, factory, max_sessions=SESSION_MAX, max_bytes=SESSION_MAX_BYTES,
+                 idle_timeout=SESSION_IDLE_SECONDS, max_disk_bytes=SESSION_MAX_DISK_BYTES):
+        self.factory = factory
+        self.max_sessions = max_sessions
+        self.max_bytes = max_bytes
+        self.max_disk_bytes = max_disk_bytes
+        self.idle_timeout = idle_timeout
+        self.sessions = {}
+        self.lock = threading.Lock()
+        self._anonymous = itertools.count(1)
+
+    # Apre (o riprende) la sessione name per una connessione; senza nome ne crea una anonima
+    def open(self, name=None):
+        with self.lock:
+            anonymous = name is None
+            if anonymous:
+                name = f"{ANONYMOUS_PREFIX}{next(self._anonymous)}"
+            elif name.startswith(ANONYMOUS_PREFIX):
+                raise SessionNameError(f"Nome di sessione riservato: '{name}'")
+            session = self.sessions.get(name)
+            if session is None:
+                if len(self.sessions) >= self.max_sessions:
+                    self._evict(force=True)
+                if len(self.sessions) >= self.max_sessions:
+                    raise SessionLimitError(f"Troppe sessioni aperte ({self.max_sessions})")
+                session = self.factory(name)
+                session.anonymous = anonymous
+                session.manager_lock = self.lock
+                self.sessions[name] = session
+            session.connections += 1
+            session.touch()
+            return session
+
+    # Chiusura di una connessione: le sessioni anonime vengono eliminate subito
+    def release(self, session):
+        with self.lock:
+            session.connections -= 1
+            if session.anonymous and session.connections <= 0:
+                self.sessions.pop(session.name, None)
+
+    # Oltre il limite di memoria o, per i volumi mappati, di spazio su disco
+    def over_limit(self, session):
+        return session.nbytes > self.max_bytes or session.disk_bytes > self.max_disk_bytes
+
+    # Elimina le sessioni inattive da piu' di idle_timeout secondi (con force la meno
+    # usata di recente tra quelle libere, per fare posto); restituisce i nomi eliminati
+    def evict_idle(self):
+        with self.lock:
+            return self._evict()
+
+    def _evict(self, force=False):
+        now = time.time()
+        idle = sorted((s for s in self.sessions.values() if not s.busy), key=lambda s: s.last_used)
+        evicted = [s for s in idle if now - s.last_used > self.idle_timeout]
+        if force and not evicted and idle:
+            evicted = idle[:1]
+        for session in evicted:
+            del self.sessions[session.name]
+            print(f"Sessione '{session.name}' eliminata dopo {now - session.last_used:.0f}s di inattivita' "
+                  f"({session.nbytes / 1024 / 1024:.1f}MB liberati)")
+        return [session.name for session in evicted]
+
@@ -0,0 +1,100 @@
+import ast
+import threading
+
+# Nodi ammessi nelle espressioni delle forme: solo aritmetica su numeri e parametri.
+# Niente potenze: "a ** a ** a" con interi produce numeri enormi e blocca il job (e il
+# lock della sessione) per un tempo illimitato
+_ALLOWED_NODES = (
+    ast.Expression, ast.BinOp, ast.UnaryOp, ast.Constant, ast.Name, ast.Load,
+    ast.Add, ast.Sub, ast.Mult, ast.Div, ast.FloorDiv, ast.Mod, ast.UAdd, ast.USub,
+)
+
+
+# Espressione di una forma (es. "inner_width + 2 * wall_thickness") compilata una volta
+# sola. Al posto di eval() sulla stringa a ogni disegno si valuta il codice gia' compilato,
+# senza builtins e con i soli parametri dichiarati dalla forma.
+class Expression:
+    def __init__(self, source, names):
+        self.source = source
+        tree = ast.parse(str(source).strip(), mode='eval')
+        for node in ast.walk(tree):
+            if not isinstance(node, _ALLOWED_NODES):
+                raise ValueError(f"Espressione non ammessa '{source}': {type(node).__name__}")
+            if isinstance(node, ast.Constant) and (isinstance(node.value, bool) or not isinstance(node.value, (int, float))):
+                raise ValueError(f"Espressione non ammessa '{source}': costante {node.value!r}")
+            if isinstance(node, ast.Name) and node.id not in names:
+                raise ValueError(f"Espressione non ammessa '{source}': parametro '{node.id}' non dichiarato")
+        self.code = compile(tree, f"<{source}>", 'eval')
+
+    def __call__(self, params):
+        return eval(self.code, {'__builtins__': {}}, params)
+
+    def __repr__(self):
+        return f"Expression({self.source!r})"
+
+
+# Operazione di una forma con le espressioni gia' compilate
+class CompiledOperation:
+    def __init__(self, index, op, names):
+        self.index = index
+        self.type = op['type']
+        self.negative = op.get('negative', False)
+        self.center = op.get('center')
+        self.expressions = {key: Expression(value, names) for key, value in op.items()
+                            if key not in ('type', 'negative', 'center')}
+
+    # Valori numerici dei campi dell'operazione per i parametri dati
+    def evaluate(self, params):
+        return {key: expression(params) for key, expression in self.expressions.items()}
+
+
+# Definizione di una forma (campo shape_definition di aige_shapes) compilata
+class CompiledShape:
+    def __init__(self, name, definition):
+        self.name = name
+        self.definition = definition
+        self.type = definition['type']
+        self.parameters = dict(definition.get('parameters', {}))
+        self.operations = [CompiledOperation(i, op, self.parameters)
+                           for i, op in enumerate(definition.get('operations', []))]
+
+
+# Cache delle forme per nome: la definizione viene letta dal database e compilata
+# solo al primo uso, poi riusata finche' non viene invalidata esplicitamente.
+# Anche le forme mancanti vengono ricordate, cosi' un nome sconosciuto non
+# genera una query per ogni oggetto caricato.
+# Condivisa tra i thread delle sessioni: ricerca e inserimento avvengono sotto lock, la
+# query al database fuori, e una forma letta prima di un invalidate() non viene inserita
+class ShapeCache:
+    def __init__(self, loader):
+        self.loader = loader
+        self.shapes = {}
+        self.queries = 0
+        self.hits = 0
+        self.lock = threading.Lock()
+        # Invalidazioni fatte finora, per riconoscere le letture superate
+        self.generation = 0
+
+    def get(self, shape_name):
+        with self.lock:
+            if shape_name in self.shapes:
+                self.hits += 1
+                return self.shapes[shape_name]
+            self.queries += 1
+            generation = self.generation
+        definition = self.loader(shape_name)
+        shape = CompiledShape(shape_name, definition) if definition else None
+        with self.lock:
+            if generation != self.generation:
+                return shape
+            # Un altro thread puo' averla letta nel frattempo: vale la prima inserita
+            return self.shapes.setdefault(shape_name, shape)
+
+    # Dimentica una forma (o tutte): la prossima get() la rilegge dal database
+    def invalidate(self, shape_name=None):
+        with self.lock:
+            self.generation += 1
+            if shape_name is None:
+                self.shapes.clear()
+            else:
+                self.shapes.pop(shape_name, None)
@@ -0,0 +1,153 @@
+import heapq
+import time
+
+import numpy as np
+
+# Errore sotto cui una contrazione e' considerata esatta (facce complanari)
+PLANAR_EPSILON = 1e-10
+
+
+# Quadriche dei piani delle facce (Garland-Heckbert): per ogni vertice la somma di p p^T
+# sui piani delle facce che lo toccano
+def _vertex_quadrics(vertices, faces):
+    t = vertices[faces]
+    normals = np.cross(t[:, 1] - t[:, 0], t[:, 2] - t[:, 0])
+    lengths = np.linalg.norm(normals, axis=1, keepdims=True)
+    normals = np.divide(normals, lengths, out=np.zeros_like(normals), where=lengths > 0)
+    planes = np.concatenate([normals, -np.einsum('ij,ij->i', normals, t[:, 0])[:, None]], axis=1)
+    face_q = planes[:, :, None] * planes[:, None, :]
+    quadrics = np.zeros((len(vertices), 4, 4))
+    for k in range(3):
+        np.add.at(quadrics, faces[:, k], face_q)
+    return quadrics
+
+
+# Normali non normalizzate di triangoli (n, 3, 3); np.cross e' lento su array piccoli
+def _normals(t):
+    e1 = t[:, 1] - t[:, 0]
+    e2 = t[:, 2] - t[:, 0]
+    return np.stack([e1[:, 1] * e2[:, 2] - e1[:, 2] * e2[:, 1],
+                     e1[:, 2] * e2[:, 0] - e1[:, 0] * e2[:, 2],
+                     e1[:, 0] * e2[:, 1] - e1[:, 1] * e2[:, 0]], axis=1)
+
+
+# Semplificazione di una mesh chiusa per contrazione di lati in ordine di errore
+# quadratico. Le contrazioni a errore nullo (vertici interni a zone piane o lungo uno
+# spigolo dritto) vengono per prime, quindi le facce complanari si fondono prima di
+# qualunque approssimazione. Ci si ferma a target_faces facce o quando l'errore supera
+# tolerance (distanza, nelle unita' dei vertici); senza nessuno dei due si fondono solo
+# le facce complanari. Una contrazione viene scartata se rompe la varieta' (condizione
+# sui vicini comuni) o se ribalta una faccia. Restituisce (vertices, faces).
+class Simplifier:
+    def __init__(self, vertices, faces):
+        self.vertices = np.array(vertices, dtype=np.float64)
+        self.faces = np.array(faces, dtype=np.int64)
+        self.alive = np.ones(len(self.faces), dtype=bool)
+        self.quadrics = _vertex_quadrics(self.vertices, self.faces)
+        self.version = [0] * len(self.vertices)
+        self.vertex_faces = [set() for _ in range(len(self.vertices))]
+        for f, face in enumerate(self.faces.tolist()):
+            for v in face:
+                self.vertex_faces[v].add(f)
+        self.face_count = len(self.faces)
+        self.heap = []
+
+    def _neighbors(self, v):
+        return {u for f in self.vertex_faces[v] for u in self.faces[f]} - {v}
+
+    # Posizioni migliori per la contrazione dei lati (a[i], b[i]): un estremo, il punto
+    # medio o l'ottimo della quadrica; a parita' di errore si preferiscono gli estremi
+    # (restano sul reticolo). Calcolate per tutti i lati insieme.
+    def _candidates(self, a, b):
+        q = self.quadrics[a] + self.quadrics[b]
+        va, vb = self.vertices[a], self.vertices[b]
+        optimal = (va + vb) / 2
+        solvable = np.abs(np.linalg.det(q[:, :3, :3])) > 1e-12
+        if solvable.any():
+            optimal = optimal.copy()
+            optimal[solvable] = np.linalg.solve(q[solvable, :3, :3], -q[solvable, :3, 3:])[:, :, 0]
+        options = np.stack([va, vb, (va + vb) / 2, optimal], axis=1)
+        h = np.concatenate([options, np.ones(options.shape[:2] + (1,))], axis=2)
+        errors = np.maximum(np.einsum('koi,kij,koj->ko', h, q, h), 0)
+        choice = np.argmax(errors <= errors.min(axis=1, keepdims=True) + PLANAR_EPSILON, axis=1)
+        index = np.arange(len(a))
+        return errors[index, choice], options[index, choice]
+
+    def _push(self, a, b):
+        if len(a) == 0:
+            return
+        errors, points = self._candidates(np.asarray(a), np.asarray(b))
+        version = self.version
+        for err, u, v, p in zip(errors.tolist(), a, b, points):
+            heapq.heappush(self.heap, (err, u, v, version[u], version[v], p))
+
+    # Condizione di varieta': i vicini comuni di a e b sono solo i due vertici opposti
+    # alle facce del lato, e nessuna faccia attorno viene ribaltata dallo spostamento in p
+    def _can_collapse(self, a, b, p):
+        shared = self.vertex_faces[a] & self.vertex_faces[b]
+        if len(shared) != 2:
+            return False
+        opposite = {u for f in shared for u in self.faces[f]} - {a, b}
+        if self._neighbors(a) & self._neighbors(b) != opposite:
+            return False
+        around = list((self.vertex_faces[a] | self.vertex_faces[b]) - shared)
+        corners = self.faces[around]
+        before = self.vertices[corners]
+        after = before.copy()
+        after[(corners == a) | (corners == b)] = p
+        n0, n1 = _normals(before), _normals(after)
+        return bool(np.all(np.einsum('ij,ij->i', n0, n1) > 1e-12 * np.einsum('ij,ij->i', n0, n0)))
+
+    def _collapse(self, a, b, p):
+        shared = self.vertex_faces[a] & self.vertex_faces[b]
+        for f in shared:
+            self.alive[f] = False
+            for v in self.faces[f]:
+                self.vertex_faces[v].discard(f)
+        self.face_count -= len(shared)
+        for f in self.vertex_faces[b]:
+            self.faces[f][self.faces[f] == b] = a
+        self.vertex_faces[a] |= self.vertex_faces[b]
+        self.vertex_faces[b] = set()
+        self.vertices[a] = p
+        self.quadrics[a] += self.quadrics[b]
+        self.version[a] += 1
+        self.version[b] += 1
+        neighbors = list(self._neighbors(a))
+        self._push([a] * len(neighbors), neighbors)
+
+    def run(self, target_faces=None, tolerance=None):
+        limit = PLANAR_EPSILON if tolerance is None and target_faces is None else (
+            float('inf') if tolerance is None else tolerance * tolerance)
+        target = target_faces or 0
+        edges = np.concatenate([self.faces[:, [0, 1]], self.faces[:, [1, 2]], self.faces[:, [2, 0]]])
+        edges = np.unique(np.sort(edges, axis=1), axis=0)
+        errors, points = self._candidates(edges[:, 0], edges[:, 1])
+        self.heap = [(err, a, b, 0, 0, p) for err, (a, b), p in zip(errors.tolist(), edges.tolist(), points)]
+        heapq.heapify(self.heap)
+        while self.heap and self.face_count > target:
+            err, a, b, va, vb, p = heapq.heappop(self.heap)
+            if va != self.version[a] or vb != self.version[b]:
+                continue
+            if err > limit:
+                break
+            if self._can_collapse(a, b, p):
+                self._collapse(a, b, p)
+        return self.result()
+
+    # Mesh compatta: solo facce vive e vertici usati
+    def result(self):
+        faces = self.faces[self.alive]
+        used, inverse = np.unique(faces, return_inverse=True)
+        return self.vertices[used], inverse.reshape(-1, 3)
+
+
+# Semplifica la mesh e stampa il confronto prima/dopo (triangoli, vertici, byte STL)
+def simplify_mesh(vertices, faces, target_faces=None, tolerance=None):
+    start = time.time()
+    before = (len(faces), len(np.unique(faces)))
+    vertices, faces = Simplifier(vertices, faces).run(target_faces, tolerance)
+    print(f"Semplificazione: {before[0]} -> {len(faces)} triangoli, {before[1]} -> {len(vertices)} vertici, "
+          f"STL {(84 + 50 * before[0]) / 1024:.0f}KB -> {(84 + 50 * len(faces)) / 1024:.0f}KB "
+          f"in {time.time() - start:.3f}s")
+    return vertices, faces
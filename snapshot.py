@@ -0,0 +1,159 @@
+import hashlib
+import json
+import os
+import struct
+import time
+
+import numpy as np
+
+# File di snapshot: magic, versione e lunghezza dell'header JSON, l'header, poi gli array
+# grezzi allineati a SNAPSHOT_ALIGN byte (leggibili direttamente da un memory map)
+SNAPSHOT_MAGIC = b'T2CSNAP\0'
+SNAPSHOT_VERSION = 1
+SNAPSHOT_ALIGN = 64
+SNAPSHOT_EXTENSION = '.t2cs'
+
+_PREFIX = struct.Struct('<8sII')
+
+# Stato dei blocchi nello snapshot
+_PARTIAL = 1
+_FULL = 2
+
+
+# Snapshot illeggibile, di un'altra versione o non compatibile con il volume
+class SnapshotError(Exception):
+    pass
+
+
+# Hash del contenuto delle sorgenti di una scena: le righe di aige_treedee e le definizioni
+# delle forme che usano. Uno snapshot con un hash diverso da quello attuale e' superato
+def source_hash(rows, shapes):
+    digest = hashlib.sha256()
+    for row in rows:
+        digest.update(json.dumps(row, sort_keys=True, default=str).encode('utf-8'))
+        digest.update(b'\n')
+    digest.update(json.dumps(shapes, sort_keys=True, default=str).encode('utf-8'))
+    return digest.hexdigest()
+
+
+def _aligned(offset):
+    return -(-offset // SNAPSHOT_ALIGN) * SNAPSHOT_ALIGN
+
+
+# Blocco portato al lato pieno brick_size (i blocchi del volume denso sono tagliati ai bordi)
+def _padded(array, brick_size):
+    if array.shape == (brick_size,) * 3:
+        return array
+    out = np.zeros((brick_size,) * 3, dtype=np.uint8)
+    out[tuple(slice(0, n) for n in array.shape)] = array
+    return out
+
+
+# Salva il volume valutato in path. Per ogni blocco occupato: chiave, stato (pieno o
+# parziale) e colore uniforme; l'occupazione dei blocchi parziali e' compressa a un bit per
+# voxel (np.packbits), i colori per voxel restano un byte solo per i blocchi multicolore.
+# La scrittura e' atomica. Restituisce il numero di byte scritti
+def save_snapshot(volume, path, source=None, meta=None):
+    bs = volume.brick_size
+    keys = sorted(volume.occupied_blocks())
+    flags = np.zeros(len(keys), dtype=np.uint8)
+    uniform = np.zeros(len(keys), dtype=np.uint8)
+    packed, color_bricks, color_data = [], [], []
+    for i, key in enumerate(keys):
+        occupancy, colors = volume.block(key)
+        if occupancy is None:
+            continue
+        occupancy = _padded(occupancy, bs) != 0
+        if occupancy.all():
+            flags[i] = _FULL
+        else:
+            flags[i] = _PARTIAL
+            packed.append(np.packbits(occupancy, axis=None))
+        if isinstance(colors, np.ndarray):
+            values = colors[occupancy[tuple(slice(0, n) for n in colors.shape)]]
+            if len(values) and np.all(values == values[0]):
+                uniform[i] = values[0]
+            else:
+                color_bricks.append(i)
+                color_data.append(_padded(colors, bs))
+        else:
+            uniform[i] = colors
+    cells = bs ** 3
+    arrays = dict(
+        keys=np.array(keys, dtype=np.int32).reshape(-1, 3),
+        flags=flags,
+        uniform=uniform,
+        packed=np.array(packed, dtype=np.uint8).reshape(-1, cells // 8),
+        color_bricks=np.array(color_bricks, dtype=np.int32),
+        color_data=np.array(color_data, dtype=np.uint8).reshape(-1, bs, bs, bs),
+    )
+    layout = {}
+    offset = 0
+    for name, array in arrays.items():
+        layout[name] = [offset, array.dtype.str, list(array.shape)]
+        offset = _aligned(offset + array.nbytes)
+    header = json.dumps(dict(
+        size=volume.size, brick_size=bs, palette=[list(c) for c in volume.palette],
+        source=source, voxels=volume.count(), created=time.time(), meta=meta or {}, arrays=layout,
+    )).encode('utf-8')
+    data_start = _aligned(_PREFIX.size + len(header))
+    tmp = path + '.tmp'
+    with open(tmp, 'wb') as f:
+        f.write(_PREFIX.pack(SNAPSHOT_MAGIC, SNAPSHOT_VERSION, len(header)))
+        f.write(header)
+        for name, array in arrays.items():
+            f.seek(data_start + layout[name][0])
+            f.write(np.ascontiguousarray(array).tobytes())
+        f.truncate(data_start + offset)
+    os.replace(tmp, path)
+    return data_start + offset
+
+
+# Header dello snapshot (dimensioni, palette, hash delle sorgenti, disposizione degli array)
+def read_header(path):
+    with open(path, 'rb') as f:
+        prefix = f.read(_PREFIX.size)
+        if len(prefix) < _PREFIX.size:
+            raise SnapshotError(f"{path}: file troncato")
+        magic, version, length = _PREFIX.unpack(prefix)
+        if magic != SNAPSHOT_MAGIC:
+            raise SnapshotError(f"{path}: non e' uno snapshot di scena")
+        if version != SNAPSHOT_VERSION:
+            raise SnapshotError(f"{path}: versione {version} non supportata (attesa {SNAPSHOT_VERSION})")
+        header = json.loads(f.read(length).decode('utf-8'))
+    header['data_start'] = _aligned(_PREFIX.size + length)
+    return header
+
+
+# Carica lo snapshot in volume (che viene svuotato). Il file viene mappato in memoria e gli
+# array letti senza parsing: restano da scompattare solo i bit dei blocchi parziali.
+# Restituisce l'header
+def load_snapshot(path, volume, header=None):
+    header = header or read_header(path)
+    if header['size'] != volume.size or header['brick_size'] != volume.brick_size:
+        raise SnapshotError(f"{path}: volume {header['size']} a blocchi di {header['brick_size']}, "
+                            f"atteso {volume.size} a blocchi di {volume.brick_size}")
+    mapped = np.memmap(path, dtype=np.uint8, mode='r')
+    try:
+        def array(name):
+            offset, dtype, shape = header['arrays'][name]
+            start = header['data_start'] + offset
+            count = int(np.prod(shape))
+            return np.frombuffer(mapped, dtype=dtype, count=count, offset=start).reshape(shape)
+
+        bs = volume.brick_size
+        keys = array('keys').tolist()
+        flags = array('flags').tolist()
+        uniform = array('uniform').tolist()
+        # Un solo unpackbits per tutti i blocchi parziali; ogni blocco e' una vista del risultato
+        occupancy = np.unpackbits(array('packed'), axis=1).reshape(-1, bs, bs, bs)
+        colors = dict(zip(array('color_bricks').tolist(), np.array(array('color_data'))))
+    finally:
+        del mapped
+    volume.clear()
+    volume.palette = [tuple(c) for c in header['palette']]
+    partial = iter(occupancy)
+    for i, key in enumerate(keys):
+        full = flags[i] == _FULL
+        volume.set_block(tuple(key), None if full else next(partial), colors.get(i, uniform[i]), full=full, mark=False)
+    return header
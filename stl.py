@@ -0,0 +1,62 @@
+import struct
+
+import numpy as np
+
+# Record di un triangolo nello STL binario: normale, tre vertici, attributo (50 byte)
+STL_DTYPE = np.dtype([('normal', '<f4', (3,)), ('vertices', '<f4', (3, 3)), ('attr', '<u2')])
+
+_HEADER_SIZE = 80
+
+
+# Scrittore di STL binari in streaming: l'intestazione viene scritta subito con zero
+# triangoli, i triangoli vengono aggiunti a blocchi e il conteggio viene corretto alla
+# chiusura. La memoria usata dipende solo dal blocco scritto, non dall'intera mesh.
+class StlWriter:
+    def __init__(self, filename, header=b"text2cad"):
+        self.filename = filename
+        self.count = 0
+        self.file = open(filename, 'wb')
+        self.file.write(header[:_HEADER_SIZE].ljust(_HEADER_SIZE, b' '))
+        self.file.write(struct.pack('<I', 0))
+
+    # Aggiunge i triangoli faces (indici in vertices); le normali sono calcolate dai
+    # vertici, che devono essere in senso antiorario visti dall'esterno
+    def write(self, vertices, faces, scale=1.0):
+        if len(faces) == 0:
+            return 0
+        triangles = np.asarray(vertices, dtype=np.float64)[np.asarray(faces)] * scale
+        return self.write_triangles(triangles)
+
+    # Aggiunge triangoli gia' risolti, array (n, 3, 3)
+    def write_triangles(self, triangles):
+        normals = np.cross(triangles[:, 1] - triangles[:, 0], triangles[:, 2] - triangles[:, 0])
+        lengths = np.linalg.norm(normals, axis=1, keepdims=True)
+        np.divide(normals, lengths, out=normals, where=lengths > 0)
+        records = np.zeros(len(triangles), dtype=STL_DTYPE)
+        records['normal'] = normals
+        records['vertices'] = triangles
+        records.tofile(self.file)
+        self.count += len(triangles)
+        return len(triangles)
+
+    # Corregge il numero di triangoli nell'intestazione e chiude il file
+    def close(self):
+        if self.file is None:
+            return
+        self.file.seek(_HEADER_SIZE)
+        self.file.write(struct.pack('<I', self.count))
+        self.file.close()
+        self.file = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+# Scrive una mesh (vertices, faces) in un file STL binario; restituisce i triangoli scritti
+def write_stl(filename, vertices, faces, scale=1.0):
+    with StlWriter(filename) as writer:
+        writer.write(vertices, faces, scale=scale)
+    return writer.count
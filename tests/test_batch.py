@@ -0,0 +1,76 @@
+# Esecuzione in batch (batch.py):
+#  - gli script di testo e JSON diventano liste di (comando, file STL);
+#  - script con lo stesso nome in directory diverse ricevono nomi distinti, che non si
+#    sovrappongono nemmeno con gli export successivi (<nome>_2.stl);
+#  - eseguito da riga di comando, ogni script scrive i suoi STL e il report ha latenza e
+#    memoria di picco di ogni comando (serve l'ambiente completo del motore).
+#
+# Uso: python -m pytest tests
+import json
+import os
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import pytest
+
+from batch import load_script, percentile, script_names
+
+SHAPES_DUMP = os.path.join(ROOT, "aige_shapes(1).sql")
+
+
+def test_load_text_script(tmp_path):
+    path = tmp_path / "scena.txt"
+    path.write_text("# commento\n\ndraw a box at 50,50,50\n  save stl  \n", encoding='utf-8')
+    assert load_script(str(path)) == [("draw a box at 50,50,50", None), ("save stl", None)]
+
+
+def test_load_json_script(tmp_path):
+    path = tmp_path / "scena.json"
+    path.write_text(json.dumps(["draw a box at 50,50,50", {"command": "save stl", "output": "box.stl"},
+                                {"command": "stats"}]), encoding='utf-8')
+    assert load_script(str(path)) == [("draw a box at 50,50,50", None), ("save stl", "box.stl"), ("stats", None)]
+
+
+def test_script_names_are_unique():
+    paths = ["a/scena.txt", "b/scena.txt", "c/scena.json", "scena_2.txt", "scena-2.txt", "altro.txt"]
+    names = script_names(paths)
+    assert len(set(names)) == len(names)
+    assert names[:3] == ["scena", "scena-2", "scena-3"]
+    # scena_2 e' il secondo export di 'scena': non puo' essere il nome di un altro script
+    assert names[3] != "scena_2"
+    assert names[-1] == "altro"
+
+
+def test_percentile():
+    values = [0.1, 0.2, 0.3, 0.4, 0.5]
+    assert (percentile(values, 0), percentile(values, 50), percentile(values, 100)) == (0.1, 0.3, 0.5)
+    assert percentile([], 95) == 0.0
+
+
+def test_batch_run(tmp_path):
+    pytest.importorskip('websockets')
+    scripts = []
+    for directory in ("uno", "due"):
+        (tmp_path / directory).mkdir()
+        path = tmp_path / directory / "scena.txt"
+        path.write_text("draw a box at 50,50,50\nsave stl\ndraw a box at 120,50,50\nsave stl\nstats\n",
+                        encoding='utf-8')
+        scripts.append(str(path))
+    out = tmp_path / "out"
+    report = tmp_path / "report.json"
+    subprocess.run([sys.executable, os.path.join(ROOT, "batch.py"), *scripts, "--workers", "2", "--out", str(out),
+                    "--report", str(report), "--db-dump", SHAPES_DUMP], check=True, cwd=str(tmp_path), timeout=600)
+    reports = json.loads(report.read_text(encoding='utf-8'))['scripts']
+    assert [r['name'] for r in reports] == ["scena", "scena-2"]
+    for r in reports:
+        assert [c['command'] for c in r['commands']][:4] == ["draw a box at 50,50,50", "save stl",
+                                                             "draw a box at 120,50,50", "save stl"]
+        assert all(c['seconds'] >= 0 for c in r['commands'])
+        assert r['peak_rss_mb'] is None or r['peak_rss_mb'] > 0
+        for stl in (f"{r['name']}.stl", f"{r['name']}_2.stl"):
+            assert (out / stl).stat().st_size > 84
+        # Il secondo export contiene due box
+        assert (out / f"{r['name']}_2.stl").stat().st_size > (out / f"{r['name']}.stl").stat().st_size
@@ -0,0 +1,189 @@
+# Persistenza (db.py), con un pool di connessioni finto al posto di MySQL:
+#  - save_objects inserisce tutto in un'unica transazione con executemany, e annulla
+#    la transazione se l'inserimento fallisce;
+#  - iter_objects legge in streaming a blocchi di fetch_size righe, anche se interrotto;
+#  - a pool pieno le richieste aspettano una connessione libera (fino al timeout);
+#  - MemoryDatabase legge le forme dal dump SQL del repository.
+#
+# Uso: python -m pytest tests
+import json
+import os
+import sys
+import threading
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import pytest
+
+from db import Database, MemoryDatabase
+
+SHAPES_DUMP = os.path.join(ROOT, "aige_shapes(1).sql")
+
+
+class FakeCursor:
+    def __init__(self, connection, rows, fail=False, **options):
+        self.connection = connection
+        self.rows = list(rows)
+        self.fail = fail
+        self.options = options
+        self.closed = False
+        self.lastrowid = 7
+
+    def execute(self, query, params=None):
+        self.connection.log.append(('execute', query.split()[0], params))
+
+    def executemany(self, query, rows):
+        self.connection.log.append(('executemany', query.split()[0], list(rows)))
+        if self.fail:
+            raise RuntimeError("inserimento fallito")
+
+    def fetchmany(self, size):
+        self.connection.log.append(('fetchmany', size))
+        batch, self.rows = self.rows[:size], self.rows[size:]
+        return batch
+
+    def fetchone(self):
+        return self.rows[0] if self.rows else None
+
+    def close(self):
+        self.closed = True
+
+
+class FakeConnection:
+    def __init__(self, pool):
+        self.pool = pool
+        self.log = pool.log
+        self.cursors = []
+
+    def cursor(self, **options):
+        cursor = FakeCursor(self, self.pool.rows, fail=self.pool.fail, **options)
+        self.cursors.append(cursor)
+        return cursor
+
+    def commit(self):
+        self.log.append(('commit',))
+
+    def rollback(self):
+        self.log.append(('rollback',))
+
+    def close(self):
+        self.pool.returned += 1
+
+
+class FakePool:
+    def __init__(self, rows=(), fail=False):
+        self.rows = rows
+        self.fail = fail
+        self.log = []
+        self.connections = []
+        self.returned = 0
+
+    def get_connection(self):
+        connection = FakeConnection(self)
+        self.connections.append(connection)
+        return connection
+
+
+def database(pool, **options):
+    db = Database({}, **options)
+    db.pool = pool
+    return db
+
+
+def test_save_objects_in_one_transaction():
+    pool = FakePool()
+    db = database(pool)
+    objects = [('box', {'inner_width': i}, (i, 2 * i, 3 * i), False) for i in range(100)]
+    objects.append(('box', {}, (0, 0, 0), True, "coperchio"))
+    assert db.save_objects(objects) == 101
+    assert len(pool.connections) == 1 and pool.returned == 1
+    assert [entry[0] for entry in pool.log] == ['executemany', 'commit']
+    rows = pool.log[0][2]
+    assert rows[3] == ('box', None, json.dumps({'inner_width': 3}), 3, 6, 9, False)
+    assert rows[-1] == ('box', "coperchio", "{}", 0, 0, 0, True)
+    assert all(cursor.closed for cursor in pool.connections[0].cursors)
+
+
+def test_save_objects_rolls_back_on_error():
+    pool = FakePool(fail=True)
+    db = database(pool)
+    with pytest.raises(RuntimeError):
+        db.save_objects([('box', {}, (0, 0, 0), False)] * 3)
+    assert [entry[0] for entry in pool.log] == ['executemany', 'rollback']
+    assert pool.returned == 1
+    # La connessione torna disponibile
+    assert db.available.acquire(blocking=False)
+
+
+def test_save_no_objects_does_not_connect():
+    pool = FakePool()
+    assert database(pool).save_objects([]) == 0
+    assert pool.connections == []
+
+
+def test_iter_objects_streams_in_batches():
+    rows = [{'AW': i} for i in range(1, 1201)]
+    pool = FakePool(rows)
+    db = database(pool)
+    assert [row['AW'] for row in db.iter_objects(fetch_size=500)] == list(range(1, 1201))
+    cursor = pool.connections[0].cursors[0]
+    assert cursor.options == {'dictionary': True, 'buffered': False}
+    assert [entry for entry in pool.log if entry[0] == 'fetchmany'] == [('fetchmany', 500)] * 4
+    assert cursor.closed and pool.returned == 1
+
+
+def test_iter_objects_interrupted_returns_connection():
+    pool = FakePool([{'AW': i} for i in range(1, 1001)])
+    db = database(pool, pool_size=1)
+    objects = db.iter_objects(fetch_size=100)
+    assert next(objects)['AW'] == 1
+    objects.close()
+    assert pool.connections[0].cursors[0].closed and pool.returned == 1
+    assert db.available.acquire(blocking=False)
+
+
+def test_connection_waits_for_a_free_slot():
+    db = database(FakePool(), pool_size=1, timeout=0.05)
+    with db.connection():
+        with pytest.raises(TimeoutError):
+            with db.connection():
+                pass
+    released = threading.Event()
+    acquired = []
+
+    def waiter():
+        db.timeout = 5
+        with db.connection():
+            acquired.append(released.is_set())
+
+    with db.connection():
+        thread = threading.Thread(target=waiter)
+        thread.start()
+        thread.join(0.1)
+        released.set()
+    thread.join(5)
+    assert acquired == [True]
+
+
+def test_memory_database_reads_dump():
+    db = MemoryDatabase.from_dump(SHAPES_DUMP)
+    box = db.load_shape_definition('box')
+    assert box['type'] == 'custom'
+    assert {'inner_width', 'wall_thickness'} <= set(box['parameters'])
+    assert db.load_shape_definition('missing') is None
+    # Ogni lettura restituisce una copia
+    box['type'] = 'modificata'
+    assert db.load_shape_definition('box')['type'] == 'custom'
+
+
+def test_memory_database_objects():
+    db = MemoryDatabase()
+    first = db.save_object('box', {'inner_width': 10}, (1, 2, 3), False, "prima")
+    assert db.save_objects([('box', {}, (4, 5, 6), True)] * 2) == 2
+    assert [row['AW'] for row in db.iter_objects()] == [first, 2, 3]
+    assert [row['AW'] for row in db.iter_objects(object_id=2)] == [2]
+    assert [row['AW'] for row in db.objects_by_id([3, 1, 9])] == [1, 3]
+    row = db.objects_by_id([first])[0]
+    assert json.loads(row['aw_parameters']) == {'inner_width': 10}
+    assert (row['aw_position_x'], row['aw_negative'], row['aw_description']) == (1, False, "prima")
@@ -0,0 +1,157 @@
+# Esecuzione dei comandi come job (jobs.py):
+#  - un job in esecuzione si ferma al primo check_cancelled() dopo cancel(), uno in coda
+#    non parte nemmeno; solo chi l'ha avviato puo' annullarlo;
+#  - i job dello stesso owner vengono eseguiti uno alla volta nell'ordine di arrivo, senza
+#    bloccare quelli degli altri owner;
+#  - un errore nel comando diventa la risposta del job e la coda prosegue;
+#  - shutdown() annulla i job in esecuzione e risolve quelli in coda.
+#
+# Uso: python -m pytest tests
+import os
+import sys
+import threading
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import pytest
+
+from jobs import JobRunner, check_cancelled, current_job, report
+
+TIMEOUT = 5
+
+
+@pytest.fixture
+def runner():
+    runner = JobRunner(workers=2)
+    yield runner
+    runner.shutdown()
+
+
+# Comando che segnala started e poi gira finche' non viene annullato (o release)
+def blocking(started, release=None):
+    def execute(command):
+        started.set()
+        while release is None or not release.is_set():
+            check_cancelled()
+            time.sleep(0.001)
+        return f"fatto: {command}"
+    return execute
+
+
+def test_cancel_running_job(runner):
+    started = threading.Event()
+    job = runner.submit("load objects", blocking(started))
+    assert started.wait(TIMEOUT)
+    assert job.status == "in esecuzione"
+    assert runner.cancel(job.id)
+    assert job.future.result(TIMEOUT) == f"Job {job.id} annullato"
+    assert job.status == "annullato"
+    assert runner.active() == []
+
+
+def test_cancel_queued_job_never_runs(runner):
+    started = threading.Event()
+    owner = object()
+    first = runner.submit("load objects", blocking(started), owner=owner)
+    ran = []
+    second = runner.submit("save stl", lambda command: ran.append(command), owner=owner)
+    assert started.wait(TIMEOUT)
+    assert second.status == "in coda"
+    assert runner.cancel(second.id, owner=owner)
+    runner.cancel(first.id)
+    assert second.future.result(TIMEOUT) == f"Job {second.id} annullato"
+    assert ran == []
+
+
+def test_cancel_needs_owner(runner):
+    started = threading.Event()
+    owner = object()
+    job = runner.submit("load objects", blocking(started), owner=owner)
+    assert started.wait(TIMEOUT)
+    assert not runner.cancel(job.id, owner=object())
+    assert not runner.cancel(12345)
+    assert not job.cancelled
+    assert runner.cancel(job.id, owner=owner)
+    job.future.result(TIMEOUT)
+
+
+def test_same_owner_jobs_run_in_order(runner):
+    owner = object()
+    running = []
+    order = []
+    overlap = []
+
+    def execute(command):
+        running.append(command)
+        overlap.append(len(running))
+        time.sleep(0.01)
+        order.append(command)
+        running.remove(command)
+        return command
+
+    jobs = [runner.submit(f"comando {i}", execute, owner=owner) for i in range(6)]
+    assert [job.future.result(TIMEOUT) for job in jobs] == [f"comando {i}" for i in range(6)]
+    assert order == [f"comando {i}" for i in range(6)]
+    assert max(overlap) == 1
+    assert runner.queues == {}
+
+
+def test_other_owners_are_not_blocked(runner):
+    started = threading.Event()
+    release = threading.Event()
+    slow_owner = object()
+    slow = runner.submit("load objects", blocking(started, release), owner=slow_owner)
+    # I job in coda dello stesso owner non occupano i thread del pool
+    queued = [runner.submit("draw a box", lambda command: command, owner=slow_owner) for _ in range(4)]
+    assert started.wait(TIMEOUT)
+    quick = runner.submit("stats", lambda command: "ok", owner=object())
+    assert quick.future.result(TIMEOUT) == "ok"
+    assert not slow.future.done() and not any(job.future.done() for job in queued)
+    release.set()
+    assert slow.future.result(TIMEOUT) == "fatto: load objects"
+    assert [job.future.result(TIMEOUT) for job in queued] == ["draw a box"] * 4
+
+
+def test_error_becomes_response(runner, capsys):
+    owner = object()
+
+    def fail(command):
+        raise ValueError("parametro mancante")
+
+    failed = runner.submit("draw a box", fail, owner=owner)
+    after = runner.submit("stats", lambda command: "ok", owner=owner)
+    assert failed.future.result(TIMEOUT) == "Errore: parametro mancante"
+    assert after.future.result(TIMEOUT) == "ok"
+    assert "parametro mancante" in capsys.readouterr().out
+
+
+def test_progress_is_throttled(runner):
+    messages = []
+
+    def execute(command):
+        assert current_job() is not None
+        for i in range(100):
+            report(f"passo {i}")
+        report("fine", force=True)
+
+    job = runner.submit("load objects", execute, on_progress=lambda job, message: messages.append(message))
+    job.future.result(TIMEOUT)
+    assert messages == ["passo 0", "fine"]
+    # Fuori dal pool report e check_cancelled non fanno nulla
+    assert current_job() is None
+    report("ignorato")
+    check_cancelled()
+
+
+def test_shutdown_cancels_running_and_queued():
+    runner = JobRunner(workers=1)
+    started = threading.Event()
+    owner = object()
+    running = runner.submit("load objects", blocking(started), owner=owner)
+    queued = runner.submit("save stl", lambda command: "eseguito", owner=owner)
+    assert started.wait(TIMEOUT)
+    runner.shutdown()
+    assert running.future.result(TIMEOUT) == f"Job {running.id} annullato"
+    assert queued.future.result(TIMEOUT) == f"Job {queued.id} annullato"
@@ -0,0 +1,123 @@
+# Metriche (metrics.py):
+#  - gli istogrammi contano ogni osservazione nel primo bucket che la contiene, e i
+#    quantili sono stimati dai limiti dei bucket;
+#  - il testo Prometheus ha bucket cumulativi, somma e conteggio coerenti, contatori e
+#    gauge; una gauge che fallisce non interrompe il dump;
+#  - timed_iter misura solo l'attesa degli elementi, anche se l'iterazione si interrompe;
+#  - profile_call salva il profilo e restituisce il risultato.
+#
+# Uso: python -m pytest tests
+import os
+import pstats
+import re
+import sys
+import time
+import urllib.request
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import pytest
+
+import metrics
+from metrics import Histogram, Metrics, profile_call, timed_iter
+
+
+def test_histogram_buckets_and_quantiles():
+    histogram = Histogram(buckets=(0.01, 0.1, 1))
+    for value in (0.005, 0.01, 0.05, 0.05, 0.5, 2.0):
+        histogram.observe(value)
+    assert histogram.counts == [2, 2, 1, 1]
+    assert (histogram.count, histogram.max) == (6, 2.0)
+    assert histogram.sum == pytest.approx(2.615)
+    assert histogram.quantile(0.3) == 0.01
+    assert histogram.quantile(0.5) == 0.1
+    assert histogram.quantile(1.0) == 2.0
+    assert Histogram().quantile(0.5) == 0.0
+
+
+def test_prometheus_text():
+    registry = Metrics()
+    for seconds in (0.002, 0.02, 0.2):
+        registry.observe('command', 'draw a box', seconds)
+    registry.observe('stage', 'csg', 0.004)
+    registry.count('triangles', 120)
+    registry.count('triangles', 30)
+    registry.gauge('sessions', lambda: 3)
+    registry.gauge('broken', lambda: 1 / 0)
+    text = registry.prometheus()
+    lines = text.splitlines()
+    assert "# TYPE text2cad_command_seconds histogram" in lines
+    buckets = [int(line.rsplit(' ', 1)[1]) for line in lines
+               if line.startswith('text2cad_command_seconds_bucket{command="draw a box"')]
+    assert buckets == sorted(buckets) and buckets[-1] == 3
+    assert 'text2cad_command_seconds_bucket{command="draw a box",le="+Inf"} 3' in lines
+    assert 'text2cad_command_seconds_count{command="draw a box"} 3' in lines
+    assert 'text2cad_stage_seconds_count{stage="csg"} 1' in lines
+    assert "text2cad_triangles_total 150" in lines
+    assert "text2cad_sessions 3" in lines
+    assert not any('broken' in line for line in lines)
+    # Ogni riga di valore e' "nome{etichette} numero"
+    for line in lines:
+        if not line.startswith('#'):
+            assert re.fullmatch(r'[a-z0-9_]+(\{[^}]*\})? [0-9.e+-]+', line), line
+
+
+def test_summary():
+    registry = Metrics()
+    registry.observe('command', 'stats', 0.003)
+    registry.count('voxels', 42)
+    summary = registry.summary()
+    assert "command[stats]: 1 in 0.003s" in summary
+    assert "voxels: 42" in summary
+
+
+def test_write_prometheus(tmp_path):
+    registry = Metrics()
+    registry.count('exports')
+    filename = str(tmp_path / "metrics.prom")
+    registry.write_prometheus(filename)
+    with open(filename, encoding='utf-8') as f:
+        assert "text2cad_exports_total 1" in f.read()
+    assert os.listdir(tmp_path) == ["metrics.prom"]
+
+
+def test_serve():
+    registry = Metrics()
+    registry.count('requests', 5)
+    server = registry.serve(0)
+    try:
+        with urllib.request.urlopen(f"http://localhost:{server.server_address[1]}/metrics", timeout=5) as response:
+            assert "text2cad_requests_total 5" in response.read().decode('utf-8')
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+def test_timed_iter_measures_waiting_only(monkeypatch):
+    registry = Metrics()
+    monkeypatch.setattr(metrics, 'METRICS', registry)
+
+    def rows():
+        for i in range(3):
+            time.sleep(0.02)
+            yield i
+
+    for _ in timed_iter('db', rows()):
+        time.sleep(0.05)
+    histogram = registry.histograms[('stage', 'db')]
+    assert histogram.count == 1
+    assert 0.05 <= histogram.sum < 0.15
+    # Interrotta a meta' registra comunque il tempo
+    iterator = timed_iter('db', rows())
+    next(iterator)
+    iterator.close()
+    assert registry.histograms[('stage', 'db')].count == 2
+
+
+def test_profile_call(tmp_path):
+    filename = str(tmp_path / "comando.prof")
+    result, report = profile_call(lambda: sum(range(1000)), filename)
+    assert result == 499500
+    assert "cumulative" in report
+    assert pstats.Stats(filename).total_calls > 0
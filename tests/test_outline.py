@@ -0,0 +1,119 @@
+# Contorni vettoriali (outline.py) confrontati con i cicli Python che sostituiscono
+# (get_cube_contour, l'ipotenusa e il quadrato ruotato di draw_pythagorean_theorem):
+#  - box_edges da' gli stessi voxel del triplo ciclo sul volume racchiuso;
+#  - line da' gli stessi voxel del ciclo dell'ipotenusa, e senza buchi;
+#  - il quadrato ruotato e' chiuso e passa per i vertici ruotati, e non ruotato coincide
+#    con il vecchio contorno;
+#  - difference equivale alla differenza tra insiemi.
+#
+# Uso: python -m pytest tests
+import os
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import numpy as np
+import pytest
+
+from outline import box_edges, difference, line, polygon, rotated_square
+
+
+# Versione originale (pita2.py): tutti i voxel del box con due coordinate sul bordo
+def loop_cube_contour(center, length, width, height):
+    contour_coords = []
+    x_min, x_max = int(center[0] - length//2), int(center[0] + length//2)
+    y_min, y_max = int(center[1] - width//2), int(center[1] + width//2)
+    z_min, z_max = int(center[2] - height//2), int(center[2] + height//2)
+    for x in range(x_min, x_max + 1):
+        for y in range(y_min, y_max + 1):
+            for z in range(z_min, z_max + 1):
+                if (x in (x_min, x_max) and y in (y_min, y_max)) or \
+                   (x in (x_min, x_max) and z in (z_min, z_max)) or \
+                   (y in (y_min, y_max) and z in (z_min, z_max)):
+                    contour_coords.append([x, y, z])
+    return contour_coords
+
+
+# Versione originale del quadrato ruotato: ogni punto del contorno locale ruotato
+def loop_rotated_square_contour(center, size, angle):
+    contour_coords = []
+    half_size = size // 2
+    for x in range(-half_size, half_size + 1):
+        for y in range(-half_size, half_size + 1):
+            if x in (-half_size, half_size) or y in (-half_size, half_size):
+                x_rot = x * np.cos(angle) - y * np.sin(angle)
+                y_rot = x * np.sin(angle) + y * np.cos(angle)
+                contour_coords.append([int(x_rot + center[0]), int(y_rot + center[1]), 0])
+    return contour_coords
+
+
+def as_set(coords):
+    return {tuple(int(v) for v in c) for c in coords}
+
+
+@pytest.mark.parametrize('center, length, width, height', [
+    ((170, 130, 0), 40, 40, 1),      # quadrati della figura di Pitagora
+    ((125, 175, 0), 50, 50, 1),
+    ((60.5, 40.5, 30), 21, 16, 9),
+    ((10, 20, 30), 7, 1, 4),
+    ((100, 100, 100), 1, 1, 1),
+])
+def test_box_edges_match_loop(center, length, width, height):
+    expected = as_set(loop_cube_contour(center, length, width, height))
+    edges = box_edges(center, length, width, height)
+    assert len(edges) == len(expected)
+    assert as_set(edges) == expected
+
+
+@pytest.mark.parametrize('a, b', [(40, 50), (50, 40), (13, 7), (1, 30)])
+def test_line_matches_hypotenuse_loop(a, b):
+    A = (150, 150, 0)
+    B = (A[0] + a, A[1], 0)
+    steps = max(a, b)
+    expected = [(int(B[0] - (a * i / steps)), int(A[1] + (b * i / steps)), 0) for i in range(steps + 1)]
+    coords = line(B, (A[0], A[1] + b, 0))
+    assert [tuple(c) for c in coords.tolist()] == expected
+
+
+@pytest.mark.parametrize('start, end', [((0, 0, 0), (17, -5, 9)), ((3.5, 2.25, 1), (-8, 11.75, 1)),
+                                        ((4, 4, 4), (4, 4, 4))])
+def test_line_is_connected(start, end):
+    coords = line(start, end)
+    assert tuple(coords[0]) == tuple(int(v) for v in start)
+    assert tuple(coords[-1]) == tuple(int(v) for v in end)
+    assert np.abs(np.diff(coords, axis=0)).max(initial=0) <= 1
+
+
+def test_axis_aligned_square_matches_loop():
+    center = (200, 120, 0)
+    expected = as_set(loop_rotated_square_contour(center, 64, 0.0))
+    assert as_set(polygon(rotated_square(center, 64, 0.0))) == expected
+
+
+@pytest.mark.parametrize('angle', [np.arctan2(50, -40), 0.3, -1.1])
+def test_rotated_square_is_closed(angle):
+    center = (200.5, 120.25, 0)
+    corners = rotated_square(center, 64, angle)
+    coords = polygon(corners)
+    assert as_set(np.concatenate([line(c, c) for c in corners])) <= as_set(coords)
+    # Ogni voxel del contorno ha almeno due vicini (a distanza di scacchiera 1)
+    keys = as_set(coords)
+    for x, y, z in keys:
+        neighbors = sum((x + dx, y + dy, z) in keys for dx in (-1, 0, 1) for dy in (-1, 0, 1) if dx or dy)
+        assert neighbors >= 2
+    # I punti del vecchio contorno stanno a meno di un voxel dal nuovo
+    old = np.array(loop_rotated_square_contour(center, 64, angle))
+    distances = np.abs(old[:, None, :2] - coords[None, :, :2]).max(axis=2).min(axis=1)
+    assert distances.max() <= 1
+
+
+def test_difference_matches_sets():
+    rng = np.random.default_rng(7)
+    coords = rng.integers(-20, 20, size=(500, 3))
+    other = np.concatenate([coords[::3], rng.integers(-30, 30, size=(200, 3))])
+    result = difference(coords, other)
+    assert len(result) == sum(tuple(c) not in as_set(other) for c in coords.tolist())
+    assert as_set(result) == as_set(coords) - as_set(other)
+    assert len(difference(coords, np.empty((0, 3)))) == len(coords)
+    assert len(difference(np.empty((0, 3)), coords)) == 0
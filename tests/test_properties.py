@@ -0,0 +1,186 @@
+# Proprieta' dei percorsi critici su scene casuali (cubi, cilindri e voxel sparsi, positivi
+# e negativi, colorati, anche oltre i bordi dello spazio):
+#  - undo/redo riportano il volume esattamente a ogni stato intermedio;
+#  - uno snapshot salvato e ricaricato (anche in un volume mappato o denso) e' identico;
+#  - valutazione diretta, octree, parallela, su volume mappato e su volume denso danno gli
+#    stessi voxel con gli stessi colori;
+#  - le mesh STL (greedy e a fette in streaming) sono chiuse e racchiudono i voxel pieni.
+#
+# Uso: python -m pytest tests
+import os
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import numpy as np
+import pytest
+
+from csg import CSGScene
+from export import export_stl_streaming
+from journal import Journal
+from mesher import greedy_mesh
+from raster import RASTERIZERS
+from rebuild import shutdown_pool
+from snapshot import SNAPSHOT_EXTENSION, load_snapshot, save_snapshot
+from stl import write_stl
+from volume import BrickVolume, MappedBrickVolume, VoxelVolume
+
+# Lato dello spazio delle scene di prova (tre brick per asse)
+SIZE = 96
+SEEDS = [1, 2, 3, 4]
+COLORS = [None, (1.0, 0.0, 0.0, 1.0), (0.0, 0.0, 1.0, 1.0), (0.0, 1.0, 0.0, 1.0)]
+
+# Record di un triangolo dell'STL binario
+STL_TRIANGLE = np.dtype([('normal', '<f4', 3), ('vertices', '<f4', (3, 3)), ('attribute', '<u2')])
+
+
+# Il pool condiviso dei processi va chiuso a fine modulo
+@pytest.fixture(scope='module', autouse=True)
+def worker_pool():
+    yield
+    shutdown_pool()
+
+
+# Operazioni (tipo, parametri, negativa, colore, gruppo) di una scena casuale; ogni tre
+# operazioni formano un oggetto, come le primitive di "load objects"
+def random_operations(seed, count=12):
+    rng = np.random.default_rng(seed)
+    operations = []
+    for i in range(count):
+        kind = str(rng.choice(['cube', 'cylinder', 'voxels']))
+        center = tuple(float(c) for c in rng.uniform(-8, SIZE + 8, 3))
+        if kind == 'cube':
+            length, width, height = (float(d) for d in rng.uniform(1, 48, 3))
+            params = dict(center=center, length=length, width=width, height=height)
+        elif kind == 'cylinder':
+            params = dict(center=center, radius=float(rng.uniform(1, 24)), height=float(rng.uniform(1, 60)))
+        else:
+            params = dict(coords=rng.integers(-4, SIZE + 4, size=(int(rng.integers(1, 300)), 3)))
+        negative = bool(rng.random() < 0.3)
+        color = COLORS[int(rng.integers(len(COLORS)))]
+        operations.append((kind, params, negative, color, f"oggetto {i // 3}"))
+    return operations
+
+
+# Con octree_threshold l'octree viene usato qualunque sia la dimensione delle primitive
+def build(volume, operations, octree_threshold=None, workers=1):
+    scene = CSGScene(volume, RASTERIZERS, octree_threshold=octree_threshold, workers=workers, octree_min_voxels=0)
+    for kind, params, negative, color, group in operations:
+        scene.group = group
+        scene.add(kind, params, negative, color)
+    scene.group = None
+    scene.evaluate()
+    return scene
+
+
+# Voxel pieni e colori RGBA in ordine di coordinate: confrontabili tra volumi con palette
+# e disposizioni in memoria diverse
+def voxels(volume):
+    coords = volume.coords().astype(np.int64)
+    rgba = volume.rgba()
+    order = np.lexsort(coords.T[::-1])
+    return coords[order], rgba[order]
+
+
+def assert_same_voxels(volume, expected):
+    coords, rgba = voxels(volume)
+    np.testing.assert_array_equal(coords, expected[0])
+    np.testing.assert_array_equal(rgba, expected[1])
+
+
+def read_stl(filename):
+    with open(filename, 'rb') as f:
+        f.seek(80)
+        count = int(np.fromfile(f, dtype='<u4', count=1)[0])
+        triangles = np.fromfile(f, dtype=STL_TRIANGLE, count=count)
+    assert len(triangles) == count
+    return triangles['vertices'].astype(np.float64)
+
+
+# Mesh chiusa e orientata: ogni lato percorso in un verso da un triangolo e' percorso nel
+# verso opposto da un altro (anche sui lati non manifold tra voxel che si toccano per uno
+# spigolo), e il volume con segno e' quello dei voxel pieni
+def assert_closed(triangles, voxel_count):
+    points, ids = np.unique(triangles.reshape(-1, 3), axis=0, return_inverse=True)
+    faces = ids.reshape(-1, 3)
+    a = faces.ravel()
+    b = np.roll(faces, -1, axis=1).ravel()
+    n = len(points)
+    np.testing.assert_array_equal(np.sort(a * n + b), np.sort(b * n + a))
+    signed = np.einsum('ij,ij->i', triangles[:, 0], np.cross(triangles[:, 1], triangles[:, 2])).sum() / 6
+    assert signed == pytest.approx(voxel_count)
+
+
+@pytest.mark.parametrize('seed', SEEDS)
+def test_evaluation_paths_agree(seed, tmp_path):
+    operations = random_operations(seed)
+    expected = voxels(build(VoxelVolume(SIZE, with_colors=True), operations).volume)
+    assert len(expected[0]) > 0
+    paths = dict(
+        apply=build(BrickVolume(SIZE, with_colors=True), operations),
+        octree=build(BrickVolume(SIZE, with_colors=True), operations, octree_threshold=1),
+        parallel=build(BrickVolume(SIZE, with_colors=True), operations, workers=2),
+        mapped=build(MappedBrickVolume(SIZE, with_colors=True, directory=str(tmp_path)), operations),
+        mapped_octree=build(MappedBrickVolume(SIZE, with_colors=True, directory=str(tmp_path)), operations,
+                            octree_threshold=1),
+    )
+    for name, scene in paths.items():
+        assert scene.volume.count() == len(expected[0]), name
+        assert_same_voxels(scene.volume, expected)
+
+
+@pytest.mark.parametrize('seed', SEEDS)
+def test_undo_redo_round_trip(seed):
+    volume = BrickVolume(SIZE, with_colors=True)
+    scene = CSGScene(volume, RASTERIZERS)
+    journal = Journal(volume, scene, depth=100, max_bytes=256 * 1024 * 1024)
+    states = [voxels(volume)]
+    for i, (kind, params, negative, color, _) in enumerate(random_operations(seed)):
+        with journal.edit(f"operazione {i}"):
+            scene.add(kind, params, negative, color)
+        states.append(voxels(volume))
+    for i in reversed(range(len(states) - 1)):
+        assert journal.undo() == f"operazione {i}"
+        assert_same_voxels(volume, states[i])
+    assert journal.undo() is None
+    for i in range(1, len(states)):
+        assert journal.redo() == f"operazione {i - 1}"
+        assert_same_voxels(volume, states[i])
+    assert journal.redo() is None
+
+
+@pytest.mark.parametrize('seed', SEEDS)
+def test_snapshot_round_trip(seed, tmp_path):
+    volume = build(BrickVolume(SIZE, with_colors=True), random_operations(seed)).volume
+    expected = voxels(volume)
+    path = str(tmp_path / f"scena{SNAPSHOT_EXTENSION}")
+    save_snapshot(volume, path, source=None, meta=dict(seed=seed))
+    targets = [BrickVolume(SIZE, with_colors=True),
+               MappedBrickVolume(SIZE, with_colors=True, directory=str(tmp_path)),
+               VoxelVolume(SIZE, with_colors=True)]
+    for target in targets:
+        load_snapshot(path, target)
+        assert target.count() == volume.count()
+        assert_same_voxels(target, expected)
+
+
+@pytest.mark.parametrize('seed', SEEDS)
+def test_greedy_mesh_is_closed(seed, tmp_path):
+    volume = build(BrickVolume(SIZE), random_operations(seed)).volume
+    lo, hi = volume.bounds()
+    vertices, faces = greedy_mesh(volume.extract(lo, hi), origin=lo)
+    filename = str(tmp_path / "greedy.stl")
+    write_stl(filename, vertices, faces)
+    assert_closed(read_stl(filename), volume.count())
+
+
+@pytest.mark.parametrize('seed', SEEDS)
+@pytest.mark.parametrize('workers', [1, 2])
+def test_streaming_stl_is_closed(seed, workers, tmp_path):
+    volume = build(BrickVolume(SIZE), random_operations(seed)).volume
+    filename = str(tmp_path / "streaming.stl")
+    triangles = export_stl_streaming(volume, filename, slab=16, workers=workers)
+    stl = read_stl(filename)
+    assert len(stl) == triangles
+    assert_closed(stl, volume.count())
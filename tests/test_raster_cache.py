@@ -0,0 +1,141 @@
+# Cache delle forme rasterizzate (raster_cache.py):
+#  - una forma rasterizzata nel riferimento locale e stampata per traslazione scrive gli
+#    stessi voxel delle operazioni originali nella posizione finale;
+#  - in memoria resta entro il budget eliminando le forme usate meno di recente;
+#  - il livello su disco sopravvive a una nuova cache e resta entro il suo budget.
+#
+# Uso: python -m pytest tests
+import os
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import numpy as np
+import pytest
+
+from csg import CSGScene
+from raster import RASTERIZERS, Stamp
+from raster_cache import CachedRaster, RasterCache
+from volume import BrickVolume
+
+SIZE = 96
+RED = (1.0, 0.0, 0.0, 1.0)
+
+
+# Scatola con una cavita' cilindrica, un coperchio colorato e un foro: come le operazioni
+# di una forma di aige_shapes, con centro center
+def box_operations(center):
+    x, y, z = center
+    return [
+        ('cube', dict(center=(x, y, z), length=20, width=16, height=12), False, None),
+        ('cylinder', dict(center=(x, y, z - 3), radius=5.5, height=10), True, None),
+        ('cube', dict(center=(x, y, z + 7.5), length=20, width=16, height=3), False, RED),
+        ('cylinder', dict(center=(x + 6, y, z + 6), radius=1.5, height=6), True, None),
+    ]
+
+
+def rasterize(operations):
+    return [(RASTERIZERS[kind](**params), negative, color) for kind, params, negative, color in operations]
+
+
+def voxels(volume):
+    coords = volume.coords()
+    order = np.lexsort(coords.T[::-1])
+    return coords[order], volume.rgba()[order]
+
+
+def entry(side):
+    return CachedRaster((0, 0, 0), (side, side, side), None, [(None, np.ones((side, side, side), dtype=bool))])
+
+
+@pytest.mark.parametrize('center', [(30, 40, 50), (30.5, 40.25, 50), (-3.5, 90.5, 44)])
+def test_translated_stamps_match_direct_rasterization(center):
+    origin = tuple(int(np.floor(c)) for c in center)
+    local = tuple(c - o for c, o in zip(center, origin))
+    cached = CachedRaster.from_operations(rasterize(box_operations(local)))
+
+    expected = CSGScene(BrickVolume(SIZE, with_colors=True), RASTERIZERS)
+    for kind, params, negative, color in box_operations(center):
+        expected.add(kind, params, negative, color)
+    expected.evaluate()
+    stamped = CSGScene(BrickVolume(SIZE, with_colors=True), RASTERIZERS)
+    for stamp, negative, color in cached.stamps(origin):
+        stamped.add('stamp', dict(stamp=stamp), negative, color)
+    stamped.evaluate()
+
+    assert expected.volume.count() > 0
+    for a, b in zip(voxels(expected.volume), voxels(stamped.volume)):
+        np.testing.assert_array_equal(a, b)
+
+
+def test_memory_lru_budget():
+    cache = RasterCache(max_bytes=3 * 1000)
+    for key in 'abc':
+        cache.put(key, entry(10))
+    assert cache.get('a') is not None  # 'a' diventa la piu' recente
+    cache.put('d', entry(10))
+    assert list(cache.entries) == ['c', 'a', 'd']
+    assert cache.get('b') is None
+    assert cache.nbytes == 3000 <= cache.max_bytes
+    # Una forma piu' grande dell'intero budget non viene tenuta in memoria
+    cache.put('big', entry(20))
+    assert cache.get('big') is None
+    assert list(cache.entries) == ['c', 'a', 'd']
+
+
+def test_get_or_build_builds_once():
+    cache = RasterCache()
+    built = []
+
+    def build():
+        built.append(1)
+        return rasterize(box_operations((0, 0, 0)))
+
+    first = cache.get_or_build('box', build)
+    assert cache.get_or_build('box', build) is first
+    assert (len(built), cache.misses, cache.hits) == (1, 1, 1)
+
+
+def test_disk_tier_survives_restart(tmp_path):
+    cached = CachedRaster.from_operations(rasterize(box_operations((0.5, 0, 0.25))))
+    assert cached.erased is not None and len(cached.layers) == 2
+    RasterCache(directory=str(tmp_path)).put('box', cached)
+    cache = RasterCache(directory=str(tmp_path))
+    loaded = cache.get('box')
+    assert cache.disk_hits == 1
+    assert (loaded.lo, loaded.hi) == (cached.lo, cached.hi)
+    np.testing.assert_array_equal(loaded.erased, cached.erased)
+    for (color, mask), (expected_color, expected_mask) in zip(loaded.layers, cached.layers):
+        assert color == expected_color
+        np.testing.assert_array_equal(mask, expected_mask)
+    # Dal disco passa in memoria
+    assert cache.get('box') is loaded and cache.hits == 1
+
+
+def test_disk_budget_drops_least_recently_used(tmp_path):
+    directory = str(tmp_path)
+    cache = RasterCache(max_bytes=0, directory=directory)
+    cache.put('a', entry(16))
+    size = os.path.getsize(os.path.join(directory, 'a.npz'))
+    cache = RasterCache(max_bytes=0, directory=directory, max_disk_bytes=int(3.5 * size))
+    for key in 'bc':
+        cache.put(key, entry(16))
+    assert cache.disk_bytes == 3 * size
+    # Ordine LRU del disco: la data di modifica, aggiornata a ogni lettura
+    for age, key in enumerate('bac'):
+        os.utime(os.path.join(directory, f'{key}.npz'), (1000 + age, 1000 + age))
+    assert cache.get('b') is not None  # 'b' torna la piu' recente
+    cache.put('d', entry(16))
+    assert sorted(os.listdir(directory)) == ['b.npz', 'c.npz', 'd.npz']
+    assert cache.disk_bytes == 3 * size <= cache.max_disk_bytes
+    assert cache.get('a') is None
+
+
+def test_stamps_keep_sign_and_color():
+    cached = CachedRaster.from_operations(rasterize(box_operations((0, 0, 0))))
+    stamps = list(cached.stamps((10, 20, 30)))
+    assert [(negative, color) for _, negative, color in stamps] == [(True, None), (False, None), (False, RED)]
+    for stamp, _, _ in stamps:
+        assert isinstance(stamp, Stamp)
+        assert tuple(np.subtract(stamp.lo, cached.lo)) == (10, 20, 30)
@@ -0,0 +1,103 @@
+# Preparazione del rendering incrementale (render.py), senza finestra:
+#  - i blocchi contengono solo i voxel di superficie (almeno un vicino vuoto, anche oltre
+#    il bordo del blocco), con i loro colori;
+#  - dopo una modifica si ricalcolano solo i blocchi toccati e i loro vicini, e aggiornare
+#    i blocchi precedenti con questi da' la stessa superficie del ricalcolo completo;
+#  - dopo clear() si riparte da tutti i blocchi occupati.
+#
+# Uso: python -m pytest tests
+import os
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import numpy as np
+import pytest
+
+from render import collect_shells
+from volume import BrickVolume, VoxelVolume
+
+SIZE = 96
+RED = (1.0, 0.0, 0.0, 1.0)
+BLUE = (0.0, 0.0, 1.0, 1.0)
+VOLUMES = dict(brick=BrickVolume, dense=VoxelVolume)
+
+
+# Box su piu' blocchi e contro il bordo dello spazio, con una cavita' e due colori
+def fill_scene(volume):
+    volume.fill((10, 20, 30), (70, 60, 50), color=RED)
+    volume.fill((30, 30, 35), (50, 50, 45), value=0)
+    volume.fill((80, 0, 0), (96, 16, 40), color=BLUE)
+
+
+# Superficie attesa calcolata sull'intero volume denso: (coordinate, colori) ordinati
+def expected_shell(volume):
+    occupancy = np.zeros((SIZE + 2,) * 3, dtype=bool)
+    coords = volume.coords().astype(np.int64)
+    occupancy[tuple((coords + 1).T)] = True
+    core = occupancy[1:-1, 1:-1, 1:-1]
+    inner = (occupancy[:-2, 1:-1, 1:-1] & occupancy[2:, 1:-1, 1:-1] & occupancy[1:-1, :-2, 1:-1] &
+             occupancy[1:-1, 2:, 1:-1] & occupancy[1:-1, 1:-1, :-2] & occupancy[1:-1, 1:-1, 2:])
+    shell = core[tuple(coords.T)] & ~inner[tuple(coords.T)]
+    return ordered(coords[shell], volume.rgba()[shell])
+
+
+def ordered(coords, rgba):
+    coords = np.asarray(coords, dtype=np.int64).reshape(-1, 3)
+    order = np.lexsort(coords.T[::-1])
+    return coords[order], np.asarray(rgba, dtype=np.float32).reshape(-1, 4)[order]
+
+
+def merged(shells):
+    parts = [shell for shell in shells.values() if len(shell[0])]
+    return ordered(np.concatenate([c for c, _ in parts]), np.concatenate([r for _, r in parts]))
+
+
+def assert_same(actual, expected):
+    np.testing.assert_array_equal(actual[0], expected[0])
+    np.testing.assert_array_equal(actual[1], expected[1])
+
+
+@pytest.mark.parametrize('kind', VOLUMES)
+def test_shells_are_surface_voxels(kind):
+    volume = VOLUMES[kind](SIZE, with_colors=True)
+    fill_scene(volume)
+    reset, shells = collect_shells(volume)
+    assert reset
+    assert set(shells) == volume.occupied_blocks()
+    expected = expected_shell(volume)
+    assert len(expected[0]) < volume.count()
+    assert_same(merged(shells), expected)
+
+
+@pytest.mark.parametrize('kind', VOLUMES)
+def test_incremental_update_matches_full_rebuild(kind):
+    volume = VOLUMES[kind](SIZE, with_colors=True)
+    fill_scene(volume)
+    reset, shells = collect_shells(volume)
+    generation = volume.generation
+    volume.fill((40, 40, 48), (44, 44, 52), value=0)
+    volume.set_coords([[5, 5, 5], [95, 95, 95]], color=BLUE)
+    reset, changed = collect_shells(volume, generation)
+    assert not reset
+    # Solo i blocchi della modifica e i loro vicini, non tutti quelli occupati
+    assert 0 < len(changed) < len(volume.occupied_blocks())
+    assert {(1, 1, 1), (0, 0, 0), (2, 2, 2)} <= set(changed)
+    shells.update(changed)
+    assert_same(merged(shells), expected_shell(volume))
+    # Senza modifiche non c'e' nulla da ricalcolare
+    assert collect_shells(volume, generation) == (False, {})
+
+
+@pytest.mark.parametrize('kind', VOLUMES)
+def test_clear_resets_all_blocks(kind):
+    volume = VOLUMES[kind](SIZE, with_colors=True)
+    fill_scene(volume)
+    collect_shells(volume)
+    generation = volume.generation
+    volume.clear()
+    volume.fill((0, 0, 0), (8, 8, 8), color=RED)
+    reset, shells = collect_shells(volume, generation)
+    assert reset and set(shells) == {(0, 0, 0)}
+    assert_same(merged(shells), expected_shell(volume))
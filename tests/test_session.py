@@ -0,0 +1,146 @@
+# Sessioni (session.py):
+#  - ogni connessione senza nome ha una sessione anonima propria, eliminata alla chiusura;
+#    le sessioni con nome sono condivise e i nomi anonimi sono riservati;
+#  - oltre max_sessions si elimina la sessione libera usata meno di recente, e se sono
+#    tutte occupate l'apertura fallisce;
+#  - le sessioni con nome inattive da idle_timeout secondi vengono eliminate, quelle con
+#    connessioni o comandi in corso no;
+#  - i limiti di memoria e di disco di una sessione.
+#
+# Uso: python -m pytest tests
+import os
+import sys
+import threading
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import pytest
+
+from csg import CSGScene
+from raster import RASTERIZERS
+from session import (ANONYMOUS_PREFIX, Session, SessionLimitError, SessionManager, SessionNameError, activate,
+                     current_session)
+from volume import BrickVolume, MappedBrickVolume
+
+SIZE = 64
+
+
+def create_session(name):
+    volume = BrickVolume(SIZE)
+    return Session(name, volume, CSGScene(volume, RASTERIZERS))
+
+
+def manager(**options):
+    return SessionManager(create_session, **options)
+
+
+def test_anonymous_and_named_sessions():
+    sessions = manager()
+    first, second = sessions.open(), sessions.open()
+    assert first is not second
+    assert first.anonymous and first.name.startswith(ANONYMOUS_PREFIX)
+    assert first.volume is not second.volume and first.export_filename != second.export_filename
+    shared = sessions.open("progetto")
+    assert sessions.open("progetto") is shared and shared.connections == 2
+    with pytest.raises(SessionNameError):
+        sessions.open(first.name)
+    sessions.release(first)
+    assert first.name not in sessions.sessions
+    # Una sessione con nome resta aperta anche senza connessioni
+    sessions.release(shared)
+    sessions.release(shared)
+    assert sessions.sessions["progetto"] is shared
+
+
+def test_session_limit_evicts_least_recently_used():
+    sessions = manager(max_sessions=2)
+    old, recent = sessions.open("vecchia"), sessions.open("recente")
+    sessions.release(old)
+    sessions.release(recent)
+    old.last_used -= 10
+    sessions.open("nuova")
+    assert set(sessions.sessions) == {"recente", "nuova"}
+
+
+def test_session_limit_with_busy_sessions():
+    sessions = manager(max_sessions=2)
+    busy, running = sessions.open("connessa"), sessions.open("al lavoro")
+    sessions.release(running)
+    with activate(running):
+        with pytest.raises(SessionLimitError):
+            sessions.open("terza")
+    assert set(sessions.sessions) == {"connessa", "al lavoro"}
+    sessions.open("terza")
+    assert set(sessions.sessions) == {"connessa", "terza"}
+    assert busy.busy
+
+
+def test_idle_eviction():
+    sessions = manager(idle_timeout=60)
+    idle, connected, running, fresh = (sessions.open(name) for name in ("inattiva", "connessa", "al lavoro", "nuova"))
+    for session in (idle, running, fresh):
+        sessions.release(session)
+    for session in (idle, connected, running):
+        session.last_used = time.time() - 120
+    started = threading.Event()
+    release = threading.Event()
+
+    def command():
+        with activate(running):
+            started.set()
+            release.wait(5)
+
+    thread = threading.Thread(target=command)
+    thread.start()
+    assert started.wait(5)
+    running.last_used = time.time() - 120
+    assert sessions.evict_idle() == ["inattiva"]
+    release.set()
+    thread.join(5)
+    # Finito il comando la sessione torna usata di recente
+    assert not running.busy and time.time() - running.last_used < 60
+    assert sessions.evict_idle() == []
+    assert set(sessions.sessions) == {"connessa", "al lavoro", "nuova"}
+
+
+def test_activate_sets_current_session():
+    sessions = manager()
+    outer, inner = sessions.open("a"), sessions.open("b")
+    with pytest.raises(RuntimeError):
+        current_session()
+    with activate(outer):
+        with activate(inner):
+            assert current_session() is inner and inner.running == 1
+        assert current_session() is outer and inner.running == 0
+    with pytest.raises(RuntimeError):
+        current_session()
+
+
+# Brick parziali in tutti gli 8 brick del volume: 8 * 32^3 byte di occupazione
+def fill_partial(volume):
+    volume.set_coords([[x, y, z] for x in range(0, SIZE, 3) for y in range(0, SIZE, 3) for z in (5, 40)])
+
+
+def test_memory_limit():
+    sessions = manager(max_bytes=128 * 1024)
+    session = sessions.open("grande")
+    assert not sessions.over_limit(session)
+    fill_partial(session.volume)
+    assert session.nbytes == 8 * 32 ** 3
+    assert sessions.over_limit(session)
+
+
+def test_disk_limit(tmp_path):
+    def create_mapped(name):
+        volume = MappedBrickVolume(SIZE, directory=str(tmp_path))
+        return Session(name, volume, CSGScene(volume, RASTERIZERS))
+
+    sessions = SessionManager(create_mapped, max_bytes=1024 ** 3, max_disk_bytes=1024 * 1024)
+    session = sessions.open("mappata")
+    assert not sessions.over_limit(session)
+    fill_partial(session.volume)
+    assert session.disk_bytes > sessions.max_disk_bytes
+    assert session.nbytes < sessions.max_bytes
+    assert sessions.over_limit(session)
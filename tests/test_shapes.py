@@ -0,0 +1,141 @@
+# Definizioni delle forme compilate (shapes.py):
+#  - le espressioni ammettono solo aritmetica sui parametri dichiarati;
+#  - la cache legge ogni forma dal database una sola volta, finche' non viene invalidata;
+#  - una lettura superata da un invalidate() non finisce in cache.
+#
+# Uso: python -m pytest tests
+import os
+import sys
+import threading
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import pytest
+
+from shapes import CompiledShape, Expression, ShapeCache
+
+BOX = {
+    'type': 'custom',
+    'parameters': {'inner_width': 10, 'wall_thickness': 2},
+    'operations': [
+        {'type': 'cube', 'center': [0, 0, 0], 'length': 'inner_width + 2 * wall_thickness',
+         'width': 'inner_width', 'height': '(inner_width - 1) // 3 % 2'},
+        {'type': 'cube', 'negative': True, 'length': 'inner_width / 2', 'width': '-wall_thickness',
+         'height': '+1.5'},
+    ],
+}
+
+
+def test_expression_arithmetic():
+    names = {'a': 1, 'b': 2}
+    assert Expression("a + 2 * b", names)({'a': 3, 'b': 4}) == 11
+    assert Expression("(a - 1) // 3 % 2", names)({'a': 10}) == 1
+    assert Expression("-a / b", names)({'a': 3, 'b': 2}) == -1.5
+    assert Expression(12, names)({}) == 12
+
+
+@pytest.mark.parametrize('source', [
+    "a ** 2",                          # potenza: numeri enormi con esponenti annidati
+    "__import__('os')",                # chiamate
+    "a.real",                          # attributi
+    "[a][0]",                          # liste e indici
+    "a if a else 1",                   # espressioni condizionali
+    "a < 1",                           # confronti
+    "lambda: 1",
+    "'testo'",                         # costanti non numeriche
+    "True",
+    "c + 1",                           # parametro non dichiarato
+    "(x := 1)",
+])
+def test_expression_rejects_disallowed_nodes(source):
+    with pytest.raises(ValueError):
+        Expression(source, {'a': 1})
+
+
+def test_expression_has_no_builtins():
+    with pytest.raises(ValueError):
+        Expression("len", {'a': 1})
+    # Anche un parametro chiamato come un builtin resta solo un parametro
+    assert Expression("abs + 1", {'abs': 0})({'abs': 2}) == 3
+
+
+def test_compiled_shape_evaluates_operations():
+    shape = CompiledShape('box', BOX)
+    values = [op.evaluate(shape.parameters) for op in shape.operations]
+    assert values[0] == {'length': 14, 'width': 10, 'height': 1}
+    assert values[1] == {'length': 5.0, 'width': -2, 'height': 1.5}
+    assert shape.operations[0].center == [0, 0, 0]
+    assert shape.operations[1].negative is True
+
+
+def test_invalid_definition_fails_at_compile_time():
+    definition = dict(BOX, operations=[{'type': 'cube', 'length': 'inner_width ** 9'}])
+    with pytest.raises(ValueError):
+        CompiledShape('box', definition)
+
+
+def test_cache_queries_each_shape_once():
+    queries = []
+
+    def loader(name):
+        queries.append(name)
+        return BOX if name == 'box' else None
+
+    cache = ShapeCache(loader)
+    shapes = [cache.get('box') for _ in range(500)]
+    assert queries == ['box']
+    assert all(shape is shapes[0] for shape in shapes)
+    # Anche le forme mancanti vengono ricordate
+    assert cache.get('missing') is None
+    assert cache.get('missing') is None
+    assert queries == ['box', 'missing']
+    assert (cache.queries, cache.hits) == (2, 500)
+
+
+def test_cache_invalidate():
+    queries = []
+    cache = ShapeCache(lambda name: queries.append(name) or BOX)
+    first = cache.get('box')
+    cache.get('other')
+    cache.invalidate('box')
+    assert cache.get('box') is not first
+    assert cache.get('other') is not None
+    assert queries == ['box', 'other', 'box']
+    cache.invalidate()
+    cache.get('box')
+    cache.get('other')
+    assert queries == ['box', 'other', 'box', 'box', 'other']
+
+
+def test_cache_concurrent_get_returns_one_shape():
+    cache = ShapeCache(lambda name: BOX)
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(cache.get('box'))) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len({id(shape) for shape in results}) == 1
+    assert cache.hits + cache.queries == 8
+
+
+def test_cache_drops_reads_superseded_by_invalidate():
+    loading = threading.Event()
+    release = threading.Event()
+
+    def loader(name):
+        loading.set()
+        release.wait(5)
+        return BOX
+
+    cache = ShapeCache(loader)
+    results = []
+    thread = threading.Thread(target=lambda: results.append(cache.get('box')))
+    thread.start()
+    assert loading.wait(5)
+    cache.invalidate()
+    release.set()
+    thread.join()
+    assert results[0] is not None
+    assert cache.shapes == {}
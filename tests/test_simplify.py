@@ -0,0 +1,91 @@
+# Semplificazione delle mesh (simplify.py) sulle mesh del mesher greedy:
+#  - la mesh resta chiusa e orientata, con lo stesso volume;
+#  - la scala dell'export (mm, cm, m) non cambia forma ne' dimensioni;
+#  - le facce complanari si fondono senza spostare la superficie, e con target_faces o
+#    tolerance la mesh resta comunque chiusa.
+#
+# Uso: python -m pytest tests
+import os
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import numpy as np
+import pytest
+
+from mesher import greedy_mesh
+from simplify import simplify_mesh
+
+SCALES = [1.0, 0.1, 0.001]
+
+
+# Scatola cava con una sporgenza e un gradino: facce piane grandi e spigoli concavi
+def occupancy():
+    grid = np.zeros((24, 20, 16), dtype=bool)
+    grid[2:22, 2:18, 2:14] = True
+    grid[6:18, 6:14, 6:14] = False
+    grid[10:14, 18:20, 4:8] = True
+    grid[2:8, 2:6, 14:16] = True
+    return grid
+
+
+def mesh(scale):
+    vertices, faces = greedy_mesh(occupancy(), origin=(5, -3, 7))
+    return vertices * scale, faces
+
+
+# Ogni lato percorso in un verso da un triangolo e' percorso nel verso opposto da un altro;
+# restituisce il volume con segno
+def closed_volume(vertices, faces):
+    faces = np.asarray(faces, dtype=np.int64)
+    a = faces.ravel()
+    b = np.roll(faces, -1, axis=1).ravel()
+    n = len(vertices)
+    np.testing.assert_array_equal(np.sort(a * n + b), np.sort(b * n + a))
+    t = np.asarray(vertices, dtype=np.float64)[faces]
+    return np.einsum('ij,ij->i', t[:, 0], np.cross(t[:, 1], t[:, 2])).sum() / 6
+
+
+@pytest.mark.parametrize('scale', SCALES)
+def test_coplanar_merge_keeps_mesh_closed_and_scale(scale):
+    vertices, faces = mesh(scale)
+    simplified, simplified_faces = simplify_mesh(vertices, faces)
+    assert len(simplified_faces) < len(faces)
+    assert closed_volume(simplified, simplified_faces) == pytest.approx(occupancy().sum() * scale ** 3)
+    np.testing.assert_allclose(simplified.min(axis=0), vertices.min(axis=0))
+    np.testing.assert_allclose(simplified.max(axis=0), vertices.max(axis=0))
+    # Solo facce complanari fuse: i vertici rimasti sono vertici della mesh originale
+    original = {tuple(v) for v in np.round(vertices / scale).astype(np.int64).tolist()}
+    assert {tuple(v) for v in np.round(simplified / scale).astype(np.int64).tolist()} <= original
+
+
+def test_same_result_in_every_unit():
+    results = [simplify_mesh(*mesh(scale)) for scale in SCALES]
+    for scale, (vertices, faces) in zip(SCALES, results):
+        assert len(faces) == len(results[0][1])
+        np.testing.assert_allclose(np.sort(vertices / scale, axis=0), np.sort(results[0][0], axis=0), atol=1e-6)
+
+
+@pytest.mark.parametrize('scale', SCALES)
+def test_target_faces_keeps_mesh_closed(scale):
+    vertices, faces = mesh(scale)
+    coplanar = len(simplify_mesh(vertices, faces)[1])
+    simplified, simplified_faces = simplify_mesh(vertices, faces, target_faces=coplanar // 2)
+    assert len(simplified_faces) < coplanar
+    closed_volume(simplified, simplified_faces)
+    # Nessun vertice oltre la bounding box originale
+    assert np.all(simplified.min(axis=0) >= vertices.min(axis=0) - 1e-9)
+    assert np.all(simplified.max(axis=0) <= vertices.max(axis=0) + 1e-9)
+
+
+# La tolleranza e' nell'unita' dell'export: un decimo di voxel ammette solo le facce
+# complanari, quattro voxel anche le approssimazioni, in qualunque unita'
+@pytest.mark.parametrize('scale', SCALES)
+def test_tolerance_is_in_export_units(scale):
+    vertices, faces = mesh(scale)
+    coplanar = len(simplify_mesh(vertices, faces)[1])
+    assert len(simplify_mesh(vertices, faces, tolerance=0.1 * scale)[1]) == coplanar
+    simplified, simplified_faces = simplify_mesh(vertices, faces, tolerance=4 * scale)
+    assert len(simplified_faces) < coplanar
+    closed_volume(simplified, simplified_faces)
@@ -0,0 +1,641 @@
+import itertools
+import os
+import sys
+import tempfile
+import weakref
+from collections.abc import MutableMapping
+
+import numpy as np
+
+# Colore di default dei voxel (bianco)
+DEFAULT_COLOR = (1.0, 1.0, 1.0, 1.0)
+
+
+# Volume denso di voxel: griglia di occupazione uint8 e canale colore opzionale.
+# Il canale colore contiene un indice (uint8) nella palette, non l'RGBA completo,
+# cosi' occupa un solo byte per voxel.
+class VoxelVolume:
+    def __init__(self, size, with_colors=False):
+        self.size = int(size)
+        shape = (self.size, self.size, self.size)
+        self.occupancy = np.zeros(shape, dtype=np.uint8)
+        self.colors = np.zeros(shape, dtype=np.uint8) if with_colors else None
+        self.palette = [DEFAULT_COLOR]
+        self.brick_size = BRICK_SIZE
+        # Blocchi modificati dall'ultimo take_dirty() (per il rendering incrementale) e
+        # generazione, incrementata da clear()
+        self.dirty = set()
+        self.generation = 0
+        # Journal delle modifiche (undo/redo) avvisato prima di ogni modifica di un blocco
+        self.journal = None
+
+    # Restituisce l'indice del colore nella palette, aggiungendolo se manca
+    def color_index(self, rgba):
+        if rgba is None:
+            return 0
+        rgba = tuple(float(c) for c in rgba)
+        if rgba not in self.palette:
+            if len(self.palette) >= 256:
+                raise ValueError("Palette piena: massimo 256 colori per volume")
+            self.palette.append(rgba)
+        return self.palette.index(rgba)
+
+    # Svuota il volume senza riallocare la memoria
+    def clear(self):
+        self.occupancy.fill(0)
+        if self.colors is not None:
+            self.colors.fill(0)
+        self.dirty.clear()
+        self.generation += 1
+
+    # Segna come modificati i blocchi della regione [a, b) allargata di un voxel: cambia
+    # anche la superficie dei blocchi vicini
+    def _mark_region(self, a, b):
+        bs = self.brick_size
+        nb = -(-self.size // bs)
+        lo = [max((int(v) - 1) // bs, 0) for v in a]
+        hi = [min(int(v) // bs, nb - 1) + 1 for v in b]
+        self.dirty.update((x, y, z) for x in range(lo[0], hi[0]) for y in range(lo[1], hi[1])
+                          for z in range(lo[2], hi[2]))
+
+    # Come _mark_region per un insieme di voxel sparsi
+    def _mark_coords(self, coords):
+        bs = self.brick_size
+        nb = -(-self.size // bs)
+        shifted = [coords] + [coords + step for step in np.concatenate([np.eye(3, dtype=np.int64),
+                                                                         -np.eye(3, dtype=np.int64)])]
+        keys = np.clip(np.concatenate(shifted) // bs, 0, nb - 1)
+        self.dirty.update(map(tuple, np.unique(keys, axis=0).tolist()))
+
+    # Avvisa il journal (se c'e') dei blocchi della regione [a, b) prima di scriverli
+    def _capture_region(self, a, b):
+        if self.journal is None:
+            return
+        bs = self.brick_size
+        ranges = [range(int(lo) // bs, (int(hi) - 1) // bs + 1) for lo, hi in zip(a, b)]
+        for key in itertools.product(*ranges):
+            self.journal.capture(key)
+
+    def _capture_coords(self, coords):
+        if self.journal is None:
+            return
+        for key in map(tuple, np.unique(coords // self.brick_size, axis=0).tolist()):
+            self.journal.capture(key)
+
+    # Blocchi modificati dall'ultima chiamata
+    def take_dirty(self):
+        dirty, self.dirty = self.dirty, set()
+        return dirty
+
+    # Scarta le coordinate fuori dallo spazio e le converte in indici interi
+    def _valid_coords(self, coords):
+        coords = np.asarray(coords)
+        if coords.size == 0:
+            return np.empty((0, 3), dtype=np.int64)
+        coords = coords.reshape(-1, 3).astype(np.int64)
+        valid = np.all((coords >= 0) & (coords < self.size), axis=1)
+        return coords[valid]
+
+    # Scrive un insieme di voxel: value=1 li aggiunge, value=0 li rimuove
+    def set_coords(self, coords, value=1, color=None):
+        coords = self._valid_coords(coords)
+        if len(coords) == 0:
+            return 0
+        self._capture_coords(coords)
+        self._mark_coords(coords)
+        index = (coords[:, 0], coords[:, 1], coords[:, 2])
+        self.occupancy[index] = 1 if value > 0 else 0
+        if self.colors is not None and value > 0:
+            self.colors[index] = self.color_index(color)
+        return len(coords)
+
+    # Ritaglia la regione [lo, hi) sullo spazio; restituisce (lo, hi) ritagliati
+    # e le slice corrispondenti nella maschera, oppure None se la regione e' fuori
+    def _clip_region(self, lo, hi):
+        lo = np.asarray(lo, dtype=np.int64)
+        hi = np.asarray(hi, dtype=np.int64)
+        a = np.maximum(lo, 0)
+        b = np.minimum(hi, self.size)
+        if np.any(a >= b):
+            return None
+        return a, b, tuple(slice(a[i] - lo[i], b[i] - lo[i]) for i in range(3))
+
+    # Scrive la regione [lo, hi) con assegnazione a slice; mask (opzionale) e' una
+    # maschera booleana broadcastabile sulla forma hi - lo
+    def fill(self, lo, hi, value=1, color=None, mask=None):
+        clipped = self._clip_region(lo, hi)
+        if clipped is None:
+            return 0
+        a, b, mask_slices = clipped
+        self._capture_region(a, b)
+        self._mark_region(a, b)
+        region = (slice(a[0], b[0]), slice(a[1], b[1]), slice(a[2], b[2]))
+        if mask is not None:
+            mask = np.broadcast_to(mask, tuple(np.asarray(hi) - np.asarray(lo)))[mask_slices]
+        target = self.occupancy[region]
+        if mask is None:
+            target[...] = 1 if value > 0 else 0
+        else:
+            target[mask] = 1 if value > 0 else 0
+        if self.colors is not None and value > 0:
+            colors = self.colors[region]
+            if mask is None:
+                colors[...] = self.color_index(color)
+            else:
+                colors[mask] = self.color_index(color)
+        return int(np.prod(b - a)) if mask is None else int(np.count_nonzero(mask))
+
+    # Numero di voxel pieni
+    def count(self):
+        return int(np.count_nonzero(self.occupancy))
+
+    # Coordinate dei voxel pieni (N x 3, float32) per rendering ed esportazione
+    def coords(self):
+        return np.argwhere(self.occupancy).astype(np.float32)
+
+    # Colori RGBA (N x 4, float32) nello stesso ordine di coords()
+    def rgba(self):
+        palette = np.array(self.palette, dtype=np.float32)
+        if self.colors is None:
+            return np.repeat(palette[:1], self.count(), axis=0)
+        return palette[self.colors[self.occupancy != 0]]
+
+    # Occupazione e colori del blocco key (lato brick_size, tagliato ai bordi dello
+    # spazio): (None, 0) se vuoto, il colore e' un indice o un array di indici
+    def block(self, key):
+        region = tuple(slice(k * self.brick_size, (k + 1) * self.brick_size) for k in key)
+        occupancy = self.occupancy[region]
+        if not occupancy.any():
+            return None, 0
+        return occupancy, 0 if self.colors is None else self.colors[region]
+
+    # Sostituisce il contenuto del blocco key (l'inverso di block()): occupazione di lato
+    # brick_size, tagliata ai bordi dello spazio, o full per un blocco tutto pieno.
+    # Con mark=False i blocchi non vengono segnati come modificati (per riempire un volume
+    # appena svuotato con clear(), che il rendering rilegge comunque per intero)
+    def set_block(self, key, occupancy, colors=0, full=False, mark=True):
+        region = tuple(slice(k * self.brick_size, (k + 1) * self.brick_size) for k in key)
+        if self.journal is not None:
+            self.journal.capture(tuple(key))
+        target = self.occupancy[region]
+        crop = tuple(slice(0, n) for n in target.shape)
+        target[...] = 1 if full else occupancy[crop]
+        if self.colors is not None:
+            self.colors[region] = colors[crop] if isinstance(colors, np.ndarray) else colors
+        if mark:
+            self._mark_region([r.start for r in region], [r.start + n for r, n in zip(region, target.shape)])
+
+    # Chiavi dei blocchi con almeno un voxel pieno
+    def occupied_blocks(self):
+        starts = np.arange(0, self.size, self.brick_size)
+        blocks = self.occupancy
+        for axis in range(3):
+            blocks = np.maximum.reduceat(blocks, starts, axis=axis)
+        return set(map(tuple, np.argwhere(blocks).tolist()))
+
+    # Bounding box dei voxel pieni come (lo, hi) con hi esclusivo, None se vuoto
+    def bounds(self):
+        filled = [np.flatnonzero(self.occupancy.any(axis=axes)) for axes in ((1, 2), (0, 2), (0, 1))]
+        if len(filled[0]) == 0:
+            return None
+        lo = np.array([f[0] for f in filled], dtype=np.int64)
+        hi = np.array([f[-1] + 1 for f in filled], dtype=np.int64)
+        return lo, hi
+
+    # Copia della griglia di occupazione nella regione [lo, hi)
+    def extract(self, lo, hi):
+        return self.occupancy[lo[0]:hi[0], lo[1]:hi[1], lo[2]:hi[2]].copy()
+
+    # Memoria occupata dai canali del volume
+    @property
+    def nbytes(self):
+        return self.occupancy.nbytes + (self.colors.nbytes if self.colors is not None else 0)
+
+
+# Lato dei blocchi (brick) del volume sparso
+BRICK_SIZE = 32
+
+# Stato dei brick: i brick vuoti non vengono memorizzati affatto
+BRICK_PARTIAL = 1
+BRICK_FULL = 2
+
+
+# Volume sparso a blocchi: lo spazio e' diviso in brick di BRICK_SIZE^3 voxel,
+# allocati solo dove c'e' geometria. I brick completamente pieni sono solo un flag,
+# quelli vuoti vengono eliminati. La ricerca di un brick e' un accesso a dizionario.
+class BrickVolume:
+    def __init__(self, size, with_colors=False, brick_size=BRICK_SIZE):
+        self.size = int(size)
+        self.brick_size = int(brick_size)
+        self.with_colors = with_colors
+        self.palette = [DEFAULT_COLOR]
+        self.flags = {}    # chiave brick -> BRICK_PARTIAL / BRICK_FULL
+        self.data = {}     # chiave brick -> occupazione uint8 (solo brick parziali)
+        self.colors = {}   # chiave brick -> indice colore (int) o array uint8
+        self.dirty = set()
+        self.generation = 0
+        self.journal = None
+
+    color_index = VoxelVolume.color_index
+    _valid_coords = VoxelVolume._valid_coords
+    _clip_region = VoxelVolume._clip_region
+    _mark_region = VoxelVolume._mark_region
+    _mark_coords = VoxelVolume._mark_coords
+    take_dirty = VoxelVolume.take_dirty
+
+    def clear(self):
+        self.flags.clear()
+        self.data.clear()
+        self.colors.clear()
+        self.dirty.clear()
+        self.generation += 1
+
+    def _capture(self, key):
+        if self.journal is not None:
+            self.journal.capture(key)
+
+    # Origine (in voxel) del brick con la chiave data
+    def brick_origin(self, key):
+        return np.array(key, dtype=np.int64) * self.brick_size
+
+    # Occupazione del brick come array; per i brick pieni crea un array di uni
+    def brick_occupancy(self, key):
+        flag = self.flags.get(key)
+        if flag is None:
+            return None
+        if flag == BRICK_FULL:
+            return np.ones((self.brick_size,) * 3, dtype=np.uint8)
+        return self.data[key]
+
+    # Array dei colori del brick (materializzato se il brick ha un colore uniforme)
+    def brick_colors(self, key):
+        colors = self.colors.get(key, 0)
+        if isinstance(colors, np.ndarray):
+            return colors
+        self.colors[key] = np.full((self.brick_size,) * 3, colors, dtype=np.uint8)
+        return self.colors[key]
+
+    def _drop_brick(self, key):
+        self.flags.pop(key, None)
+        self.data.pop(key, None)
+        self.colors.pop(key, None)
+
+    # Aggiorna il flag del brick dopo una scrittura (pieno, parziale o da eliminare)
+    def _update_flag(self, key, occupancy):
+        if not occupancy.any():
+            self._drop_brick(key)
+        elif occupancy.all():
+            self.flags[key] = BRICK_FULL
+            self.data.pop(key, None)
+        else:
+            self.flags[key] = BRICK_PARTIAL
+            self.data[key] = occupancy
+
+    # Scrive un insieme di voxel raggruppandoli per brick: vengono toccati solo
+    # i brick interessati, e una sottrazione salta i brick gia' vuoti
+    def set_coords(self, coords, value=1, color=None):
+        coords = self._valid_coords(coords)
+        if len(coords) == 0:
+            return 0
+        color = self.color_index(color) if value > 0 else 0
+        self._mark_coords(coords)
+        keys = coords // self.brick_size
+        local = coords - keys * self.brick_size
+        # Chiave del brick codificata in un solo intero per raggruppare in fretta
+        nb = -(-self.size // self.brick_size)
+        codes = (keys[:, 0] * nb + keys[:, 1]) * nb + keys[:, 2]
+        order = np.argsort(codes, kind='stable')
+        unique_codes, starts = np.unique(codes[order], return_index=True)
+        written = 0
+        for code, idx in zip(unique_codes.tolist(), np.split(order, starts[1:])):
+            key = (code // (nb * nb), (code // nb) % nb, code % nb)
+            flag = self.flags.get(key)
+            if value <= 0 and flag is None:
+                continue
+            uniform = not isinstance(self.colors.get(key, 0), np.ndarray)
+            if flag == BRICK_FULL and value > 0 and uniform and self.colors.get(key, 0) == color:
+                written += len(idx)
+                continue
+            self._capture(key)
+            occupancy = self.brick_occupancy(key)
+            if occupancy is None:
+                occupancy = np.zeros((self.brick_size,) * 3, dtype=np.uint8)
+            index = (local[idx, 0], local[idx, 1], local[idx, 2])
+            occupancy[index] = 1 if value > 0 else 0
+            if self.with_colors and value > 0:
+                if flag is None:
+                    self.colors[key] = color
+                elif not uniform or self.colors.get(key, 0) != color:
+                    self.brick_colors(key)[index] = color
+            self._update_flag(key, occupancy)
+            written += len(idx)
+        return written
+
+    # Scrive la regione [lo, hi) brick per brick con assegnazione a slice. I brick
+    # coperti interamente (senza maschera) diventano solo un flag pieno o vengono
+    # eliminati, senza toccare i loro voxel
+    def fill(self, lo, hi, value=1, color=None, mask=None):
+        clipped = self._clip_region(lo, hi)
+        if clipped is None:
+            return 0
+        a, b, mask_slices = clipped
+        if mask is not None:
+            mask = np.broadcast_to(mask, tuple(np.asarray(hi) - np.asarray(lo)))[mask_slices]
+        color = self.color_index(color) if value > 0 else 0
+        self._mark_region(a, b)
+        bs = self.brick_size
+        key_lo = a // bs
+        key_hi = (b - 1) // bs + 1
+        written = 0
+        for bx in range(key_lo[0], key_hi[0]):
+            for by in range(key_lo[1], key_hi[1]):
+                for bz in range(key_lo[2], key_hi[2]):
+                    key = (bx, by, bz)
+                    origin = self.brick_origin(key)
+                    ra = np.maximum(a, origin)
+                    rb = np.minimum(b, origin + bs)
+                    local = tuple(slice(ra[i] - origin[i], rb[i] - origin[i]) for i in range(3))
+                    sub = None
+                    if mask is not None:
+                        sub = mask[tuple(slice(ra[i] - a[i], rb[i] - a[i]) for i in range(3))]
+                        if not sub.any():
+                            continue
+                    written += int(np.prod(rb - ra)) if sub is None else int(np.count_nonzero(sub))
+                    self._fill_brick(key, local, value, color, sub, whole=sub is None and np.all(rb - ra == bs))
+        return written
+
+    def _fill_brick(self, key, local, value, color, mask, whole):
+        flag = self.flags.get(key)
+        if value <= 0 and flag is None:
+            return
+        self._capture(key)
+        if value <= 0:
+            if whole:
+                self._drop_brick(key)
+                return
+        elif whole:
+            self.flags[key] = BRICK_FULL
+            self.data.pop(key, None)
+            if self.with_colors:
+                self.colors[key] = color
+            return
+        uniform = not isinstance(self.colors.get(key, 0), np.ndarray)
+        if flag == BRICK_FULL and value > 0 and uniform and self.colors.get(key, 0) == color:
+            return
+        occupancy = self.brick_occupancy(key)
+        if occupancy is None:
+            occupancy = np.zeros((self.brick_size,) * 3, dtype=np.uint8)
+        target = occupancy[local]
+        if mask is None:
+            target[...] = 1 if value > 0 else 0
+        else:
+            target[mask] = 1 if value > 0 else 0
+        if self.with_colors and value > 0:
+            if flag is None:
+                self.colors[key] = color
+            elif not uniform or self.colors.get(key, 0) != color:
+                colors = self.brick_colors(key)[local]
+                if mask is None:
+                    colors[...] = color
+                else:
+                    colors[mask] = color
+        self._update_flag(key, occupancy)
+
+    # Itera sui soli brick occupati: (chiave, origine, occupazione)
+    def iter_bricks(self):
+        for key in sorted(self.flags):
+            yield key, self.brick_origin(key), self.brick_occupancy(key)
+
+    def block(self, key):
+        return self.brick_occupancy(key), self.colors.get(key, 0)
+
+    # L'occupazione dei brick parziali viene tenuta senza copiarla
+    def set_block(self, key, occupancy, colors=0, full=False, mark=True):
+        self._capture(key)
+        self._drop_brick(key)
+        if full:
+            self.flags[key] = BRICK_FULL
+        else:
+            self._update_flag(key, occupancy)
+        if self.with_colors and key in self.flags:
+            self.colors[key] = colors
+        if mark:
+            origin = self.brick_origin(key)
+            self._mark_region(origin, np.minimum(origin + self.brick_size, self.size))
+
+    def occupied_blocks(self):
+        return set(self.flags)
+
+    def count(self):
+        full = sum(1 for flag in self.flags.values() if flag == BRICK_FULL)
+        return full * self.brick_size ** 3 + sum(int(np.count_nonzero(a)) for a in self.data.values())
+
+    def coords(self):
+        parts = [np.argwhere(occ) + origin for _, origin, occ in self.iter_bricks()]
+        if not parts:
+            return np.empty((0, 3), dtype=np.float32)
+        return np.concatenate(parts).astype(np.float32)
+
+    def rgba(self):
+        palette = np.array(self.palette, dtype=np.float32)
+        parts = []
+        for key, _, occ in self.iter_bricks():
+            colors = self.colors.get(key, 0)
+            if isinstance(colors, np.ndarray):
+                parts.append(palette[colors[occ != 0]])
+            else:
+                parts.append(np.repeat(palette[colors:colors + 1], int(np.count_nonzero(occ)), axis=0))
+        if not parts:
+            return np.empty((0, 4), dtype=np.float32)
+        return np.concatenate(parts)
+
+    def bounds(self):
+        lo = hi = None
+        for _, origin, occ in self.iter_bricks():
+            filled = [np.flatnonzero(occ.any(axis=axes)) for axes in ((1, 2), (0, 2), (0, 1))]
+            brick_lo = origin + [f[0] for f in filled]
+            brick_hi = origin + [f[-1] + 1 for f in filled]
+            lo = brick_lo if lo is None else np.minimum(lo, brick_lo)
+            hi = brick_hi if hi is None else np.maximum(hi, brick_hi)
+        if lo is None:
+            return None
+        return lo, hi
+
+    # Ricostruisce la regione [lo, hi) copiando solo i brick occupati che la intersecano
+    def extract(self, lo, hi):
+        lo = np.asarray(lo, dtype=np.int64)
+        hi = np.asarray(hi, dtype=np.int64)
+        out = np.zeros(tuple(hi - lo), dtype=np.uint8)
+        for key, origin, occ in self.iter_bricks():
+            a = np.maximum(lo, origin)
+            b = np.minimum(hi, origin + self.brick_size)
+            if np.any(a >= b):
+                continue
+            out[a[0] - lo[0]:b[0] - lo[0], a[1] - lo[1]:b[1] - lo[1], a[2] - lo[2]:b[2] - lo[2]] = \
+                occ[a[0] - origin[0]:b[0] - origin[0], a[1] - origin[1]:b[1] - origin[1], a[2] - origin[2]:b[2] - origin[2]]
+        return out
+
+    @property
+    def nbytes(self):
+        colors = sum(c.nbytes for c in self.colors.values() if isinstance(c, np.ndarray))
+        return sum(a.nbytes for a in self.data.values()) + colors
+
+
+# Brick per segmento del file di un volume mappato (il file cresce un segmento alla volta)
+MAPPED_SEGMENT_BRICKS = 256
+
+
+# Slot di brick_size^3 byte in un file mappato in memoria. Il file cresce a segmenti, ognuno
+# con il suo memmap, ed e' sparso: lo spazio su disco viene occupato solo dagli slot
+# scritti. Gli slot liberati vengono riusati.
+class BrickFile:
+    def __init__(self, path, brick_size, segment_bricks=MAPPED_SEGMENT_BRICKS):
+        self.path = path
+        self.shape = (brick_size,) * 3
+        self.segment_bricks = segment_bricks
+        self.segments = []
+        self.free = []
+        self.file = open(path, 'w+b')
+        # Su POSIX il nome si rimuove subito: il file resta usabile dal descrittore aperto e
+        # sparisce anche se il processo termina senza chiuderlo. Su Windows un file aperto non
+        # si puo' eliminare e lo rimuove close()
+        self.unlinked = os.name == 'posix'
+        if self.unlinked:
+            os.remove(path)
+
+    @property
+    def slot_bytes(self):
+        return int(np.prod(self.shape))
+
+    @property
+    def file_bytes(self):
+        return len(self.segments) * self.segment_bricks * self.slot_bytes
+
+    def view(self, slot):
+        segment, index = divmod(slot, self.segment_bricks)
+        return self.segments[segment][index]
+
+    # Slot libero e la sua vista nel file
+    def allocate(self):
+        if not self.free:
+            self._grow()
+        slot = self.free.pop()
+        return slot, self.view(slot)
+
+    def release(self, slot):
+        self.free.append(slot)
+
+    def _grow(self):
+        offset = self.file_bytes
+        self.file.truncate(offset + self.segment_bricks * self.slot_bytes)
+        self.segments.append(np.memmap(self.file, dtype=np.uint8, mode='r+', offset=offset,
+                                       shape=(self.segment_bricks,) + self.shape))
+        first = (len(self.segments) - 1) * self.segment_bricks
+        # In ordine inverso: pop() restituisce prima gli slot piu' bassi
+        self.free.extend(range(first + self.segment_bricks - 1, first - 1, -1))
+
+    def close(self):
+        self.segments.clear()
+        self.free.clear()
+        self.file.close()
+        if self.unlinked:
+            return
+        try:
+            os.remove(self.path)
+        except OSError:
+            pass
+
+
+# Dizionario chiave brick -> array di brick_size^3 byte tenuto in un BrickFile: assegnare un
+# array lo copia nello slot della chiave (se non e' gia' la vista di quello slot), eliminare
+# la chiave libera lo slot. I valori che non sono array (colore uniforme) restano in memoria.
+class MappedBricks(MutableMapping):
+    def __init__(self, bricks):
+        self.bricks = bricks
+        self.values_ = {}   # chiave -> vista nel file o intero
+        self.slots = {}     # chiave -> slot
+
+    def __getitem__(self, key):
+        return self.values_[key]
+
+    def __setitem__(self, key, value):
+        if isinstance(value, np.ndarray):
+            current = self.values_.get(key)
+            if value is current:
+                return
+            slot = self.slots.get(key)
+            if slot is None:
+                slot, view = self.bricks.allocate()
+                self.slots[key] = slot
+            else:
+                view = self.bricks.view(slot)
+            view[...] = value
+            value = view
+        else:
+            self._release(key)
+        self.values_[key] = value
+
+    def __delitem__(self, key):
+        del self.values_[key]
+        self._release(key)
+
+    def _release(self, key):
+        slot = self.slots.pop(key, None)
+        if slot is not None:
+            self.bricks.release(slot)
+
+    def __iter__(self):
+        return iter(self.values_)
+
+    def __len__(self):
+        return len(self.values_)
+
+    def clear(self):
+        for slot in self.slots.values():
+            self.bricks.release(slot)
+        self.slots.clear()
+        self.values_.clear()
+
+
+# Volume a brick fuori memoria: l'occupazione dei brick parziali e i colori per voxel stanno
+# in un file mappato in memoria (directory, o quella temporanea di sistema), quindi il
+# sistema operativo tiene in RAM solo le pagine dei brick disegnati, sottratti o esportati
+# di recente e la scena puo' superare la memoria fisica senza finire nello swap. In memoria
+# restano l'indice dei brick, i flag e i colori uniformi. Il file viene eliminato con il volume
+# (su POSIX gia' all'apertura, vedi BrickFile), lo spazio che occupa e' file_bytes.
+class MappedBrickVolume(BrickVolume):
+    def __init__(self, size, with_colors=False, brick_size=BRICK_SIZE, directory=None):
+        super().__init__(size, with_colors=with_colors, brick_size=brick_size)
+        fd, path = tempfile.mkstemp(prefix='text2cad-', suffix='.bricks', dir=directory)
+        os.close(fd)
+        self.bricks = BrickFile(path, self.brick_size)
+        self.data = MappedBricks(self.bricks)
+        self.colors = MappedBricks(self.bricks)
+        self._finalizer = weakref.finalize(self, self.bricks.close)
+
+    # Memoria in RAM: solo l'indice dei brick (i dati sono nel file)
+    @property
+    def nbytes(self):
+        return sum(sys.getsizeof(index) for index in (self.flags, self.data.values_, self.data.slots,
+                                                      self.colors.values_, self.colors.slots))
+
+    # Spazio del file mappato (gli slot liberi vengono riusati, il file non si riduce)
+    @property
+    def file_bytes(self):
+        return self.bricks.file_bytes
+
+    def close(self):
+        self.flags.clear()
+        self.data.values_.clear()
+        self.colors.values_.clear()
+        self._finalizer()
+
+
+# Crea il volume della scena: sparso a brick (in RAM, o in un file mappato con mapped)
+# oppure denso
+def create_volume(size, with_colors=False, sparse=True, mapped=False, directory=None):
+    if mapped:
+        return MappedBrickVolume(size, with_colors=with_colors, directory=directory)
+    if sparse:
+        return BrickVolume(size, with_colors=with_colors)
+    return VoxelVolume(size, with_colors=with_colors)